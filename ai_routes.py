@@ -1,25 +1,28 @@
 import os
+import threading
 import time
+from functools import lru_cache
 
-import openai
 import requests
 from flask import Blueprint, request, jsonify
 from dotenv import load_dotenv
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
 
-
-from ping_manager import PingManager
+import precheck
+import profiler
 
 load_dotenv()
 
 # Criação do Blueprint
 ai = Blueprint("ai", __name__)
+# Respostas triviais (vazias, curtas, cópia do tema...) são respondidas sem chamar o provedor
+ai.before_request(precheck.verificar_requisicao)
 
 # API Keys
 GEMINI_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY1")
 MISTRAL_KEY = os.getenv("MISTRAL_KEY")
 COHERE_KEY = os.getenv("COHERE_KEY")
-openai.api_key = os.getenv("GROQ_KEY")
+GROQ_KEY = os.getenv("GROQ_KEY")
 OPENROUTER_KEY = os.getenv('OPENROUTER_KEY')
 
 
@@ -27,12 +30,102 @@ OPENROUTER_KEY = os.getenv('OPENROUTER_KEY')
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
 MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
 COHERE_API_URL = "https://api.cohere.ai/v1/chat"
-openai.base_url = "https://api.groq.com/openai/v1"
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+
+class SessaoProvedores(requests.Session):
+    """Session que contabiliza o tempo das chamadas aos provedores nos perfis (ver profiler.py)"""
+
+    def request(self, *args, **kwargs):
+        with profiler.secao("http"):
+            return super().request(*args, **kwargs)
+
+
+# Prazo de cada chamada a um provedor
+AI_PROVIDER_TIMEOUT_S = float(os.getenv("AI_PROVIDER_TIMEOUT_S", "30"))
+# Orçamento total de uma requisição, somando a cadeia de fallback (Gemini → Mistral → Cohere → Groq →
+# OpenRouter): cada chamada usa o menor entre AI_PROVIDER_TIMEOUT_S e o que ainda resta.
+# O timeout do gunicorn fica acima dele (ver gunicorn.conf.py)
+AI_REQUEST_BUDGET_S = float(os.getenv("AI_REQUEST_BUDGET_S", "75"))
+
+# Sessão HTTP compartilhada: reaproveita as conexões TLS (keep-alive) entre chamadas aos provedores
+AI_HTTP_POOL_MAXSIZE = int(os.getenv("AI_HTTP_POOL_MAXSIZE", "10"))
+http = SessaoProvedores()
+http.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=AI_HTTP_POOL_MAXSIZE))
+
+# Provedor -> (chave, URL); usado para pré-abrir as conexões no warming (ver warming.py)
+PROVEDORES_HTTP = {
+    "gemini": (GEMINI_API_KEY, GEMINI_API_URL),
+    "mistral": (MISTRAL_KEY, MISTRAL_API_URL),
+    "cohere": (COHERE_KEY, COHERE_API_URL),
+    "openrouter": (OPENROUTER_KEY, OPENROUTER_URL)
+}
+
+
+def aquecer_conexoes(timeout=3):
+    """
+    Abre (DNS + TCP + TLS) uma conexão com cada provedor configurado e a deixa no pool da sessão.
+    Retorna {provedor: ms} e levanta exceção só se todos os provedores configurados falharem.
+    """
+    tempos = {}
+    erros = {}
+    for nome, (chave, url) in PROVEDORES_HTTP.items():
+        if not chave:
+            continue
+        inicio = time.perf_counter()
+        try:
+            # Qualquer status serve: o objetivo é só estabelecer a conexão
+            http.head(url, timeout=timeout).close()
+            tempos[nome] = round((time.perf_counter() - inicio) * 1000, 1)
+        except requests.exceptions.RequestException as e:
+            erros[nome] = str(e)
+    if erros and not tempos:
+        raise Exception(f"Nenhum provedor respondeu: {erros}")
+    return tempos
+
+
+# Falhas por provedor (exportadas em /metrics)
+_falhas_provedores = {}
+_falhas_lock = threading.Lock()
+
+
+def registrar_falha(provedor, mensagem):
+    with _falhas_lock:
+        _falhas_provedores[provedor] = _falhas_provedores.get(provedor, 0) + 1
+    print(mensagem)
+
+
+def falhas_provedores():
+    with _falhas_lock:
+        return dict(_falhas_provedores)
+
+
+class PrazoEsgotado(Exception):
+    """O orçamento da requisição (AI_REQUEST_BUDGET_S) acabou antes de algum provedor responder"""
+
+
+def novo_prazo():
+    return time.monotonic() + AI_REQUEST_BUDGET_S
+
+
+def timeout_restante(prazo):
+    """Timeout da próxima chamada a um provedor; sem prazo, só AI_PROVIDER_TIMEOUT_S"""
+    if prazo is None:
+        return AI_PROVIDER_TIMEOUT_S
+    restante = prazo - time.monotonic()
+    if restante < 1:
+        raise PrazoEsgotado(f"Orçamento de {AI_REQUEST_BUDGET_S:g}s da requisição esgotado")
+    return min(AI_PROVIDER_TIMEOUT_S, restante)
+
+
+def status_erro(erro):
+    return 504 if isinstance(erro, PrazoEsgotado) else 500
+
+
 # ===================== FUNÇÕES DE CADA IA =====================
 
-def call_gemini(text):
+def call_gemini(text, prazo=None):
     if not GEMINI_API_KEY:
         raise Exception("Gemini API key not configured")
 
@@ -44,10 +137,11 @@ def call_gemini(text):
         ]
     }
 
-    response = requests.post(
+    response = http.post(
         f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
         headers={'Content-Type': 'application/json'},
-        json=payload
+        json=payload,
+        timeout=timeout_restante(prazo)
     )
 
     response.raise_for_status()
@@ -62,7 +156,7 @@ def call_gemini(text):
     raise Exception("No text found in Gemini response")
 
 
-def call_mistral(text, max_retries=3):
+def call_mistral(text, max_retries=3, prazo=None):
     if not MISTRAL_KEY:
         raise Exception("Mistral API key not configured")
 
@@ -80,9 +174,9 @@ def call_mistral(text, max_retries=3):
 
     for attempt in range(max_retries):
         try:
-            response = requests.post(MISTRAL_API_URL, headers=headers, json=payload, timeout=30)
+            response = http.post(MISTRAL_API_URL, headers=headers, json=payload, timeout=timeout_restante(prazo))
             if response.status_code == 429 and attempt < max_retries - 1:
-                time.sleep(2 ** attempt)
+                time.sleep(min(2 ** attempt, timeout_restante(prazo)))
                 continue
 
             response.raise_for_status()
@@ -101,7 +195,7 @@ def call_mistral(text, max_retries=3):
             raise Exception(f"Mistral request failed: {str(e)}")
 
 
-def call_cohere(text):
+def call_cohere(text, prazo=None):
     if not COHERE_KEY:
         raise Exception("Cohere API key not configured")
 
@@ -117,7 +211,7 @@ def call_cohere(text):
         "max_tokens": 1000
     }
 
-    response = requests.post(COHERE_API_URL, headers=headers, json=payload)
+    response = http.post(COHERE_API_URL, headers=headers, json=payload, timeout=timeout_restante(prazo))
     response.raise_for_status()
     data = response.json()
 
@@ -128,28 +222,38 @@ def call_cohere(text):
 
 
 
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.environ["GROQ_KEY"],
-)
+@lru_cache(maxsize=1)
+def get_groq_client():
+    """Cliente do Groq, criado no primeiro uso (o SDK openai leva ~1 s para importar)"""
+    from openai import OpenAI
 
-def call_groq(text):
-    chat_completion = client.chat.completions.create(
-        model= "meta-llama/llama-4-scout-17b-16e-instruct",
-        messages=[
-            {"role": "user", "content": text}
-        ],
-        temperature=0.7,
-    )
+    if not GROQ_KEY:
+        raise Exception("Groq API key not configured")
+    return OpenAI(base_url=GROQ_BASE_URL, api_key=GROQ_KEY, timeout=AI_PROVIDER_TIMEOUT_S)
+
+
+def call_groq(text, prazo=None):
+    timeout = timeout_restante(prazo)
+    with profiler.secao("http"):
+        chat_completion = get_groq_client().chat.completions.create(
+            model= "meta-llama/llama-4-scout-17b-16e-instruct",
+            messages=[
+                {"role": "user", "content": text}
+            ],
+            temperature=0.7,
+            timeout=timeout,
+        )
     return chat_completion.choices[0].message.content
 
 
-def call_openrouter(text):
+def call_openrouter(text, prazo=None):
     """
     Encapsula a lógica de chamada para a API do OpenRouter
 
     Args:
         text (str): Texto da pergunta/prompt do usuário
+        prazo (float): instante (time.monotonic) em que o orçamento da requisição acaba;
+            levanta PrazoEsgotado em vez de tentar o próximo modelo depois dele
 
     Returns:
         str: Resposta da IA ou mensagem de erro
@@ -170,6 +274,7 @@ def call_openrouter(text):
     }
 
     for model in models_to_try:
+        timeout = timeout_restante(prazo)
         try:
             payload = {
                 "model": model,
@@ -183,11 +288,11 @@ def call_openrouter(text):
                 "temperature": 0.7
             }
 
-            response = requests.post(
+            response = http.post(
                 OPENROUTER_URL,
                 json=payload,
                 headers=headers,
-                timeout=30  # Timeout de 30 segundos
+                timeout=timeout
             )
 
             # Se a requisição foi bem sucedida
@@ -206,17 +311,17 @@ def call_openrouter(text):
 
             # Para outros erros, tenta próximo modelo mas registra o erro
             else:
-                print(f"Modelo {model} retornou status {response.status_code}")
+                registrar_falha("openrouter", f"Modelo {model} retornou status {response.status_code}")
                 continue
 
         except requests.exceptions.Timeout:
-            print(f"Timeout ao tentar modelo {model}")
+            registrar_falha("openrouter", f"Timeout ao tentar modelo {model}")
             continue
         except requests.exceptions.RequestException as e:
-            print(f"Erro de requisição com modelo {model}: {str(e)}")
+            registrar_falha("openrouter", f"Erro de requisição com modelo {model}: {str(e)}")
             continue
         except Exception as e:
-            print(f"Erro inesperado com modelo {model}: {str(e)}")
+            registrar_falha("openrouter", f"Erro inesperado com modelo {model}: {str(e)}")
             continue
 
     # Se nenhum modelo funcionou
@@ -237,6 +342,7 @@ def call_ai():
             return jsonify({"error": "Text input is required"}), 400
 
         text = data['text']
+        prazo = novo_prazo()
         use_mistral = data.get('mistral', False)
         use_cohere = data.get('cohere', False)
         use_groq = data.get('groq', False)
@@ -244,64 +350,57 @@ def call_ai():
         # Forçar uso apenas do Mistral
         if use_mistral:
             try:
-                response = call_mistral(text)
-                PingManager.update_last_activity()
+                response = call_mistral(text, prazo=prazo)
                 return response
             except Exception as e:
-                return jsonify({"error": f"Mistral API error: {str(e)}"}), 500
+                return jsonify({"error": f"Mistral API error: {str(e)}"}), status_erro(e)
 
         # Forçar uso apenas do Cohere
         if use_cohere:
             try:
-                return call_cohere(text)
+                return call_cohere(text, prazo=prazo)
             except Exception as e:
-                return jsonify({"error": f"Cohere API error: {str(e)}"}), 500
+                return jsonify({"error": f"Cohere API error: {str(e)}"}), status_erro(e)
 
         # Forçar uso apenas do Groq
         if use_groq:
             try:
-                response = call_groq(text)
-                PingManager.update_last_activity()
+                response = call_groq(text, prazo=prazo)
                 return response
             except Exception as e:
-                return jsonify({"error": f"Groq API error: {str(e)}"}), 500
+                return jsonify({"error": f"Groq API error: {str(e)}"}), status_erro(e)
 
         # Tentativa 1: Gemini
         try:
-            response = call_gemini(text)
-            PingManager.update_last_activity()
+            response = call_gemini(text, prazo=prazo)
             return response
         except Exception as gemini_error:
-            print(f"Gemini failed: {str(gemini_error)}. Trying Mistral...")
+            registrar_falha("gemini", f"Gemini failed: {str(gemini_error)}. Trying Mistral...")
 
             # Tentativa 2: Mistral
             try:
-                response = call_mistral(text)
-                PingManager.update_last_activity()
+                response = call_mistral(text, prazo=prazo)
                 return response
             except Exception as mistral_error:
-                print(f"Mistral failed: {str(mistral_error)}. Trying Cohere...")
+                registrar_falha("mistral", f"Mistral failed: {str(mistral_error)}. Trying Cohere...")
 
                 # Tentativa 3: Cohere
                 try:
-                    response = call_cohere(text)
-                    PingManager.update_last_activity()
+                    response = call_cohere(text, prazo=prazo)
                     return response
                 except Exception as cohere_error:
-                    print(f"Cohere failed: {str(cohere_error)}. Trying Groq...")
+                    registrar_falha("cohere", f"Cohere failed: {str(cohere_error)}. Trying Groq...")
 
                     # Tentativa 4: Groq
                     try:
-                        response = call_groq(text)
-                        PingManager.update_last_activity()
+                        response = call_groq(text, prazo=prazo)
                         return response
                     except Exception as groq_error:
-                        print(f"Groq failed: {str(groq_error)}. Trying OpenRouter...")
+                        registrar_falha("groq", f"Groq failed: {str(groq_error)}. Trying OpenRouter...")
 
                         # Tentativa 5: OpenRouter
                         try:
-                            response = call_openrouter(text)
-                            PingManager.update_last_activity()
+                            response = call_openrouter(text, prazo=prazo)
                             return response
                         except Exception as openrouter_error:
                             return jsonify({
@@ -311,7 +410,7 @@ def call_ai():
                                 "cohere_error": str(cohere_error),
                                 "groq_error": str(groq_error),
                                 "openrouter_error": str(openrouter_error)
-                            }), 500
+                            }), status_erro(openrouter_error)
 
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
@@ -327,8 +426,7 @@ def cohere_route():
             return jsonify({"error": "Text input is required"}), 400
 
         text = data['text']
-        response = call_cohere(text)
-        PingManager.update_last_activity()
+        response = call_cohere(text, prazo=novo_prazo())
         return response
 
     except Exception as e:
@@ -347,11 +445,10 @@ def ask_mistral():
     text = data["text"]
 
     try:
-        response = call_mistral(text)
-        PingManager.update_last_activity()
+        response = call_mistral(text, prazo=novo_prazo())
         return response
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), status_erro(e)
 
 
 
@@ -368,8 +465,7 @@ def call_groq_endpoint():
             return jsonify({"error": "Text input is required"}), 400
 
         text = data['text']
-        response = call_groq(text)
-        PingManager.update_last_activity()
+        response = call_groq(text, prazo=novo_prazo())
         return response
 
     except Exception as e:
@@ -401,10 +497,9 @@ def ai_openrouter():
             return "Erro: O campo 'text' não pode estar vazio", 400
 
         # Chama a função que encapsula a lógica do OpenRouter
-        response_text = call_openrouter(user_text)
+        response_text = call_openrouter(user_text, prazo=novo_prazo())
 
         # Retorna apenas o texto puro
-        PingManager.update_last_activity()
         return response_text, 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
     except Exception as e:
@@ -451,5 +546,4 @@ def ai_benchmark():
     benchmark_model("Groq", call_groq)
     benchmark_model("OpenRouter", call_openrouter)
 
-    PingManager.update_last_activity()
     return jsonify(results)
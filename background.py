@@ -0,0 +1,459 @@
+"""
+Executor de tarefas em segundo plano (efeitos colaterais que não precisam segurar a resposta)
+USO: import background
+     background.init_app(app)
+     background.enfileirar("bonus_indicacao", chave=f"indicacao:{id}", user_id=id, tokens=100)  # durável
+     background.executar(email_check.verificar_e_marcar, id, email)                         # só em memória
+
+Dois tipos de tarefa:
+- enfileirar(nome, ...): tarefa registrada com @tarefa("nome"), gravada numa fila SQLite
+  (BACKGROUND_QUEUE_PATH) antes de rodar. Entrega pelo menos uma vez: falhas são reagendadas com
+  backoff exponencial até BACKGROUND_MAX_ATTEMPTS, e uma tarefa reservada por um processo que morreu
+  volta para a fila quando o lease (BACKGROUND_LEASE_S) expira. As tarefas precisam ser idempotentes.
+  `chave` evita enfileirar de novo a mesma tarefa enquanto ela ainda está na fila.
+- executar(func, ...): melhor esforço, só em memória (logs, marcações baratas).
+
+A fila fica por padrão em database/lingobot_background.db, ao lado do banco SQLite local. Em
+hosts com disco efêmero (Render, containers) BACKGROUND_QUEUE_PATH precisa apontar para um volume
+persistente; em /tmp as tarefas pendentes se perdem a cada deploy/restart.
+
+Varreduras (@varredura("nome")) reconciliam o que pode ter ficado sem tarefa (ex.: o processo
+morreu entre o commit e o enfileiramento): o poller as roda logo após subir e depois a cada
+BACKGROUND_SWEEP_S, uma vez por período no total (TarefaAgendada), não uma vez por worker.
+
+O pool tem BACKGROUND_MAX_WORKERS threads e no máximo BACKGROUND_MAX_PENDING tarefas em andamento;
+com o pool cheio, executar() roda a função na própria requisição e as tarefas duráveis esperam
+na fila. No encerramento do processo o executor espera até BACKGROUND_DRAIN_TIMEOUT_S pelas
+tarefas em andamento; as duráveis que não terminaram voltam para a fila.
+BACKGROUND_ENABLED=0 roda tudo de forma síncrona (CLI, depuração).
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+BACKGROUND_ENABLED = os.getenv("BACKGROUND_ENABLED", "1") == "1"
+BACKGROUND_QUEUE_PATH = os.getenv(
+    "BACKGROUND_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "lingobot_background.db")
+)
+BACKGROUND_MAX_WORKERS = int(os.getenv("BACKGROUND_MAX_WORKERS", "4"))
+BACKGROUND_MAX_PENDING = int(os.getenv("BACKGROUND_MAX_PENDING", "500"))
+BACKGROUND_MAX_ATTEMPTS = int(os.getenv("BACKGROUND_MAX_ATTEMPTS", "5"))
+BACKGROUND_RETRY_BASE_S = float(os.getenv("BACKGROUND_RETRY_BASE_S", "2"))
+BACKGROUND_RETRY_MAX_S = float(os.getenv("BACKGROUND_RETRY_MAX_S", "300"))
+BACKGROUND_LEASE_S = float(os.getenv("BACKGROUND_LEASE_S", "300"))
+BACKGROUND_POLL_S = float(os.getenv("BACKGROUND_POLL_S", "2"))
+BACKGROUND_DRAIN_TIMEOUT_S = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT_S", "10"))
+BACKGROUND_SWEEP_S = float(os.getenv("BACKGROUND_SWEEP_S", "300"))
+
+# Nome -> função(**payload), executada dentro do app context
+TAREFAS = {}
+# Nome -> função sem argumentos, executada dentro do app context pelo poller
+VARREDURAS = {}
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("enqueued", "deduplicated", "executed", "retried", "failed", "ran_inline", "sweeps")
+_stats = dict.fromkeys(CONTADORES, 0)
+_stats_lock = threading.Lock()
+
+
+def tarefa(nome):
+    """Registra uma função como tarefa durável"""
+    def decorator(func):
+        TAREFAS[nome] = func
+        return func
+    return decorator
+
+
+def varredura(nome):
+    """Registra uma função de reconciliação periódica"""
+    def decorator(func):
+        VARREDURAS[nome] = func
+        return func
+    return decorator
+
+
+def _contar(chave, quantidade=1):
+    with _stats_lock:
+        _stats[chave] += quantidade
+
+
+def _backoff(tentativas):
+    return min(BACKGROUND_RETRY_BASE_S * 2 ** (tentativas - 1), BACKGROUND_RETRY_MAX_S) * random.uniform(0.8, 1.2)
+
+
+class FilaDuravel:
+    """Fila em SQLite (WAL) compartilhada pelos workers do mesmo host; reserva por UPDATE condicional"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._local = threading.local()
+        # Conexões SQLite não podem atravessar um fork (workers do gunicorn com preload)
+        os.register_at_fork(after_in_child=self._descartar_conexoes)
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tarefa ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "nome TEXT NOT NULL, "
+                "payload TEXT NOT NULL, "
+                "chave TEXT UNIQUE, "
+                "status TEXT NOT NULL DEFAULT 'pending', "  # pending, running, failed
+                "tentativas INTEGER NOT NULL DEFAULT 0, "
+                "disponivel_em REAL NOT NULL, "
+                "criada_em REAL NOT NULL, "
+                "erro TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_tarefa_status_disponivel ON tarefa (status, disponivel_em)")
+
+    def _descartar_conexoes(self):
+        self._local = threading.local()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return _Transacao(conn)
+
+    def inserir(self, nome, payload, chave=None):
+        """Grava a tarefa; retorna o id, ou None se já existe uma tarefa com a mesma chave"""
+        agora = time.time()
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tarefa (nome, payload, chave, disponivel_em, criada_em) VALUES (?, ?, ?, ?, ?)",
+                (nome, payload, chave, agora, agora)
+            )
+            return cursor.lastrowid if cursor.rowcount == 1 else None
+
+    def reservar(self, limite=1, id_tarefa=None):
+        """
+        Reserva até `limite` tarefas vencidas (pendentes ou com lease expirado) para este processo.
+        Retorna [(id, nome, payload, tentativas)] já com a tentativa atual contada.
+        """
+        agora = time.time()
+        with self._conexao() as conn:
+            if id_tarefa is not None:
+                candidatas = conn.execute(
+                    "SELECT id, nome, payload, tentativas, status, disponivel_em FROM tarefa WHERE id = ?",
+                    (id_tarefa,)
+                ).fetchall()
+            else:
+                candidatas = conn.execute(
+                    "SELECT id, nome, payload, tentativas, status, disponivel_em FROM tarefa "
+                    "WHERE status IN ('pending', 'running') AND disponivel_em <= ? ORDER BY disponivel_em LIMIT ?",
+                    (agora, limite)
+                ).fetchall()
+            reservadas = []
+            for id_, nome, payload, tentativas, status, disponivel_em in candidatas:
+                if status == "failed" or disponivel_em > agora:
+                    continue
+                # Compare-and-set: só um processo consegue mudar a linha a partir deste estado
+                if conn.execute(
+                    "UPDATE tarefa SET status = 'running', tentativas = tentativas + 1, disponivel_em = ? "
+                    "WHERE id = ? AND status = ? AND disponivel_em = ?",
+                    (agora + BACKGROUND_LEASE_S, id_, status, disponivel_em)
+                ).rowcount == 1:
+                    reservadas.append((id_, nome, payload, tentativas + 1))
+            return reservadas
+
+    def concluir(self, id_tarefa):
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM tarefa WHERE id = ?", (id_tarefa,))
+
+    def reagendar(self, id_tarefa, tentativas, erro):
+        """Agenda nova tentativa com backoff; retorna False se as tentativas acabaram (status failed)"""
+        esgotada = tentativas >= BACKGROUND_MAX_ATTEMPTS
+        with self._conexao() as conn:
+            conn.execute(
+                "UPDATE tarefa SET status = ?, disponivel_em = ?, erro = ? WHERE id = ?",
+                ("failed" if esgotada else "pending", time.time() + _backoff(tentativas), erro[:1000], id_tarefa)
+            )
+        return not esgotada
+
+    def liberar(self, id_tarefa):
+        """Devolve uma tarefa reservada que não chegou a rodar (sem gastar tentativa)"""
+        with self._conexao() as conn:
+            conn.execute(
+                "UPDATE tarefa SET status = 'pending', tentativas = MAX(tentativas - 1, 0), disponivel_em = ? "
+                "WHERE id = ? AND status = 'running'",
+                (time.time(), id_tarefa)
+            )
+
+    def contagens(self):
+        with self._conexao() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM tarefa GROUP BY status").fetchall())
+
+
+class _Transacao:
+    """BEGIN IMMEDIATE ... COMMIT numa conexão em autocommit (evita upgrade de lock no SQLite)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, tipo, *_):
+        self.conn.execute("ROLLBACK" if tipo else "COMMIT")
+
+
+_app = None
+_fila = None
+_trabalho = None  # queue.Queue com (função, args) para as threads do pool
+_poller = None
+_parar = threading.Event()
+_encerrando = False
+_em_andamento = 0
+_reservadas = set()  # ids de tarefas duráveis reservadas por este processo
+_condicao = threading.Condition()
+_inicio_lock = threading.Lock()
+
+
+def _resetar_no_fork():
+    # Threads não sobrevivem ao fork: o filho recria o pool e o poller no primeiro uso
+    global _trabalho, _poller, _em_andamento, _condicao, _inicio_lock, _parar
+    _trabalho = None
+    _poller = None
+    _em_andamento = 0
+    _reservadas.clear()
+    _condicao = threading.Condition()
+    _inicio_lock = threading.Lock()
+    _parar = threading.Event()
+
+
+os.register_at_fork(after_in_child=_resetar_no_fork)
+
+
+def fila():
+    global _fila
+    if _fila is None:
+        with _inicio_lock:
+            if _fila is None:
+                _fila = FilaDuravel(BACKGROUND_QUEUE_PATH)
+    return _fila
+
+
+def iniciar():
+    """Cria o pool e o poller da fila durável neste processo (idempotente)"""
+    global _trabalho, _poller
+    if _trabalho is not None or not BACKGROUND_ENABLED or _encerrando:
+        return
+    with _inicio_lock:
+        if _trabalho is None:
+            trabalho = queue.Queue()
+            # Threads daemon: o encerramento espera no máximo BACKGROUND_DRAIN_TIMEOUT_S por elas
+            for numero in range(BACKGROUND_MAX_WORKERS):
+                threading.Thread(target=_trabalhar, args=(trabalho,), name=f"background-{numero}", daemon=True).start()
+            _poller = threading.Thread(target=_consultar_fila, name="background-poller", daemon=True)
+            _poller.start()
+            _trabalho = trabalho
+
+
+def init_app(app):
+    """Guarda o app (tarefas rodam no app context) e registra o dreno no encerramento"""
+    global _app
+    _app = app
+    # Com preload do gunicorn o pool só é criado depois do fork, na primeira requisição
+    app.before_request(iniciar)
+    atexit.register(encerrar)
+
+
+def _submeter(func, *args):
+    global _em_andamento
+    with _condicao:
+        if _trabalho is None or _encerrando or _em_andamento >= BACKGROUND_MAX_PENDING:
+            return False
+        _em_andamento += 1
+        _trabalho.put((func, args))
+    return True
+
+
+def _finalizado():
+    global _em_andamento
+    with _condicao:
+        _em_andamento -= 1
+        _condicao.notify_all()
+
+
+def _trabalhar(trabalho):
+    while True:
+        item = trabalho.get()
+        if item is None:
+            return
+        func, args = item
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"❌ Erro no executor em segundo plano: {e}")
+        finally:
+            _finalizado()
+
+
+def _no_contexto(func, *args, **kwargs):
+    if _app is None:
+        return func(*args, **kwargs)
+    with _app.app_context():
+        return func(*args, **kwargs)
+
+
+def _tentar(func, args, kwargs, tentativas):
+    for tentativa in range(1, tentativas + 1):
+        try:
+            _no_contexto(func, *args, **kwargs)
+            _contar("executed")
+            return
+        except Exception as e:
+            if tentativa == tentativas:
+                _contar("failed")
+                print(f"❌ Tarefa em segundo plano {getattr(func, '__name__', func)} falhou: {e}")
+                return
+            _contar("retried")
+            time.sleep(_backoff(tentativa))
+
+
+def executar(func, *args, tentativas=1, **kwargs):
+    """Roda func(*args, **kwargs) no pool (melhor esforço); com o pool cheio, roda aqui mesmo"""
+    iniciar()
+    if not _submeter(_tentar, func, args, kwargs, tentativas):
+        _contar("ran_inline")
+        _tentar(func, args, kwargs, 1)
+
+
+def _rodar_duravel(id_tarefa, nome, payload, tentativas):
+    try:
+        _no_contexto(TAREFAS[nome], **json.loads(payload))
+        fila().concluir(id_tarefa)
+        _contar("executed")
+    except Exception as e:
+        if fila().reagendar(id_tarefa, tentativas, repr(e)):
+            _contar("retried")
+        else:
+            _contar("failed")
+            print(f"❌ Tarefa {nome} #{id_tarefa} desistida após {tentativas} tentativas: {e}")
+    finally:
+        with _condicao:
+            _reservadas.discard(id_tarefa)
+
+
+def _despachar(reservadas):
+    for id_tarefa, nome, payload, tentativas in reservadas:
+        with _condicao:
+            _reservadas.add(id_tarefa)
+        if not _submeter(_rodar_duravel, id_tarefa, nome, payload, tentativas):
+            with _condicao:
+                _reservadas.discard(id_tarefa)
+            fila().liberar(id_tarefa)
+
+
+def enfileirar(nome, chave=None, **payload):
+    """
+    Grava a tarefa `nome` na fila durável e a despacha já, se houver vaga no pool.
+    Retorna o id da tarefa (None se deduplicada por `chave`).
+    """
+    if nome not in TAREFAS:
+        raise KeyError(f"Tarefa desconhecida: {nome}")
+    if not BACKGROUND_ENABLED:
+        _contar("ran_inline")
+        _no_contexto(TAREFAS[nome], **payload)
+        return None
+
+    iniciar()
+    id_tarefa = fila().inserir(nome, json.dumps(payload), chave)
+    if id_tarefa is None:
+        _contar("deduplicated")
+        return None
+    _contar("enqueued")
+    if _em_andamento < BACKGROUND_MAX_PENDING:
+        _despachar(fila().reservar(id_tarefa=id_tarefa))
+    return id_tarefa
+
+
+def _rodar_varreduras():
+    """Roda as varreduras do período atual que nenhum outro processo já reservou"""
+    from database import TarefaAgendada
+
+    periodo = f"{int(time.time() // BACKGROUND_SWEEP_S):012d}"
+    for nome, func in VARREDURAS.items():
+        try:
+            if _no_contexto(TarefaAgendada.reservar, f"varredura:{nome}", periodo):
+                _no_contexto(func)
+                _contar("sweeps")
+        except Exception as e:
+            print(f"⚠️ Erro na varredura {nome}: {e}")
+
+
+def _consultar_fila():
+    """Poller: pega tarefas vencidas (novas de outros workers, retries, leases expirados) e roda as varreduras"""
+    proxima_varredura = 0.0
+    while not _parar.wait(BACKGROUND_POLL_S):
+        if VARREDURAS and time.monotonic() >= proxima_varredura:
+            proxima_varredura = time.monotonic() + BACKGROUND_SWEEP_S
+            _rodar_varreduras()
+        try:
+            vagas = min(BACKGROUND_MAX_WORKERS * 2, BACKGROUND_MAX_PENDING - _em_andamento)
+            if vagas > 0:
+                _despachar(fila().reservar(limite=vagas))
+        except Exception as e:
+            print(f"⚠️ Erro ao consultar a fila de tarefas: {e}")
+
+
+def encerrar(timeout=BACKGROUND_DRAIN_TIMEOUT_S):
+    """Para de aceitar tarefas, espera as em andamento e devolve à fila as duráveis que não terminaram"""
+    global _encerrando, _trabalho
+    if _trabalho is None:
+        return
+    _encerrando = True
+    _parar.set()
+    limite = time.monotonic() + timeout
+    with _condicao:
+        while _em_andamento > 0 and time.monotonic() < limite:
+            _condicao.wait(limite - time.monotonic())
+        restantes = list(_reservadas)
+    for _ in range(BACKGROUND_MAX_WORKERS):
+        _trabalho.put(None)
+    _trabalho = None
+    for id_tarefa in restantes:
+        fila().liberar(id_tarefa)
+    if restantes:
+        print(f"⚠️ {len(restantes)} tarefa(s) devolvida(s) à fila no encerramento")
+
+
+def stats():
+    """Contadores do executor e tamanho da fila durável por status"""
+    with _stats_lock:
+        dados = dict(_stats)
+    dados["in_flight"] = _em_andamento
+    if _fila is not None:
+        contagens = _fila.contagens()
+        for status in ("pending", "running", "failed"):
+            dados[f"queue_{status}"] = contagens.get(status, 0)
+    return dados
+
+
+# ==========================================
+# TAREFAS
+# ==========================================
+
+@tarefa("bonus_indicacao")
+def _bonus_indicacao(user_id, tokens):
+    """Credita o bônus a quem indicou user_id; idempotente (referral_bonus_paid)"""
+    from database import Usuario
+
+    Usuario.pagar_bonus_indicacao(user_id, tokens)
+
+
+@tarefa("verificar_email")
+def _verificar_email(user_id, email):
+    """Consulta DNS do domínio e marca o usuário como undeliverable se for o caso"""
+    import email_check
+
+    email_check.verificar_e_marcar(user_id, email)
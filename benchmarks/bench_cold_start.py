@@ -0,0 +1,103 @@
+"""
+Benchmark do cold start: tempo de import do app e tempo até a primeira resposta do /ping
+USO: python benchmarks/bench_cold_start.py [--execucoes 5] [--top 15] [--orcamento-ms 1500]
+
+Cada execução é um processo Python novo (como um worker recém-criado no Render), com SQLite
+local em WAL. Sai com código 1 se a mediana do tempo até a primeira resposta passar do orçamento
+(COLD_START_BUDGET_MS), para servir de verificação em CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLD_START_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1500"))
+
+# Roda num processo novo: importa o app e faz o primeiro /ping pelo test client
+SCRIPT_PRIMEIRA_RESPOSTA = """
+import time
+inicio = time.perf_counter()
+from main import app
+importado = time.perf_counter()
+resposta = app.test_client().get("/ping")
+fim = time.perf_counter()
+assert resposta.status_code == 200, resposta.status_code
+print(f"{(importado - inicio) * 1000:.1f} {(fim - inicio) * 1000:.1f}")
+"""
+
+
+def ambiente(caminho_banco):
+    env = dict(os.environ)
+    env["DATABASE_MODE"] = "sqlite"
+    env["SQLITE_PATH"] = caminho_banco
+    env.setdefault("JWT_SECRET_KEY", "benchmark-cold-start-" + "x" * 32)
+    env.setdefault("EMAIL_VALIDATION_MODE", "syntax")
+    return env
+
+
+def modulos_mais_lentos(env, top):
+    """Roda `python -X importtime -c "import main"` e devolve os módulos com maior tempo acumulado"""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=RAIZ, env=env, capture_output=True, text=True, check=True
+    )
+    tempos = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, proprio, acumulado, modulo = [parte.strip() for parte in linha.replace("import time:", "|").split("|")]
+        tempos.append((int(acumulado) / 1000, int(proprio) / 1000, modulo))
+    tempos.sort(reverse=True)
+    return tempos[:top]
+
+
+def primeira_resposta(env):
+    resultado = subprocess.run(
+        [sys.executable, "-c", SCRIPT_PRIMEIRA_RESPOSTA],
+        cwd=RAIZ, env=env, capture_output=True, text=True, check=True
+    )
+    importacao_ms, primeira_ms = resultado.stdout.strip().splitlines()[-1].split()
+    return float(importacao_ms), float(primeira_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--execucoes", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--orcamento-ms", type=float, default=COLD_START_BUDGET_MS)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="lingobot-cold-start-")
+    env = ambiente(os.path.join(pasta, "cold.db"))
+
+    # A primeira execução cria o banco; as medições usam o schema já pronto, como num restart
+    primeira_resposta(env)
+
+    print(f"Módulos mais lentos no import de main (top {args.top}):")
+    print(f"{'acumulado':>12} {'próprio':>10}  módulo")
+    for acumulado, proprio, modulo in modulos_mais_lentos(env, args.top):
+        print(f"{acumulado:>9.1f} ms {proprio:>7.1f} ms  {modulo}")
+
+    importacoes, respostas = [], []
+    for _ in range(args.execucoes):
+        importacao_ms, primeira_ms = primeira_resposta(env)
+        importacoes.append(importacao_ms)
+        respostas.append(primeira_ms)
+
+    mediana = statistics.median(respostas)
+    print()
+    print(f"import main          mediana {statistics.median(importacoes):>8.1f} ms  (máx {max(importacoes):.1f} ms)")
+    print(f"primeira resposta    mediana {mediana:>8.1f} ms  (máx {max(respostas):.1f} ms)")
+    print(f"orçamento            {args.orcamento_ms:>16.1f} ms")
+
+    if mediana > args.orcamento_ms:
+        print("❌ Cold start acima do orçamento")
+        sys.exit(1)
+    print("✅ Cold start dentro do orçamento")
+
+
+if __name__ == "__main__":
+    main()
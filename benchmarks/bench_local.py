@@ -0,0 +1,86 @@
+"""
+Benchmark da API inteira numa única máquina, com SQLite em WAL (sem Postgres nem serviços externos)
+USO: python benchmarks/bench_local.py [--usuarios 200] [--leituras 2000]
+
+Mede cadastro, login, leitura/atualização de usuário e ranking através do test client do Flask,
+ou seja, o custo do app em si (roteamento, ORM, serialização, banco), sem rede.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def configurar_ambiente(caminho_banco):
+    os.environ["DATABASE_MODE"] = "sqlite"
+    os.environ["SQLITE_PATH"] = caminho_banco
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-local-" + "x" * 32)
+    os.environ.setdefault("EMAIL_VALIDATION_MODE", "syntax")
+    os.environ.setdefault("GROQ_KEY", "benchmark")
+
+
+def medir(nome, funcao, repeticoes):
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    total_s = sum(tempos) / 1000
+    print(
+        f"{nome:<28} {repeticoes:>6} req  {repeticoes / total_s:>9.1f} req/s  "
+        f"p50 {statistics.median(tempos):>7.2f} ms  p95 {tempos[int(len(tempos) * 0.95) - 1]:>7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--leituras", type=int, default=2000)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="lingobot-bench-")
+    configurar_ambiente(os.path.join(pasta, "bench.db"))
+
+    from main import app
+
+    client = app.test_client()
+
+    def esperar_ok(resposta, *status):
+        if resposta.status_code not in status:
+            raise RuntimeError(f"{resposta.status_code}: {resposta.get_data(as_text=True)[:200]}")
+
+    def cadastro(i):
+        esperar_ok(client.post("/usuarios", json={
+            "nome": "Bench", "sobrenome": "Usuario", "email": f"bench{i}@example.com", "password": "senha123"
+        }), 201)
+
+    def login(i):
+        esperar_ok(client.post("/login", json={
+            "email": f"bench{i % args.usuarios}@example.com", "password": "senha123"
+        }), 200)
+
+    def leitura(i):
+        esperar_ok(client.get(f"/usuarios/{i % args.usuarios + 1}"), 200)
+
+    def atualizacao(i):
+        esperar_ok(client.put(f"/usuarios/{i % args.usuarios + 1}", json={"gemas": i}), 200)
+
+    def ranking(i):
+        esperar_ok(client.get("/ranking"), 200)
+
+    print(f"Banco: {os.environ['SQLITE_PATH']}")
+    medir("POST /usuarios (cadastro)", cadastro, args.usuarios)
+    medir("POST /login", login, min(args.usuarios, 200))
+    medir("GET /usuarios/<id>", leitura, args.leituras)
+    medir("PUT /usuarios/<id>", atualizacao, args.leituras // 4)
+    medir("GET /ranking", ranking, max(args.leituras // 20, 10))
+
+
+if __name__ == "__main__":
+    main()
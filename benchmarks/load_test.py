@@ -0,0 +1,140 @@
+"""
+Teste de carga do servidor de produção: compara os tipos de worker do gunicorn.conf.py
+USO: python benchmarks/load_test.py [--tipos sync,gthread,gevent] [--workers 2] [--clientes 64] [--requisicoes 400]
+
+Para cada tipo de worker sobe um `gunicorn -c gunicorn.conf.py wsgi:app` de verdade (com preload),
+com SQLite local e o backend de tradução "stub" dormindo TRANSLATION_STUB_LATENCY_MS por chamada,
+que faz o papel de um provedor externo lento (IA/TTS). Cada requisição manda textos inéditos para o
+POST /traducao (sem acerto de cache), disparadas por --clientes conexões simultâneas.
+Com o mesmo número de processos, o sync atende uma chamada por vez por worker; gthread e gevent
+sobrepõem as esperas, e o req/s sobe quase na proporção das threads/greenlets.
+
+Precisa do gunicorn instalado (e do gevent para o tipo gevent; tipos sem o pacote são pulados).
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCIA_PROVEDOR_MS = os.getenv("TRANSLATION_STUB_LATENCY_MS", "200")
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def ambiente(tipo, workers, caminho_banco, porta):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_MODE": "sqlite",
+        "SQLITE_PATH": caminho_banco,
+        "EMAIL_VALIDATION_MODE": "syntax",
+        "TRANSLATION_BACKEND": "stub",
+        "TRANSLATION_STUB_LATENCY_MS": LATENCIA_PROVEDOR_MS,
+        "WEB_WORKER_CLASS": tipo,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(porta),
+        "GUNICORN_ACCESS_LOG": "",
+        "GUNICORN_LOG_LEVEL": "warning",
+    })
+    env.setdefault("JWT_SECRET_KEY", "benchmark-carga-" + "x" * 32)
+    return env
+
+
+def aguardar_pronto(porta, processo, limite_s=30):
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError(f"gunicorn saiu com código {processo.returncode}")
+        try:
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=2)
+            conexao.request("GET", "/ping")
+            if conexao.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn não respondeu ao /ping a tempo")
+
+
+def rodar_carga(porta, clientes, requisicoes, prefixo):
+    """Dispara as requisições com `clientes` conexões simultâneas; retorna (latências ms, erros, duração s)"""
+    def requisitar(i):
+        corpo = json.dumps({"textos": [f"{prefixo} frase numero {i}"], "from": "en", "to": "pt"})
+        inicio = time.perf_counter()
+        try:
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=60)
+            conexao.request("POST", "/traducao", body=corpo, headers={"Content-Type": "application/json"})
+            resposta = conexao.getresponse()
+            resposta.read()
+            conexao.close()
+            ok = resposta.status == 200
+        except OSError:
+            ok = False
+        return (time.perf_counter() - inicio) * 1000, ok
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        resultados = list(executor.map(requisitar, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+    latencias = sorted(tempo for tempo, ok in resultados if ok)
+    return latencias, sum(1 for _, ok in resultados if not ok), duracao
+
+
+def medir_tipo(tipo, args):
+    porta = porta_livre()
+    with tempfile.TemporaryDirectory() as pasta:
+        env = ambiente(tipo, args.workers, os.path.join(pasta, "carga.db"), porta)
+        processo = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=RAIZ, env=env
+        )
+        try:
+            aguardar_pronto(porta, processo)
+            rodar_carga(porta, min(args.clientes, 8), 16, f"aquecimento {tipo}")
+            latencias, erros, duracao = rodar_carga(porta, args.clientes, args.requisicoes, f"carga {tipo}")
+        finally:
+            processo.terminate()
+            processo.wait(timeout=60)
+
+    if not latencias:
+        print(f"{tipo:<8} todas as {erros} requisições falharam")
+        return
+    print(
+        f"{tipo:<8} {args.workers:>3} workers  {len(latencias) / duracao:>8.1f} req/s  "
+        f"p50 {statistics.median(latencias):>8.1f} ms  p95 {latencias[int(len(latencias) * 0.95) - 1]:>8.1f} ms  "
+        f"erros {erros}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tipos", default="sync,gthread,gevent")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--requisicoes", type=int, default=400)
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("gunicorn") is None:
+        sys.exit("gunicorn não está instalado (pip install -r requirements.txt)")
+
+    print(f"Provedor simulado: {LATENCIA_PROVEDOR_MS} ms por chamada, {args.clientes} clientes, {args.requisicoes} requisições")
+    for tipo in args.tipos.split(","):
+        if tipo == "gevent" and importlib.util.find_spec("gevent") is None:
+            print(f"{tipo:<8} pulado (gevent não instalado)")
+            continue
+        medir_tipo(tipo, args)
+
+
+if __name__ == "__main__":
+    main()
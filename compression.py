@@ -0,0 +1,164 @@
+"""
+Compressão negociada das respostas (gzip, ou brotli se o pacote estiver instalado)
+USO: import compression
+     compression.init_app(app)   # after_request que comprime JSON/texto conforme o Accept-Encoding
+
+- Só comprime tipos textuais (JSON, NDJSON, texto, SSE...); áudio do /tts e arquivos enviados com
+  send_file passam direto (já são comprimidos ou vão em passthrough).
+- Respostas completas abaixo de COMPRESSION_MIN_SIZE bytes não são comprimidas.
+- Respostas em streaming (/usuarios, SSE) são comprimidas incrementalmente: o compressor descarrega
+  a cada COMPRESSION_STREAM_FLUSH_BYTES de entrada (a cada evento em text/event-stream), então o
+  cliente continua recebendo os dados aos poucos.
+- COMPRESSION_LEVEL (gzip, 1-9) e COMPRESSION_BROTLI_QUALITY (0-11) trocam CPU por tráfego.
+ETags fortes viram fracas na resposta comprimida (o corpo muda, a representação não).
+"""
+import os
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só gzip
+    brotli = None
+
+from flask import request
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_STREAM_FLUSH_BYTES = int(os.getenv("COMPRESSION_STREAM_FLUSH_BYTES", "16384"))
+
+TIPOS_COMPRESSIVEIS = (
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "image/svg+xml", "text/"
+)
+CODIFICACOES = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("compressed", "streamed", "skipped_small", "bytes_in", "bytes_out")
+_stats = dict.fromkeys(CONTADORES, 0)
+_stats_lock = threading.Lock()
+
+
+def _contar(**incrementos):
+    with _stats_lock:
+        for chave, valor in incrementos.items():
+            _stats[chave] += valor
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: formato gzip (cabeçalho + CRC), não deflate cru
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados):
+        return self._compressor.compress(dados)
+
+    def descarregar(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def comprimir(self, dados):
+        return self._compressor.process(dados)
+
+    def descarregar(self):
+        return self._compressor.flush()
+
+    def finalizar(self):
+        return self._compressor.finish()
+
+
+COMPRESSORES = {"gzip": _Gzip, "br": _Brotli}
+
+
+def _compressivel(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return False
+    if "no-transform" in response.headers.get("Cache-Control", ""):
+        return False
+    return (response.mimetype or "").startswith(TIPOS_COMPRESSIVEIS)
+
+
+def _adicionar_vary(response):
+    if "accept-encoding" not in response.headers.get("Vary", "").lower():
+        response.vary.add("Accept-Encoding")
+
+
+def _etag_fraca(response):
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        response.headers["ETag"] = f"W/{etag}"
+
+
+def _comprimir_stream(iteravel, compressor, descarregar_sempre):
+    pendente = 0
+    try:
+        for trecho in iteravel:
+            if isinstance(trecho, str):
+                trecho = trecho.encode("utf-8")
+            pendente += len(trecho)
+            _contar(bytes_in=len(trecho))
+            saida = compressor.comprimir(trecho)
+            if descarregar_sempre or pendente >= COMPRESSION_STREAM_FLUSH_BYTES:
+                saida += compressor.descarregar()
+                pendente = 0
+            if saida:
+                _contar(bytes_out=len(saida))
+                yield saida
+        saida = compressor.finalizar()
+        _contar(bytes_out=len(saida))
+        yield saida
+    finally:
+        if hasattr(iteravel, "close"):
+            iteravel.close()
+
+
+def comprimir_resposta(response):
+    """after_request: comprime a resposta se o cliente aceita e o tipo/tamanho compensam"""
+    if not COMPRESSION_ENABLED or not _compressivel(response):
+        return response
+    _adicionar_vary(response)
+    codificacao = request.accept_encodings.best_match(CODIFICACOES)
+    if codificacao is None or request.method == "HEAD":
+        return response
+
+    compressor = COMPRESSORES[codificacao]()
+    if response.is_streamed:
+        descarregar_sempre = response.mimetype == "text/event-stream"
+        response.response = _comprimir_stream(response.response, compressor, descarregar_sempre)
+        response.headers.pop("Content-Length", None)
+        _contar(streamed=1)
+    else:
+        dados = response.get_data()
+        if len(dados) < COMPRESSION_MIN_SIZE:
+            _contar(skipped_small=1)
+            return response
+        comprimido = compressor.comprimir(dados) + compressor.finalizar()
+        if len(comprimido) >= len(dados):
+            return response
+        response.set_data(comprimido)
+        _contar(compressed=1, bytes_in=len(dados), bytes_out=len(comprimido))
+
+    response.headers["Content-Encoding"] = codificacao
+    _etag_fraca(response)
+    return response
+
+
+def init_app(app):
+    """Registra a compressão; deve ser o último after_request registrado (roda primeiro)"""
+    app.after_request(comprimir_resposta)
@@ -0,0 +1,146 @@
+import os
+
+from flask import Blueprint, jsonify, request
+
+import content_store
+from database import Usuario
+
+# Conteúdo estático (textos, textos longos, temas) servido a partir da memória; ver content_store.py
+content = Blueprint("content", __name__)
+
+CONTENT_MAX_AGE = int(os.getenv("CONTENT_MAX_AGE", "3600"))  # segundos de cache no cliente/CDN
+LIMITE_MAXIMO_CONTEUDO = 200
+MAXIMO_SORTEIO = 20
+
+
+def _colecao_ou_404(nome):
+    if nome not in content_store.ARQUIVOS:
+        return None, (jsonify({"erro": f"Conteúdo desconhecido: {nome}"}), 404)
+    return content_store.colecao(nome), None
+
+
+@content.route("/conteudo", methods=["GET"])
+def listar_conteudos():
+    """Coleções disponíveis, com a quantidade de itens por dificuldade e a ETag de cada uma"""
+    return jsonify({
+        nome: {
+            "total": colecao.total(),
+            "etag": colecao.etag,
+            "difficulties": {dificuldade: len(itens) for dificuldade, itens in colecao.por_dificuldade.items()}
+        }
+        for nome, colecao in ((nome, content_store.colecao(nome)) for nome in content_store.ARQUIVOS)
+    })
+
+
+@content.route("/conteudo/<nome>", methods=["GET"])
+def obter_conteudo(nome):
+    """
+    Itens de uma coleção (textos, textos_longos, temas).
+    - sem parâmetros: o arquivo inteiro ({"easy": [...], ...})
+    - difficulty=easy&limit=N&offset=X: uma página da dificuldade; retorna {"itens", "total", "next_offset"}
+    Responde 304 quando o If-None-Match bate com a ETag (o conteúdo só muda num novo deploy).
+    """
+    colecao, erro = _colecao_ou_404(nome)
+    if erro:
+        return erro
+
+    dificuldade = request.args.get("difficulty")
+    if dificuldade is None:
+        etag = colecao.etag
+
+        def corpo():
+            return dict(colecao.por_dificuldade)
+    else:
+        if dificuldade not in colecao.por_dificuldade:
+            return jsonify({"erro": f"Dificuldade inválida: {dificuldade}"}), 400
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limite = min(max(request.args.get("limit", LIMITE_MAXIMO_CONTEUDO, type=int), 1), LIMITE_MAXIMO_CONTEUDO)
+        itens = colecao.itens(dificuldade)
+        etag = f"{colecao.etags[dificuldade]}-{offset}-{limite}"
+
+        def corpo():
+            proximo = offset + limite
+            return {
+                "itens": itens[offset:proximo],
+                "total": len(itens),
+                "next_offset": proximo if proximo < len(itens) else None
+            }
+
+    headers = {"Cache-Control": f"public, max-age={CONTENT_MAX_AGE}"}
+    # ETag fraca: a mesma representação vale comprimida ou não (ver compression.py)
+    if request.if_none_match.contains_weak(etag):
+        return "", 304, {**headers, "ETag": f'W/"{etag}"'}
+
+    response = jsonify(corpo())
+    response.set_etag(etag, weak=True)
+    response.headers.update(headers)
+    return response
+
+
+@content.route("/usuarios/<int:id>/conteudo/<nome>/sorteio", methods=["GET"])
+def sortear_conteudo(id, nome):
+    """
+    Sorteio sem repetição por usuário: ?cursor=N (o "cursor" da resposta anterior; 0 no início)
+    &quantidade=K. A dificuldade padrão é a do usuário (Usuario.difficulty); ?difficulty= sobrescreve.
+    O cursor não é guardado no servidor: o cliente o devolve na próxima chamada.
+    """
+    colecao, erro = _colecao_ou_404(nome)
+    if erro:
+        return erro
+
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    dificuldade = request.args.get("difficulty") or dados.get("difficulty") or "easy"
+    if dificuldade not in colecao.por_dificuldade:
+        return jsonify({"erro": f"Dificuldade inválida: {dificuldade}"}), 400
+    cursor = max(request.args.get("cursor", 0, type=int), 0)
+    quantidade = min(max(request.args.get("quantidade", 1, type=int), 1), MAXIMO_SORTEIO)
+
+    sorteados, proximo_cursor = content_store.sortear(id, nome, dificuldade, cursor, quantidade)
+    total = len(colecao.itens(dificuldade))
+    response = jsonify({
+        "difficulty": dificuldade,
+        "itens": [{"index": indice, "texto": item} for indice, item in sorteados],
+        "cursor": proximo_cursor,
+        # Quantos sorteios faltam para o ciclo atual terminar (depois disso os itens voltam a aparecer)
+        "restantes_no_ciclo": total - proximo_cursor % total if total else 0
+    })
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@content.route("/usuarios/<int:id>/conteudo/textos/recomendados", methods=["GET"])
+def recomendar_textos(id):
+    """
+    Textos mais adequados ao perfil do usuário (Level, reading, listening), pelo índice de
+    features do text_index.py. ?quantidade=K, ?colecao=textos|textos_longos (padrão: ambas)
+    e ?difficulty= para restringir a uma dificuldade.
+    """
+    # numpy só é importado na primeira recomendação (ou no warming), fora do cold start
+    import text_index
+
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    colecao = request.args.get("colecao")
+    if colecao is not None and colecao not in text_index.COLECOES:
+        return jsonify({"erro": f"Coleção inválida: {colecao}"}), 400
+    dificuldade = request.args.get("difficulty")
+    if dificuldade is not None and dificuldade not in content_store.DIFICULDADES:
+        return jsonify({"erro": f"Dificuldade inválida: {dificuldade}"}), 400
+    quantidade = min(max(request.args.get("quantidade", 5, type=int), 1), MAXIMO_SORTEIO)
+
+    recomendados = text_index.recomendar(
+        dados, quantidade, colecoes=(colecao,) if colecao else text_index.COLECOES, dificuldade=dificuldade
+    )
+    for item in recomendados:
+        item["texto"] = content_store.colecao(item["collection"]).itens(item["difficulty"])[item["index"]]
+    response = jsonify({
+        "perfil": {campo: dados.get(campo) for campo in ("Level", "reading", "listening")},
+        "itens": recomendados
+    })
+    response.headers["Cache-Control"] = "no-store"
+    return response
@@ -0,0 +1,117 @@
+"""
+Conteúdo estático do app (textos, textos longos, temas) carregado uma única vez em memória
+USO: from content_store import colecao, conteudo, sortear
+     colecao("textos").itens("easy")              # tupla imutável
+     sortear(user_id, "temas", "hard", cursor)    # ([(índice, item)], próximo cursor)
+
+Cada arquivo vira uma Colecao imutável indexada por dificuldade, com ETag calculada do conteúdo.
+Os sorteios sem repetição usam um cursor sem estado no servidor: a posição N do usuário aponta
+para uma permutação do índice gerada a partir de (CONTENT_SHUFFLE_SEED, usuário, coleção,
+dificuldade, ciclo), então o mesmo cursor sempre devolve o mesmo item e um ciclo inteiro passa
+por todos os itens antes de repetir.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+
+PASTA_CONTEUDO = os.getenv("CONTENT_PATH", os.path.dirname(os.path.abspath(__file__)))
+CONTENT_SHUFFLE_SEED = os.getenv("CONTENT_SHUFFLE_SEED", "lingobot")
+
+# Nome lógico -> arquivo JSON ({"easy": [...], "medium": [...], ...})
+ARQUIVOS = {
+    "textos": "textos.json",
+    "textos_longos": "textos_longos.json",
+    "temas": "temas.json"
+}
+DIFICULDADES = ("easy", "medium", "hard")
+
+
+class Colecao:
+    """Itens de um arquivo de conteúdo, por dificuldade (tuplas imutáveis) e com ETag"""
+
+    __slots__ = ("nome", "por_dificuldade", "etag", "etags")
+
+    def __init__(self, nome, dados, etag):
+        self.nome = nome
+        self.por_dificuldade = MappingProxyType({dificuldade: tuple(itens) for dificuldade, itens in dados.items()})
+        self.etag = etag
+        # ETag por dificuldade: muda só se aquela lista mudar
+        self.etags = MappingProxyType({
+            dificuldade: hashlib.sha1(json.dumps(itens).encode("utf-8")).hexdigest()[:16]
+            for dificuldade, itens in self.por_dificuldade.items()
+        })
+
+    def itens(self, dificuldade):
+        return self.por_dificuldade.get(dificuldade, ())
+
+    def total(self):
+        return sum(len(itens) for itens in self.por_dificuldade.values())
+
+
+_colecoes = {}
+_lock = threading.Lock()
+
+
+def _carregar(nome):
+    with open(os.path.join(PASTA_CONTEUDO, ARQUIVOS[nome]), "rb") as f:
+        bruto = f.read()
+    return Colecao(nome, json.loads(bruto), hashlib.sha1(bruto).hexdigest()[:16])
+
+
+def colecao(nome):
+    """Colecao do arquivo `nome`; lê o disco só na primeira chamada"""
+    encontrada = _colecoes.get(nome)
+    if encontrada is not None:
+        return encontrada
+    if nome not in ARQUIVOS:
+        raise KeyError(f"Conteúdo desconhecido: {nome}")
+    with _lock:
+        if nome not in _colecoes:
+            _colecoes[nome] = _carregar(nome)
+        return _colecoes[nome]
+
+
+def conteudo(nome):
+    """Conteúdo do arquivo `nome` como {dificuldade: tupla de itens} (somente leitura)"""
+    return colecao(nome).por_dificuldade
+
+
+def carregar_tudo():
+    """Carrega todos os arquivos de conteúdo; retorna {nome: quantidade de itens}"""
+    return {nome: colecao(nome).total() for nome in ARQUIVOS}
+
+
+def _embaralhar(user_id, nome, dificuldade, ciclo, tamanho):
+    ordem = list(range(tamanho))
+    random.Random(f"{CONTENT_SHUFFLE_SEED}:{user_id}:{nome}:{dificuldade}:{ciclo}").shuffle(ordem)
+    return ordem
+
+
+@lru_cache(maxsize=4096)
+def _permutacao(user_id, nome, dificuldade, ciclo, tamanho):
+    ordem = _embaralhar(user_id, nome, dificuldade, ciclo, tamanho)
+    # Evita repetir na virada do ciclo (último do ciclo anterior == primeiro deste). Com mais de
+    # 2 itens a troca nunca mexe no último elemento, então basta a permutação crua anterior.
+    if ciclo > 0 and tamanho > 2 and ordem[0] == _embaralhar(user_id, nome, dificuldade, ciclo - 1, tamanho)[-1]:
+        ordem[0], ordem[1] = ordem[1], ordem[0]
+    return tuple(ordem)
+
+
+def sortear(user_id, nome, dificuldade, cursor=0, quantidade=1):
+    """
+    Próximos `quantidade` itens da sequência embaralhada do usuário a partir de `cursor`.
+    Retorna (lista de (índice, item), próximo cursor).
+    """
+    itens = colecao(nome).itens(dificuldade)
+    if not itens:
+        return [], cursor
+    tamanho = len(itens)
+    sorteados = []
+    for posicao in range(cursor, cursor + quantidade):
+        indice = _permutacao(user_id, nome, dificuldade, posicao // tamanho, tamanho)[posicao % tamanho]
+        sorteados.append((indice, itens[indice]))
+    return sorteados, cursor + quantidade
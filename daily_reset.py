@@ -0,0 +1,174 @@
+"""
+Reset diário das missões (dailyMissions) de todos os usuários, feito no servidor
+USO: flask --app main resetar-missoes   (ou DAILY_RESET_ENABLED=1 para agendar no próprio app)
+
+O reset é feito em lotes por faixa de id, cada lote em sua própria transação, para não
+segurar locks na tabela inteira. No Postgres cada lote é um único UPDATE com jsonb;
+nos demais bancos o JSON é recalculado em Python e gravado com executemany.
+No fim o cache de usuários é limpo; para isso alcançar os outros workers (e valer quando o
+reset roda pela CLI) o user_cache precisa do backend compartilhado sqlite.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, text
+
+from database import TarefaAgendada, UsuarioRevisao, db, json_nativo
+from user_cache import user_cache
+
+DAILY_RESET_ENABLED = os.getenv("DAILY_RESET_ENABLED", "0") == "1"
+DAILY_RESET_HOUR_UTC = int(os.getenv("DAILY_RESET_HOUR_UTC", "3"))  # 03:00 UTC = meia-noite em Brasília
+DAILY_RESET_BATCH = int(os.getenv("DAILY_RESET_BATCH", "1000"))
+
+MISSOES_DIARIAS = ("writing", "reading", "listening", "speaking")
+NOME_TAREFA = "daily_missions_reset"
+
+# (pid, thread) do agendador deste processo
+_agendador = None
+
+
+def proximo_reset(agora=None):
+    """Data/hora (UTC) do próximo reset diário"""
+    agora = agora or datetime.now(timezone.utc)
+    reset = agora.replace(hour=DAILY_RESET_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if reset <= agora:
+        reset += timedelta(days=1)
+    return reset
+
+
+def valores_resetados(proximo_refresh_ms):
+    """Chaves de dailyMissions sobrescritas pelo reset (strikes é tratado à parte)"""
+    valores = {missao: False for missao in MISSOES_DIARIAS}
+    valores.update({f"chestWasOpen{i}": False for i in range(1, 5)})
+    valores.update({"chestsOpenedAt": 0, "refreshTimeAt": proximo_refresh_ms})
+    return valores
+
+
+def missoes_resetadas(missoes, proximo_refresh_ms):
+    """
+    Aplica o reset a um dicionário de dailyMissions.
+    A sequência (strikes) é preservada se o usuário completou ao menos uma missão
+    no dia; caso contrário volta a zero. rewardPerChest e outras chaves são mantidas.
+    """
+    completou_alguma = any(missoes.get(missao) for missao in MISSOES_DIARIAS)
+    novas = dict(missoes)
+    novas.update(valores_resetados(proximo_refresh_ms))
+    novas["strikes"] = (missoes.get("strikes") or 0) if completou_alguma else 0
+    return novas
+
+
+def _sql_reset_postgres(nativo):
+    missoes = '"dailyMissions"' if nativo else 'CAST("dailyMissions" AS jsonb)'
+    completou_alguma = " OR ".join(
+        f"COALESCE(({missoes}->>'{missao}')::boolean, false)" for missao in MISSOES_DIARIAS
+    )
+    novo_valor = (
+        f"{missoes} || CAST(:reset AS jsonb) || jsonb_build_object('strikes', "
+        f"CASE WHEN {completou_alguma} THEN COALESCE(({missoes}->>'strikes')::int, 0) ELSE 0 END)"
+    )
+    if not nativo:
+        novo_valor = f"CAST(({novo_valor}) AS TEXT)"
+    return text(
+        f'UPDATE usuario SET revision = revision + 1, "dailyMissions" = {novo_valor} '
+        f"WHERE id >= :inicio AND id < :fim RETURNING id, revision"
+    )
+
+
+def _resetar_lote_python(conn, inicio, fim, proximo_refresh_ms):
+    # O UPDATE inicial trava as linhas do lote; a leitura seguinte já enxerga o estado final
+    faixa = {"inicio": inicio, "fim": fim}
+    conn.execute(text("UPDATE usuario SET revision = revision + 1 WHERE id >= :inicio AND id < :fim"), faixa)
+    linhas = conn.execute(
+        text('SELECT id, "dailyMissions", revision FROM usuario WHERE id >= :inicio AND id < :fim'), faixa
+    ).all()
+    if not linhas:
+        return []
+    conn.execute(
+        text('UPDATE usuario SET "dailyMissions" = :missoes WHERE id = :id'),
+        [
+            {
+                "id": linha.id,
+                "missoes": json.dumps(missoes_resetadas(json.loads(linha.dailyMissions or "{}"), proximo_refresh_ms))
+            }
+            for linha in linhas
+        ]
+    )
+    return [(linha.id, linha.revision) for linha in linhas]
+
+
+def resetar_missoes_diarias(tamanho_lote=DAILY_RESET_BATCH):
+    """Reseta as missões de todos os usuários; precisa de app context. Retorna estatísticas."""
+    inicio_execucao = time.time()
+    proximo_refresh_ms = int(proximo_reset().timestamp() * 1000)
+    engine = db.engine
+    postgres = engine.dialect.name == "postgresql"
+    sql_postgres = _sql_reset_postgres(json_nativo(engine.dialect)) if postgres else None
+    reset = json.dumps(valores_resetados(proximo_refresh_ms))
+
+    with engine.connect() as conn:
+        menor_id, maior_id = conn.execute(text("SELECT min(id), max(id) FROM usuario")).one()
+
+    usuarios = 0
+    lotes = 0
+    if menor_id is not None:
+        for inicio in range(menor_id, maior_id + 1, tamanho_lote):
+            fim = inicio + tamanho_lote
+            with engine.begin() as conn:
+                if postgres:
+                    alterados = conn.execute(sql_postgres, {"inicio": inicio, "fim": fim, "reset": reset}).all()
+                else:
+                    alterados = _resetar_lote_python(conn, inicio, fim, proximo_refresh_ms)
+                if alterados:
+                    conn.execute(insert(UsuarioRevisao.__table__), [
+                        {"usuario_id": user_id, "revision": revisao, "campos": "dailyMissions"}
+                        for user_id, revisao in alterados
+                    ])
+            usuarios += len(alterados)
+            lotes += 1
+
+    # O reset roda num só processo (um worker ou a CLI); só o backend sqlite leva a limpeza aos demais
+    if not user_cache.limpar():
+        print(
+            "⚠️ USER_CACHE_BACKEND=memory: outros processos podem servir as missões de ontem "
+            "até o USER_CACHE_TTL; use o backend sqlite com mais de um processo"
+        )
+    resultado = {
+        "usuarios": usuarios,
+        "lotes": lotes,
+        "duracao_ms": round((time.time() - inicio_execucao) * 1000),
+        "proximo_refresh_ms": proximo_refresh_ms
+    }
+    print(f"🔄 Missões diárias resetadas: {resultado}")
+    return resultado
+
+
+def iniciar_agendador(app):
+    """
+    Agenda o reset diário numa thread do app (só um worker executa por dia).
+    Idempotente por processo: com preload do gunicorn a thread do master não existe nos workers,
+    então o post_fork chama de novo (ver gunicorn.conf.py).
+    """
+    global _agendador
+    if not DAILY_RESET_ENABLED:
+        return None
+    if _agendador is not None and _agendador[0] == os.getpid() and _agendador[1].is_alive():
+        return _agendador[1]
+
+    def loop():
+        while True:
+            reset = proximo_reset()
+            time.sleep(max((reset - datetime.now(timezone.utc)).total_seconds(), 0))
+            try:
+                with app.app_context():
+                    if TarefaAgendada.reservar(NOME_TAREFA, reset.date().isoformat()):
+                        resetar_missoes_diarias()
+            except Exception as e:
+                print(f"❌ Falha no reset diário das missões: {e}")
+
+    thread = threading.Thread(target=loop, name="daily-reset", daemon=True)
+    thread.start()
+    _agendador = (os.getpid(), thread)
+    return thread
@@ -2,19 +2,89 @@ from email.policy import default
 
 import bcrypt
 import json
+import os
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, event, func, inspect, insert, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session, validates
+from sqlalchemy.types import TypeDecorator
+
+from user_cache import user_cache
 
 db = SQLAlchemy()
 
+# "text" (padrão) guarda items/dailyMissions/achievements como JSON serializado em TEXT;
+# "jsonb" usa JSONB nativo no Postgres, permitindo atualizações parciais no servidor
+USER_JSON_STORAGE = os.getenv("USER_JSON_STORAGE", "text").lower()
+
+
+# Quantidade de conquistas do jogo; a conquista N corresponde ao bit N de achievements_bits
+TOTAL_CONQUISTAS = 55
+
+
+def conquistas_padrao():
+    """JSON inicial de conquistas (todas bloqueadas)"""
+    return {"achievements": [False] * TOTAL_CONQUISTAS}
+
+
+def conquistas_para_bits(achievements):
+    """Converte o JSON de conquistas ({"achievements": [bool, ...]}) para o inteiro bitset"""
+    if isinstance(achievements, str):
+        achievements = json.loads(achievements)
+    lista = (achievements or {}).get("achievements") or []
+    bits = 0
+    for indice, desbloqueada in enumerate(lista[:TOTAL_CONQUISTAS]):
+        if desbloqueada:
+            bits |= 1 << indice
+    return bits
+
+
+def bits_para_conquistas(bits):
+    """Expande o bitset para a lista de booleanos usada pelo frontend"""
+    bits = bits or 0
+    return [bool(bits >> indice & 1) for indice in range(TOTAL_CONQUISTAS)]
+
+
+def json_nativo(dialect):
+    """Indica se as colunas JSON do usuário estão em JSONB nesse banco"""
+    return USER_JSON_STORAGE == "jsonb" and dialect.name == "postgresql"
+
+
+class JSONTexto(TypeDecorator):
+    """
+    Coluna JSON que o app continua enxergando como string (mesmo contrato de antes),
+    armazenada como TEXT ou como JSONB nativo conforme USER_JSON_STORAGE.
+    """
+    impl = db.Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if json_nativo(dialect):
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(db.Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if json_nativo(dialect):
+            return json.loads(value) if isinstance(value, str) else value
+        return value if isinstance(value, str) else json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
+
 
 class Usuario(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     sobrenome = db.Column(db.String(100), nullable=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
+    email_status = db.Column(db.String(20), nullable=True)  # "pending" até a verificação em segundo plano; "undeliverable"
     password = db.Column(db.String(255), nullable=False)
     OTP_code = db.Column(db.String(10), nullable=True)
     LingoEXP = db.Column(db.Integer, default=0)
@@ -25,7 +95,9 @@ class Usuario(db.Model):
     plano = db.Column(db.String(50), default="free")
     created_at = db.Column(db.String(50))
     referal_code = db.Column(db.String(50), unique=True, nullable=True)
-    invited_by = db.Column(db.String(50), nullable=True)
+    invited_by = db.Column(db.String(50), nullable=True, index=True)
+    # Bônus de indicação já creditado a quem indicou (a tarefa em segundo plano pode repetir)
+    referral_bonus_paid = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     ranking = db.Column(db.Integer, default=4)
 
     # Níveis de habilidade
@@ -35,20 +107,29 @@ class Usuario(db.Model):
     speaking = db.Column(db.Integer, default=1)
 
     gemas = db.Column(db.Integer, default=10)
-    items = db.Column(db.Text, nullable=False)
-    dailyMissions = db.Column(db.Text, nullable=False)
-    achievements = db.Column(db.Text, nullable=False)
+    items = db.Column(JSONTexto, nullable=False)
+    dailyMissions = db.Column(JSONTexto, nullable=False)
+    achievements = db.Column(JSONTexto, nullable=False)
+    achievements_bits = db.Column(db.BigInteger, default=0, server_default="0", nullable=False)
     difficulty = db.Column(db.String(50), default="easy")
     battery = db.Column(db.Integer, default=10, nullable=False)
 
     learning = db.Column(db.String(50), default="english")
 
+    # Revisão monotônica do registro, incrementada a cada alteração (sync incremental/ETag)
+    revision = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
 
     __table_args__ = (
         CheckConstraint('battery >= 0 AND battery <= 10', name='check_battery_range'),
     )
 
+    # Colunas que só o servidor grava (ou derivadas de outras): o cliente devolve os claims do JWT
+    # inteiros, e achievements_bits vai neles como hexadecimal (ver serializar)
+    CAMPOS_DO_SERVIDOR = frozenset({
+        "id", "password", "achievements_bits", "revision", "referral_bonus_paid", "email_status"
+    })
+
     def __init__(self, nome, sobrenome, email, password, gender=None, data_nascimento=None,
                  referal_code=None, invited_by=None, items=None, plano=None, learning=None, dailyMissions=None, achievements=None):
         self.nome = nome
@@ -78,20 +159,64 @@ class Usuario(db.Model):
             "refreshTimeAt": 0
         }
         self.dailyMissions = dailyMissions if dailyMissions else json.dumps(default_daily_missions)
-        default_achievements = {
-            "achievements": [
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False,
-                False, False, False, False, False
-            ]
+        self.achievements = achievements if achievements else json.dumps(conquistas_padrao())
+
+    @validates("achievements")
+    def _sincronizar_bits_conquistas(self, key, value):
+        """Mantém achievements_bits coerente sempre que o JSON de conquistas é reescrito"""
+        if value is not None:
+            self.achievements_bits = conquistas_para_bits(value)
+        return value
+
+    def tem_conquista(self, indice):
+        """Verifica se a conquista `indice` está desbloqueada"""
+        return bool((self.achievements_bits or 0) >> indice & 1)
+
+    def marcar_conquista(self, indice):
+        """Desbloqueia a conquista `indice` (bitset e JSON)"""
+        if not 0 <= indice < TOTAL_CONQUISTAS:
+            raise ValueError(f"Conquista fora do intervalo (0 a {TOTAL_CONQUISTAS - 1})")
+        self.achievements = json.dumps({"achievements": bits_para_conquistas((self.achievements_bits or 0) | 1 << indice)})
+
+    def total_conquistas(self):
+        """Quantidade de conquistas desbloqueadas"""
+        return bin(self.achievements_bits or 0).count("1")
+
+    @staticmethod
+    def filtro_conquista(indice):
+        """Predicado para consultas: usuários que têm a conquista `indice`"""
+        return Usuario.achievements_bits.op("&")(1 << indice) != 0
+
+    def colunas(self):
+        """Valores brutos de todas as colunas (formato guardado no cache)"""
+        return {campo: getattr(self, campo) for campo in Usuario.__table__.columns.keys()}
+
+    def to_dict(self, achievements_format="list"):
+        """Serializa todas as colunas do usuário (ver Usuario.serializar)"""
+        return Usuario.serializar(self.colunas(), achievements_format)
+
+    @staticmethod
+    def serializar(colunas, achievements_format="list"):
+        """
+        Prepara as colunas do usuário para a resposta JSON.
+        achievements_format="bits" omite o JSON de conquistas e envia só o bitset (bem menor).
+        O bitset vai como string hexadecimal, pois passa de 2^53 e perderia precisão em JavaScript.
+        """
+        dados = dict(colunas)
+        if "achievements_bits" in dados:
+            dados["achievements_bits"] = format(dados["achievements_bits"] or 0, "x")
+        if achievements_format == "bits":
+            dados.pop("achievements", None)
+        return dados
+
+    @staticmethod
+    def campos_do_cliente(dados):
+        """Colunas não nulas de `dados` que o cliente pode gravar (sem CAMPOS_DO_SERVIDOR)"""
+        colunas = Usuario.__table__.columns.keys()
+        return {
+            campo: valor for campo, valor in dados.items()
+            if campo in colunas and campo not in Usuario.CAMPOS_DO_SERVIDOR and valor is not None
         }
-        self.achievements = achievements if achievements else json.dumps(default_achievements)
 
     def update_user(self, **kwargs):
         """Atualiza os dados do usuário"""
@@ -107,13 +232,59 @@ class Usuario(db.Model):
 
     @staticmethod
     def get_user_by_id(user_id):
-        """Retorna um usuário pelo ID"""
-        return Usuario.query.get(user_id)
+        """Retorna um usuário pelo ID (passando pelo cache)"""
+        dados = user_cache.obter(user_id)
+        if dados is not None:
+            return Usuario._do_cache(dados)
+
+        marca = user_cache.marca()
+        usuario = db.session.get(Usuario, user_id)
+        if usuario:
+            user_cache.guardar(usuario.colunas(), marca)
+        return usuario
 
     @staticmethod
     def get_user_by_email(email):
-        """Retorna um usuário pelo email"""
-        return Usuario.query.filter_by(email=email).first()
+        """Retorna um usuário pelo email (passando pelo cache)"""
+        user_id = user_cache.obter_id_por_email(email)
+        if user_id is not None:
+            dados = user_cache.obter(user_id)
+            if dados is not None and dados["email"] == email:
+                return Usuario._do_cache(dados)
+
+        marca = user_cache.marca()
+        usuario = Usuario.query.filter_by(email=email).first()
+        if usuario:
+            user_cache.guardar(usuario.colunas(), marca)
+        return usuario
+
+    @staticmethod
+    def obter_dados(user_id):
+        """Colunas do usuário como dict, sem montar objeto ORM quando há acerto no cache"""
+        dados = user_cache.obter(user_id)
+        if dados is None:
+            marca = user_cache.marca()
+            usuario = db.session.get(Usuario, user_id)
+            if not usuario:
+                return None
+            dados = usuario.colunas()
+            user_cache.guardar(dados, marca)
+        return dados
+
+    @staticmethod
+    def _do_cache(dados):
+        """Reconstrói um Usuario persistente na sessão a partir do cache, sem ir ao banco"""
+        # Instância já carregada (talvez alterada) nesta sessão é mais nova que o cache: o merge
+        # copiaria o estado do cache por cima dela
+        chave = Usuario.__mapper__.identity_key_from_primary_key((dados["id"],))
+        existente = db.session.identity_map.get(chave)
+        if existente is not None:
+            return existente
+        usuario = Usuario.__mapper__.class_manager.new_instance()
+        for campo, valor in dados.items():
+            setattr(usuario, campo, valor)
+        make_transient_to_detached(usuario)
+        return db.session.merge(usuario, load=False)
 
     @staticmethod
     def insert_user(nome, sobrenome, email, password, gender=None, data_nascimento=None, referal_code=None,
@@ -125,6 +296,160 @@ class Usuario(db.Model):
         db.session.commit()
         return novo_usuario
 
+    @staticmethod
+    def incrementar_item(user_id, item_name, delta=1, commit=True, novo_item=None):
+        """
+        Soma `delta` ao campo quant do item `item_name` sem reescrever o resto do inventário.
+        Se o item não existir e `novo_item` for informado, adiciona {**novo_item, itemName, quant=delta}.
+        Retorna a nova quantidade, ou None se o usuário/item não existir.
+        """
+        if json_nativo(db.session.get_bind().dialect):
+            resultado = db.session.execute(text("""
+                UPDATE usuario SET revision = revision + 1, items = (
+                    SELECT COALESCE(jsonb_agg(
+                        CASE WHEN t.elem->>'itemName' = :nome
+                             THEN jsonb_set(t.elem, '{quant}', to_jsonb(COALESCE((t.elem->>'quant')::int, 0) + :delta))
+                             ELSE t.elem END
+                        ORDER BY t.pos), '[]'::jsonb)
+                    FROM jsonb_array_elements(usuario.items) WITH ORDINALITY AS t(elem, pos)
+                )
+                WHERE id = :id
+                  AND EXISTS (SELECT 1 FROM jsonb_array_elements(usuario.items) e WHERE e->>'itemName' = :nome)
+                RETURNING revision, (SELECT (e->>'quant')::int FROM jsonb_array_elements(items) e
+                                     WHERE e->>'itemName' = :nome LIMIT 1)
+            """), {"id": user_id, "nome": item_name, "delta": delta}).first()
+            if resultado is None and novo_item is not None:
+                resultado = db.session.execute(text("""
+                    UPDATE usuario SET revision = revision + 1, items = items || jsonb_build_array(CAST(:item AS jsonb))
+                    WHERE id = :id
+                      AND NOT EXISTS (SELECT 1 FROM jsonb_array_elements(usuario.items) e WHERE e->>'itemName' = :nome)
+                    RETURNING revision, CAST(:delta AS integer)
+                """), {
+                    "id": user_id, "nome": item_name, "delta": delta,
+                    "item": json.dumps({**novo_item, "itemName": item_name, "quant": delta})
+                }).first()
+            nova_quant = None
+            if resultado:
+                registrar_revisao(db.session, user_id, resultado[0], ["items"])
+                _expirar_carregado(db.session, user_id, ["items", "revision"])
+                nova_quant = resultado[1]
+        else:
+            # Armazenamento em TEXT: read-modify-write com lock da linha. Sem autoflush, alterações
+            # pendentes do mesmo usuário (ex.: lote do game_state) vão num único UPDATE no fim
+            with db.session.no_autoflush:
+                usuario = db.session.query(Usuario).filter_by(id=user_id).with_for_update().first()
+            nova_quant = None
+            if usuario:
+                itens = json.loads(usuario.items)
+                for item in itens:
+                    if item.get("itemName") == item_name:
+                        item["quant"] = (item.get("quant") or 0) + delta
+                        nova_quant = item["quant"]
+                        break
+                else:
+                    if novo_item is not None:
+                        itens.append({**novo_item, "itemName": item_name, "quant": delta})
+                        nova_quant = delta
+                if nova_quant is not None:
+                    usuario.items = json.dumps(itens)
+
+        _marcar_alterado(db.session, user_id)
+        if commit:
+            db.session.commit()
+        return nova_quant
+
+    @staticmethod
+    def marcar_missao(user_id, chave, valor=True, commit=True):
+        """
+        Altera uma única chave de dailyMissions (ex.: "chestWasOpen2") sem reescrever o JSON inteiro.
+        Retorna True se o usuário existir.
+        """
+        if json_nativo(db.session.get_bind().dialect):
+            revisao = db.session.execute(text("""
+                UPDATE usuario SET revision = revision + 1,
+                                   "dailyMissions" = jsonb_set("dailyMissions", ARRAY[:chave], CAST(:valor AS jsonb))
+                WHERE id = :id
+                RETURNING revision
+            """), {"id": user_id, "chave": chave, "valor": json.dumps(valor)}).scalar()
+            atualizado = revisao is not None
+            if atualizado:
+                registrar_revisao(db.session, user_id, revisao, ["dailyMissions"])
+                _expirar_carregado(db.session, user_id, ["dailyMissions", "revision"])
+        else:
+            with db.session.no_autoflush:
+                usuario = db.session.query(Usuario).filter_by(id=user_id).with_for_update().first()
+            atualizado = usuario is not None
+            if usuario:
+                missoes = json.loads(usuario.dailyMissions)
+                missoes[chave] = valor
+                usuario.dailyMissions = json.dumps(missoes)
+
+        _marcar_alterado(db.session, user_id)
+        if commit:
+            db.session.commit()
+        return atualizado
+
+    @staticmethod
+    def creditar_indicacao(referal_code, tokens):
+        """
+        Credita tokens a quem possui o código de referência com um UPDATE atômico
+        (tokens = tokens + N), sem read-modify-write. Não faz commit.
+        Retorna o id do usuário creditado, ou None se o código não existir.
+        """
+        resultado = db.session.execute(
+            update(Usuario.__table__)
+            .where(Usuario.referal_code == referal_code)
+            .values(tokens=func.coalesce(Usuario.tokens, 0) + tokens, revision=Usuario.revision + 1)
+            .returning(Usuario.id, Usuario.revision)
+        ).first()
+        if resultado is None:
+            return None
+        registrar_revisao(db.session, resultado.id, resultado.revision, ["tokens"])
+        _marcar_alterado(db.session, resultado.id)
+        return resultado.id
+
+    @staticmethod
+    def pagar_bonus_indicacao(user_id, tokens):
+        """
+        Credita o bônus de indicação do cadastro user_id a quem o indicou, uma única vez:
+        a marcação referral_bonus_paid e o crédito vão na mesma transação, e a marcação é
+        condicional, então repetir a chamada não credita de novo. Retorna o id creditado ou None.
+        """
+        marcado = db.session.execute(
+            update(Usuario.__table__)
+            .where(Usuario.id == user_id, Usuario.referral_bonus_paid.is_(False), Usuario.invited_by.isnot(None))
+            .values(referral_bonus_paid=True, revision=Usuario.revision + 1)
+            .returning(Usuario.invited_by, Usuario.revision)
+        ).first()
+        if marcado is None:
+            db.session.rollback()
+            return None
+        registrar_revisao(db.session, user_id, marcado.revision, ["referral_bonus_paid"])
+        _marcar_alterado(db.session, user_id)
+        creditado = Usuario.creditar_indicacao(marcado.invited_by, tokens)
+        db.session.commit()
+        return creditado
+
+    @staticmethod
+    def bonus_indicacao_pendentes(limite=500):
+        """Ids de cadastros com indicação cujo bônus ainda não foi pago (varredura de reconciliação)"""
+        return db.session.scalars(
+            select(Usuario.id)
+            .where(Usuario.invited_by.isnot(None), Usuario.referral_bonus_paid.is_(False))
+            .order_by(Usuario.id)
+            .limit(limite)
+        ).all()
+
+    @staticmethod
+    def verificacoes_email_pendentes(limite=500):
+        """(id, email) de cadastros cuja verificação de e-mail ainda não rodou (varredura de reconciliação)"""
+        return db.session.execute(
+            select(Usuario.id, Usuario.email)
+            .where(Usuario.email_status == "pending")
+            .order_by(Usuario.id)
+            .limit(limite)
+        ).all()
+
     @staticmethod
     def get_all_users():
         """Retorna todos os usuários"""
@@ -138,3 +463,198 @@ class Usuario(db.Model):
     def check_password(self, password):
         """Verifica se a senha fornecida é válida."""
         return bcrypt.checkpw(password.encode('utf-8'), self.password.encode('utf-8'))
+
+
+# Quantas revisões por usuário ficam no log; clientes mais atrasados recebem o registro completo
+REVISOES_RETIDAS = 200
+
+
+class UsuarioRevisao(db.Model):
+    """Log de quais campos mudaram em cada revisão do usuário (base do sync incremental)"""
+    __tablename__ = "usuario_revisao"
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    campos = db.Column(db.Text, nullable=False)  # nomes das colunas separados por vírgula
+
+    __table_args__ = (
+        db.Index("ix_usuario_revisao_usuario_revision", "usuario_id", "revision"),
+    )
+
+    @staticmethod
+    def campos_desde(user_id, revisao_cliente, revisao_atual):
+        """
+        Campos alterados entre revisao_cliente (exclusive) e revisao_atual (inclusive).
+        Retorna None se o log não cobre todo o intervalo (cliente precisa de sync completo).
+        """
+        if revisao_atual - revisao_cliente > REVISOES_RETIDAS:
+            return None
+        linhas = db.session.execute(
+            select(UsuarioRevisao.revision, UsuarioRevisao.campos).where(
+                UsuarioRevisao.usuario_id == user_id,
+                UsuarioRevisao.revision > revisao_cliente,
+                UsuarioRevisao.revision <= revisao_atual
+            )
+        ).all()
+        if {linha.revision for linha in linhas} != set(range(revisao_cliente + 1, revisao_atual + 1)):
+            return None
+        return {campo for linha in linhas for campo in linha.campos.split(",")}
+
+
+def registrar_revisao(conn, user_id, revisao, campos):
+    """Grava no log os campos alterados na revisão (conn pode ser Connection ou Session)"""
+    conn.execute(insert(UsuarioRevisao.__table__).values(
+        usuario_id=user_id, revision=revisao, campos=",".join(sorted(campos))
+    ))
+    if revisao % 50 == 0:
+        conn.execute(UsuarioRevisao.__table__.delete().where(
+            UsuarioRevisao.usuario_id == user_id,
+            UsuarioRevisao.revision <= revisao - REVISOES_RETIDAS
+        ))
+
+
+class TarefaAgendada(db.Model):
+    """Controle de execução de tarefas periódicas (evita que vários workers rodem a mesma tarefa)"""
+    __tablename__ = "tarefa_agendada"
+
+    nome = db.Column(db.String(100), primary_key=True)
+    ultimo_periodo = db.Column(db.String(50), nullable=False)
+    executada_em = db.Column(db.String(50))
+
+    @staticmethod
+    def reservar(nome, periodo):
+        """
+        Reserva a execução de `nome` no `periodo` (ex.: a data do dia).
+        Só um processo recebe True por período: a troca é um UPDATE condicional.
+        """
+        agora = datetime.utcnow().isoformat()
+        with db.engine.begin() as conn:
+            reservada = conn.execute(
+                update(TarefaAgendada.__table__)
+                .where(TarefaAgendada.nome == nome, TarefaAgendada.ultimo_periodo < periodo)
+                .values(ultimo_periodo=periodo, executada_em=agora)
+            ).rowcount == 1
+        if reservada:
+            return True
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(TarefaAgendada.__table__).values(
+                    nome=nome, ultimo_periodo=periodo, executada_em=agora
+                ))
+            return True
+        except IntegrityError:
+            return False
+
+
+class Traducao(db.Model):
+    """Cache persistente de traduções (palavra ou frase) por par de idiomas; ver translation.py"""
+    __tablename__ = "traducao"
+
+    id = db.Column(db.Integer, primary_key=True)
+    origem = db.Column(db.String(10), nullable=False)
+    destino = db.Column(db.String(10), nullable=False)
+    chave = db.Column(db.String(40), nullable=False)  # sha1 do texto normalizado
+    tipo = db.Column(db.String(10), nullable=False)  # "palavra" ou "frase"
+    texto = db.Column(db.Text, nullable=False)
+    traducao = db.Column(db.Text, nullable=False)
+    backend = db.Column(db.String(30))
+    criada_em = db.Column(db.String(50))
+
+    __table_args__ = (
+        db.UniqueConstraint("origem", "destino", "chave", name="uq_traducao_par_chave"),
+    )
+
+    @staticmethod
+    def buscar(origem, destino, chaves):
+        """{chave: tradução} das chaves já traduzidas nesse par de idiomas (uma consulta)"""
+        if not chaves:
+            return {}
+        with db.engine.connect() as conn:
+            linhas = conn.execute(
+                select(Traducao.chave, Traducao.traducao).where(
+                    Traducao.origem == origem, Traducao.destino == destino, Traducao.chave.in_(chaves)
+                )
+            ).all()
+        return {linha.chave: linha.traducao for linha in linhas}
+
+    @staticmethod
+    def guardar(linhas):
+        """
+        Grava traduções novas ignorando as que outro worker gravou antes
+        (ON CONFLICT DO NOTHING no Postgres/SQLite).
+        """
+        if not linhas:
+            return
+        agora = datetime.utcnow().isoformat()
+        linhas = [{**linha, "criada_em": agora} for linha in linhas]
+        with db.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+            elif conn.dialect.name == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+            else:
+                for linha in linhas:
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(insert(Traducao.__table__).values(**linha))
+                    except IntegrityError:
+                        pass
+                return
+            conn.execute(insert_dialeto(Traducao.__table__).on_conflict_do_nothing(), linhas)
+
+
+# ==========================================
+# INVALIDAÇÃO DO CACHE DE USUÁRIOS
+# ==========================================
+
+def _marcar_alterado(session, user_id):
+    """Agenda a invalidação do usuário no cache para quando a transação for confirmada"""
+    session.info.setdefault("usuarios_alterados", set()).add(user_id)
+
+
+def _expirar_carregado(session, user_id, campos):
+    """Colunas alteradas por SQL direto: descarta os valores da instância já carregada na sessão, se houver"""
+    usuario = session.identity_map.get(Usuario.__mapper__.identity_key_from_primary_key((user_id,)))
+    if usuario is not None:
+        session.expire(usuario, campos)
+
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _usuario_alterado(mapper, connection, target):
+    _marcar_alterado(object_session(target), target.id)
+
+
+# ==========================================
+# REVISÕES DO USUÁRIO
+# ==========================================
+
+@event.listens_for(Usuario, "before_update")
+def _incrementar_revisao(mapper, connection, target):
+    # revision é só do servidor: um valor atribuído pelo ORM nunca é gravado, nem sozinho
+    estado = inspect(target)
+    campos = [
+        coluna for coluna in Usuario.__table__.columns.keys()
+        if coluna != "revision" and estado.attrs[coluna].history.has_changes()
+    ]
+    if campos:
+        # Incremento no próprio UPDATE: com o lock da linha, escritas concorrentes geram revisões distintas
+        target.revision = Usuario.revision + 1
+        target._campos_revisao = campos
+    elif estado.attrs.revision.history.has_changes():
+        target.revision = Usuario.revision
+
+
+@event.listens_for(Usuario, "after_update")
+def _registrar_revisao_orm(mapper, connection, target):
+    campos = target.__dict__.pop("_campos_revisao", None)
+    if campos:
+        revisao = connection.scalar(select(Usuario.revision).where(Usuario.id == target.id))
+        registrar_revisao(connection, target.id, revisao, campos)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_usuarios_alterados(session):
+    for user_id in session.info.pop("usuarios_alterados", ()):
+        user_cache.invalidar(user_id)
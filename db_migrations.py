@@ -0,0 +1,233 @@
+"""
+Migrações de schema idempotentes, aplicadas em ordem e registradas na tabela schema_migrations
+USO: flask --app main aplicar-migracoes
+     garantir_schema(db.engine)   # bootstrap no início do app; depois disso é só uma flag em memória
+
+Tabelas novas precisam de uma migração própria: o create_all da 0000 só roda uma vez por banco.
+
+No boot o app só aplica migrações com DB_AUTO_MIGRATE=1 (padrão: só no SQLite local). No Postgres
+algumas migrações reescrevem a tabela inteira (ex.: 0001, TEXT -> JSONB) e, sem o preload do gunicorn,
+cada worker que sobe ficaria esperando no advisory lock; em produção rode o comando acima no deploy.
+Sem o auto-apply, garantir_schema só confere (uma vez) se há pendências e avisa no log.
+"""
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from database import USER_JSON_STORAGE, UsuarioRevisao, conquistas_para_bits, db
+
+# Chave do advisory lock do Postgres que serializa migrações entre workers que sobem juntos
+_CHAVE_LOCK_MIGRACOES = 7_413_020
+
+# "1" aplica as pendentes no boot, "0" só confere; vazio: aplica só no SQLite
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "")
+
+_schema_pronto = False
+_schema_verificado = False
+_schema_lock = threading.Lock()
+
+# Lista ordenada de (id, descrição, função, aplica_se). A função recebe a conexão aberta;
+# aplica_se(conn) retorna False quando a migração não vale para esse banco (não roda, não é
+# registrada e não conta como pendente).
+MIGRACOES = []
+
+
+def migracao(id_migracao, descricao, aplica_se=None):
+    """Registra uma função como migração"""
+    def decorator(func):
+        MIGRACOES.append((id_migracao, descricao, func, aplica_se))
+        return func
+    return decorator
+
+
+def _aplica(conn, aplica_se):
+    return aplica_se is None or aplica_se(conn)
+
+
+def auto_migrar(engine):
+    """Se o app deve aplicar as migrações pendentes no boot (DB_AUTO_MIGRATE)"""
+    if DB_AUTO_MIGRATE in ("0", "1"):
+        return DB_AUTO_MIGRATE == "1"
+    return engine.dialect.name == "sqlite"
+
+
+def _garantir_tabela_controle(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "id VARCHAR(100) PRIMARY KEY, "
+        "aplicada_em VARCHAR(50) NOT NULL)"
+    ))
+
+
+def migracoes_aplicadas(conn):
+    """Retorna o conjunto de ids já aplicados"""
+    _garantir_tabela_controle(conn)
+    return {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def _colunas(conn, tabela):
+    return {coluna["name"] for coluna in inspect(conn).get_columns(tabela)}
+
+
+def migracoes_pendentes(engine):
+    """Ids das migrações ainda não registradas que se aplicam a esse banco"""
+    with engine.begin() as conn:
+        ja_aplicadas = migracoes_aplicadas(conn)
+        return [
+            id_migracao for id_migracao, _, _, aplica_se in MIGRACOES
+            if id_migracao not in ja_aplicadas and _aplica(conn, aplica_se)
+        ]
+
+
+def aplicar_migracoes(engine):
+    """Aplica as migrações pendentes; retorna a lista de ids aplicados nesta execução"""
+    global _schema_pronto
+    aplicadas = []
+    with engine.connect() as conn_lock:
+        postgres = engine.dialect.name == "postgresql"
+        if postgres:
+            conn_lock.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": _CHAVE_LOCK_MIGRACOES})
+            conn_lock.commit()
+        try:
+            with engine.begin() as conn:
+                ja_aplicadas = migracoes_aplicadas(conn)
+
+            for id_migracao, descricao, func, aplica_se in MIGRACOES:
+                if id_migracao in ja_aplicadas:
+                    continue
+                with engine.begin() as conn:
+                    if not _aplica(conn, aplica_se):
+                        continue
+                    func(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (id, aplicada_em) VALUES (:id, :em)"),
+                        {"id": id_migracao, "em": datetime.utcnow().isoformat()}
+                    )
+                print(f"🗄️ Migração aplicada: {id_migracao} - {descricao}")
+                aplicadas.append(id_migracao)
+        finally:
+            if postgres:
+                conn_lock.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": _CHAVE_LOCK_MIGRACOES})
+                conn_lock.commit()
+    _schema_pronto = True
+    return aplicadas
+
+
+def garantir_schema(engine):
+    """
+    Bootstrap do schema, uma única vez por processo: aplica o que estiver pendente (DB_AUTO_MIGRATE)
+    ou só confere e avisa. Depois da primeira chamada bem-sucedida é só a leitura de uma flag (sem
+    consultas ao catálogo). Retorna a lista de migrações aplicadas nesta chamada.
+    """
+    global _schema_pronto, _schema_verificado
+    if _schema_verificado:
+        return []
+    with _schema_lock:
+        if _schema_verificado:
+            return []
+        aplicadas = []
+        if auto_migrar(engine):
+            aplicadas = aplicar_migracoes(engine)
+        else:
+            pendentes = migracoes_pendentes(engine)
+            _schema_pronto = not pendentes
+            if pendentes:
+                print(
+                    f"⚠️ Migrações pendentes: {', '.join(pendentes)} "
+                    "(rode flask --app main aplicar-migracoes ou suba com DB_AUTO_MIGRATE=1)"
+                )
+        _schema_verificado = True
+        return aplicadas
+
+
+def schema_pronto():
+    return _schema_pronto
+
+
+# ==========================================
+# MIGRAÇÕES
+# ==========================================
+
+@migracao("0000_criar_tabelas", "criação inicial das tabelas a partir dos models")
+def _criar_tabelas(conn):
+    db.metadata.create_all(conn)
+
+
+@migracao(
+    "0001_usuario_json_nativo", "items/dailyMissions/achievements de TEXT para JSONB",
+    aplica_se=lambda conn: conn.dialect.name == "postgresql" and USER_JSON_STORAGE == "jsonb"
+)
+def _usuario_json_nativo(conn):
+    for coluna in ("items", '"dailyMissions"', "achievements"):
+        conn.execute(text(f"ALTER TABLE usuario ALTER COLUMN {coluna} TYPE JSONB USING {coluna}::jsonb"))
+
+
+@migracao("0002_usuario_achievements_bits", "bitset de conquistas calculado a partir do JSON")
+def _usuario_achievements_bits(conn):
+    if "achievements_bits" not in _colunas(conn, "usuario"):
+        conn.execute(text("ALTER TABLE usuario ADD COLUMN achievements_bits BIGINT NOT NULL DEFAULT 0"))
+
+    ultimo_id = 0
+    while True:
+        lote = conn.execute(
+            text("SELECT id, achievements FROM usuario WHERE id > :ultimo ORDER BY id LIMIT 1000"),
+            {"ultimo": ultimo_id}
+        ).fetchall()
+        if not lote:
+            break
+        conn.execute(
+            text("UPDATE usuario SET achievements_bits = :bits WHERE id = :id"),
+            [{"id": row[0], "bits": conquistas_para_bits(row[1])} for row in lote]
+        )
+        ultimo_id = lote[-1][0]
+
+
+@migracao("0003_usuario_revision", "revisão monotônica por usuário e log de campos alterados")
+def _usuario_revision(conn):
+    if "revision" not in _colunas(conn, "usuario"):
+        conn.execute(text("ALTER TABLE usuario ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+    UsuarioRevisao.__table__.create(conn, checkfirst=True)
+    for indice in UsuarioRevisao.__table__.indexes:
+        indice.create(conn, checkfirst=True)
+
+
+@migracao("0004_usuario_invited_by_index", "índice em invited_by para estatísticas de indicação")
+def _usuario_invited_by_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_usuario_invited_by ON usuario (invited_by)"))
+
+
+@migracao("0005_usuario_email_status", "marcação de e-mails não entregáveis")
+def _usuario_email_status(conn):
+    if "email_status" not in _colunas(conn, "usuario"):
+        conn.execute(text("ALTER TABLE usuario ADD COLUMN email_status VARCHAR(20)"))
+
+
+@migracao("0006_tarefa_agendada", "controle de tarefas periódicas (reset diário)")
+def _tarefa_agendada(conn):
+    db.metadata.tables["tarefa_agendada"].create(conn, checkfirst=True)
+
+
+@migracao("0007_traducao", "cache persistente de traduções por par de idiomas")
+def _traducao(conn):
+    db.metadata.tables["traducao"].create(conn, checkfirst=True)
+
+
+@migracao("0008_usuario_referral_bonus_paid", "marcação do bônus de indicação pago (tarefa idempotente)")
+def _usuario_referral_bonus_paid(conn):
+    if "referral_bonus_paid" in _colunas(conn, "usuario"):
+        return
+    conn.execute(text("ALTER TABLE usuario ADD COLUMN referral_bonus_paid BOOLEAN NOT NULL DEFAULT FALSE"))
+    # Cadastros anteriores já receberam o bônus de forma síncrona
+    conn.execute(text("UPDATE usuario SET referral_bonus_paid = TRUE WHERE invited_by IS NOT NULL"))
+
+
+def criar_indice_conquista(engine, indice):
+    """Cria um índice de expressão para consultas "usuários com a conquista N" """
+    mascara = 1 << indice
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_usuario_conquista_{indice} "
+            f"ON usuario (((achievements_bits & {mascara}) <> 0))"
+        ))
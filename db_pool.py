@@ -0,0 +1,236 @@
+"""
+Configuração única do banco/pool de conexões (usada pelo Flask-SQLAlchemy) e sua instrumentação
+USO: DATABASE_URL = resolver_database_url()
+     app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opcoes_engine(DATABASE_URL)
+     db_pool.instrumentar(db.engine)   # dentro do app context
+
+DATABASE_MODE=sqlite roda tudo localmente num arquivo SQLite em WAL (benchmarks, testes de carga),
+sem Postgres nem nenhum serviço externo.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, StaticPool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos esperando uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))  # fecha conexões com mais de 5 minutos
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"  # testa a conexão antes de cada checkout
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))  # 0 desativa (Postgres)
+
+# "postgres" (padrão, usa DATABASE_URL) ou "sqlite" (arquivo local em SQLITE_PATH)
+DATABASE_MODE = os.getenv("DATABASE_MODE", "postgres").lower()
+SQLITE_PATH = os.getenv(
+    "SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "lingobot_local.db")
+)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # seguro com WAL, bem mais rápido que FULL
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+# Chaves de metricas() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("connects", "checkouts", "checkins", "invalidations", "overflow_checkouts")
+
+
+class _MetricasPool:
+    """Contadores do pool, atualizados pelos eventos do SQLAlchemy"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.overflow_checkouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.waits = 0
+        self.age_total_s = 0.0
+        self.age_max_s = 0.0
+
+    def registrar_espera(self, ms):
+        with self.lock:
+            self.waits += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+
+_metricas = _MetricasPool()
+_engine = None
+
+
+_espera_local = threading.local()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool que mede quanto tempo cada checkout espera na fila por uma conexão livre
+    (o tempo de abrir uma conexão nova não conta como espera) e marca as conexões abertas
+    além de pool_size (info["overflow"]).
+    """
+
+    def _do_get(self):
+        # QueuePool._do_get chama a si mesmo ao disputar o overflow; mede só a chamada externa
+        if getattr(_espera_local, "medindo", False):
+            return super()._do_get()
+        _espera_local.medindo = True
+        _espera_local.conexao_s = 0.0
+        _espera_local.overflow = False
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            # A marca de overflow vale só para a conexão criada neste checkout
+            _espera_local.medindo = False
+            _espera_local.overflow = False
+            _metricas.registrar_espera((time.perf_counter() - inicio - _espera_local.conexao_s) * 1000)
+
+    def _inc_overflow(self):
+        # Mesmo critério do QueuePool, mas guardando se esta conexão passa de pool_size:
+        # lido depois, o contador já pode ter sido alterado por outras threads
+        with self._overflow_lock:
+            if self._max_overflow != -1 and self._overflow >= self._max_overflow:
+                return False
+            self._overflow += 1
+            _espera_local.overflow = self._overflow > 0
+            return True
+
+    def _create_connection(self):
+        inicio = time.perf_counter()
+        try:
+            registro = super()._create_connection()
+        finally:
+            _espera_local.conexao_s = getattr(_espera_local, "conexao_s", 0.0) + time.perf_counter() - inicio
+        registro.info["overflow"] = getattr(_espera_local, "overflow", False)
+        _espera_local.overflow = False
+        return registro
+
+    def _do_return_conn(self, registro):
+        # Se couber na fila a conexão passa a ser do pool; se não couber, é fechada
+        registro.info["overflow"] = False
+        super()._do_return_conn(registro)
+
+
+def resolver_database_url():
+    """URL do banco conforme DATABASE_MODE/DATABASE_URL, já ajustada para o SQLAlchemy"""
+    if DATABASE_MODE == "sqlite":
+        os.makedirs(os.path.dirname(SQLITE_PATH), exist_ok=True)
+        return f"sqlite:///{SQLITE_PATH}"
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL não configurada (ou use DATABASE_MODE=sqlite para rodar localmente)")
+    if database_url.startswith("sqlite"):
+        return database_url
+
+    # Ajusta a string do banco de dados para garantir compatibilidade
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    # Adiciona SSL se necessário
+    if "sslmode" not in database_url:
+        database_url += ("&" if "?" in database_url else "?") + "sslmode=require"
+    return database_url
+
+
+def opcoes_engine(database_url):
+    """Opções de create_engine para o banco configurado"""
+    if database_url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if database_url in ("sqlite://", "sqlite:///:memory:"):
+            # Banco em memória só existe dentro de uma conexão: todos compartilham a mesma
+            return {"poolclass": StaticPool, "connect_args": connect_args}
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "connect_args": connect_args
+        }
+
+    opcoes = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+    if database_url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS > 0:
+        opcoes["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return opcoes
+
+
+def configurar_sqlite(engine):
+    """Aplica WAL e os pragmas de desempenho em cada nova conexão SQLite"""
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def instrumentar(engine):
+    """Registra os eventos de pool que alimentam metricas()"""
+    global _engine
+    _engine = engine
+
+    @event.listens_for(engine, "connect")
+    def _ao_conectar(dbapi_connection, connection_record):
+        connection_record.info["criada_em"] = time.monotonic()
+        with _metricas.lock:
+            _metricas.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def _ao_retirar(dbapi_connection, connection_record, connection_proxy):
+        idade = time.monotonic() - connection_record.info.get("criada_em", time.monotonic())
+        with _metricas.lock:
+            _metricas.checkouts += 1
+            _metricas.age_total_s += idade
+            _metricas.age_max_s = max(_metricas.age_max_s, idade)
+            if connection_record.info.get("overflow"):
+                _metricas.overflow_checkouts += 1
+
+    @event.listens_for(engine, "checkin")
+    def _ao_devolver(dbapi_connection, connection_record):
+        with _metricas.lock:
+            _metricas.checkins += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _ao_invalidar(dbapi_connection, connection_record, exception):
+        with _metricas.lock:
+            _metricas.invalidations += 1
+
+
+def metricas():
+    """Estado atual do pool e contadores acumulados"""
+    pool = _engine.pool if _engine is not None else None
+    with _metricas.lock:
+        dados = {
+            "pool_class": type(pool).__name__ if pool is not None else None,
+            "pool_size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "connects": _metricas.connects,
+            "checkouts": _metricas.checkouts,
+            "checkins": _metricas.checkins,
+            "invalidations": _metricas.invalidations,
+            "overflow_checkouts": _metricas.overflow_checkouts,
+            "wait_avg_ms": round(_metricas.wait_total_ms / _metricas.waits, 3) if _metricas.waits else 0,
+            "wait_max_ms": round(_metricas.wait_max_ms, 3),
+            "connection_age_avg_s": (
+                round(_metricas.age_total_s / _metricas.checkouts, 2) if _metricas.checkouts else 0
+            ),
+            "connection_age_max_s": round(_metricas.age_max_s, 2)
+        }
+    return dados
@@ -0,0 +1,134 @@
+"""
+Validação de e-mail do cadastro sem consulta DNS no caminho da requisição
+USO: from email_check import validar_email_cadastro, agendar_verificacao
+
+Modos (EMAIL_VALIDATION_MODE):
+- syntax: apenas sintaxe
+- cached (padrão): sintaxe + resultado de entregabilidade do domínio em cache (TTL).
+  Domínios ainda desconhecidos são verificados por uma tarefa em segundo plano (background.py):
+  o cadastro é gravado com email_status="pending" e a tarefa troca para "undeliverable" (ou limpa).
+  Uma varredura reenfileira os "pending" que ficaram sem tarefa (fila indisponível no cadastro).
+- full: comportamento antigo, consulta DNS a cada cadastro
+"""
+import os
+import threading
+import time
+
+from email_validator import EmailNotValidError, validate_email
+
+import background
+
+EMAIL_VALIDATION_MODE = os.getenv("EMAIL_VALIDATION_MODE", "cached").lower()
+EMAIL_DOMAIN_CACHE_TTL = float(os.getenv("EMAIL_DOMAIN_CACHE_TTL", str(6 * 60 * 60)))  # segundos
+
+# domínio -> (entregável, expira_em)
+_dominios = {}
+_dominios_lock = threading.Lock()
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = (
+    "validations", "domain_cache_hits", "rejected_by_cache", "queued", "verified", "flagged_undeliverable"
+)
+_stats = dict.fromkeys(CONTADORES, 0)
+_stats_lock = threading.Lock()
+
+
+def _contar(chave):
+    with _stats_lock:
+        _stats[chave] += 1
+
+
+def _dominio(email):
+    return email.rsplit("@", 1)[-1].lower()
+
+
+def _dominio_em_cache(dominio):
+    with _dominios_lock:
+        item = _dominios.get(dominio)
+        if item is None or item[1] < time.monotonic():
+            return None
+        return item[0]
+
+
+def _guardar_dominio(dominio, entregavel):
+    with _dominios_lock:
+        _dominios[dominio] = (entregavel, time.monotonic() + EMAIL_DOMAIN_CACHE_TTL)
+
+
+def validar_email_cadastro(email):
+    """Valida o e-mail conforme EMAIL_VALIDATION_MODE; levanta EmailNotValidError se inválido"""
+    _contar("validations")
+    if EMAIL_VALIDATION_MODE == "full":
+        validate_email(email)
+        return
+
+    validate_email(email, check_deliverability=False)
+    if EMAIL_VALIDATION_MODE == "cached":
+        entregavel = _dominio_em_cache(_dominio(email))
+        if entregavel is not None:
+            _contar("domain_cache_hits")
+        if entregavel is False:
+            _contar("rejected_by_cache")
+            raise EmailNotValidError("O domínio do e-mail não recebe mensagens.")
+
+
+def verificar_entregabilidade(email):
+    """Consulta DNS (lenta) e atualiza o cache do domínio; retorna True se o e-mail é entregável"""
+    try:
+        validate_email(email, check_deliverability=True)
+        entregavel = True
+    except EmailNotValidError:
+        entregavel = False
+    _guardar_dominio(_dominio(email), entregavel)
+    return entregavel
+
+
+def precisa_verificar(email):
+    """No modo cached, se o domínio ainda é desconhecido (o cadastro nasce com email_status="pending")"""
+    return EMAIL_VALIDATION_MODE == "cached" and _dominio_em_cache(_dominio(email)) is None
+
+
+def agendar_verificacao(user_id, email):
+    """Enfileira a verificação do domínio (ver background.py)"""
+    background.enfileirar("verificar_email", chave=f"verificar_email:{user_id}", user_id=user_id, email=email)
+    _contar("queued")
+
+
+@background.varredura("verificar_email")
+def _reconciliar_verificacoes():
+    """Reenfileira cadastros ainda com email_status="pending" (a chave evita duplicar a tarefa)"""
+    from database import Usuario
+
+    for user_id, email in Usuario.verificacoes_email_pendentes():
+        agendar_verificacao(user_id, email)
+
+
+def verificar_e_marcar(user_id, email):
+    """Tarefa em segundo plano: confere o domínio e marca o usuário (precisa do app context)"""
+    entregavel = verificar_entregabilidade(email)
+    _contar("verified")
+    _marcar(user_id, None if entregavel else "undeliverable")
+
+
+def _marcar(user_id, status):
+    from database import db, Usuario
+
+    usuario = db.session.get(Usuario, user_id)
+    if usuario and usuario.email_status != status:
+        usuario.email_status = status
+        db.session.commit()
+        if status == "undeliverable":
+            _contar("flagged_undeliverable")
+
+
+def stats():
+    """Contadores da validação de e-mail (para status/métricas)"""
+    with _dominios_lock:
+        dominios = len(_dominios)
+    with _stats_lock:
+        contadores = dict(_stats)
+    return {
+        "mode": EMAIL_VALIDATION_MODE,
+        "cached_domains": dominios,
+        **contadores
+    }
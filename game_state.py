@@ -0,0 +1,117 @@
+"""
+Operações tipadas sobre o estado de jogo do usuário, aplicadas em lote numa única transação
+USO: from game_state import aplicar_operacoes
+
+Cada operação é um dict com "op" e seus parâmetros:
+- {"op": "gems", "delta": 5}                        soma/subtrai gemas (não fica negativo)
+- {"op": "battery", "delta": -1}                    ajusta a bateria, limitada a 0..10 (check_battery_range)
+- {"op": "add_item", "itemName": "...", "quant": 1}  soma ao item existente ou adiciona o item
+- {"op": "complete_mission", "mission": "writing"}  marca uma missão diária/baú como concluído
+- {"op": "add_exp", "amount": 50}                   soma LingoEXP e sobe de Level pela tabela GAME_LEVEL_EXP
+
+GAME_LEVEL_EXP: LingoEXP acumulado para chegar ao Level 2, 3, ... (separados por vírgula, crescentes);
+depois do último valor cada nível custa o último intervalo. O padrão "1000" dá Level = 1 + EXP // 1000.
+O Level nunca desce por aqui.
+
+Itens e missões passam por Usuario.incrementar_item / Usuario.marcar_missao (atualização parcial
+do JSONB no servidor, ou read-modify-write com a linha travada no armazenamento em TEXT).
+"""
+import os
+
+from database import Usuario
+
+GAME_LEVEL_EXP = tuple(int(valor) for valor in os.getenv("GAME_LEVEL_EXP", "1000").split(",") if valor.strip())
+
+BATTERY_MIN = 0
+BATTERY_MAX = 10
+MISSOES_CONCLUIVEIS = (
+    "writing", "reading", "listening", "speaking",
+    "chestWasOpen1", "chestWasOpen2", "chestWasOpen3", "chestWasOpen4"
+)
+MAX_OPERACOES = 50
+
+
+class OperacaoInvalida(ValueError):
+    """Operação mal formada; o lote inteiro é rejeitado"""
+
+
+def _inteiro(op, campo):
+    valor = op.get(campo)
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise OperacaoInvalida(f"'{campo}' precisa ser um número inteiro na operação {op.get('op')}")
+    return valor
+
+
+def _gems(usuario, op):
+    novo = (usuario.gemas or 0) + _inteiro(op, "delta")
+    if novo < 0:
+        raise OperacaoInvalida("Gemas insuficientes")
+    usuario.gemas = novo
+
+
+def _battery(usuario, op):
+    usuario.battery = min(max((usuario.battery or 0) + _inteiro(op, "delta"), BATTERY_MIN), BATTERY_MAX)
+
+
+def _add_item(usuario, op):
+    nome = op.get("itemName")
+    if not nome or not isinstance(nome, str):
+        raise OperacaoInvalida("'itemName' é obrigatório em add_item")
+    quant = op.get("quant", 1)
+    if isinstance(quant, bool) or not isinstance(quant, int) or quant <= 0:
+        raise OperacaoInvalida("'quant' precisa ser um inteiro positivo em add_item")
+    # Item novo só com nome e quantidade: os demais campos não vêm do cliente
+    Usuario.incrementar_item(usuario.id, nome, quant, commit=False, novo_item={})
+
+
+def _complete_mission(usuario, op):
+    missao = op.get("mission")
+    if missao not in MISSOES_CONCLUIVEIS:
+        raise OperacaoInvalida(f"Missão inválida: {missao}")
+    Usuario.marcar_missao(usuario.id, missao, True, commit=False)
+
+
+def nivel_por_exp(exp):
+    """Level correspondente ao LingoEXP acumulado (ver GAME_LEVEL_EXP)"""
+    nivel = 1
+    for limite in GAME_LEVEL_EXP:
+        if exp < limite:
+            return nivel
+        nivel += 1
+    passo = GAME_LEVEL_EXP[-1] - (GAME_LEVEL_EXP[-2] if len(GAME_LEVEL_EXP) > 1 else 0)
+    return nivel + (exp - GAME_LEVEL_EXP[-1]) // passo
+
+
+def _add_exp(usuario, op):
+    quantidade = _inteiro(op, "amount")
+    if quantidade < 0:
+        raise OperacaoInvalida("'amount' não pode ser negativo em add_exp")
+    usuario.LingoEXP = (usuario.LingoEXP or 0) + quantidade
+    usuario.Level = max(usuario.Level or 1, nivel_por_exp(usuario.LingoEXP))
+
+
+OPERACOES = {
+    "gems": _gems,
+    "battery": _battery,
+    "add_item": _add_item,
+    "complete_mission": _complete_mission,
+    "add_exp": _add_exp
+}
+
+
+def aplicar_operacoes(usuario, operacoes):
+    """
+    Aplica as operações em ordem sobre o usuário (já travado pelo chamador), sem commit.
+    O lote é validado inteiro antes da primeira alteração; erros de regra no meio do lote
+    (ex.: gemas insuficientes) levantam OperacaoInvalida e o chamador faz rollback.
+    """
+    if not isinstance(operacoes, list) or not operacoes:
+        raise OperacaoInvalida("'operations' precisa ser uma lista não vazia")
+    if len(operacoes) > MAX_OPERACOES:
+        raise OperacaoInvalida(f"Máximo de {MAX_OPERACOES} operações por lote")
+    for op in operacoes:
+        if not isinstance(op, dict) or op.get("op") not in OPERACOES:
+            raise OperacaoInvalida(f"Operação desconhecida: {op.get('op') if isinstance(op, dict) else op}")
+
+    for op in operacoes:
+        OPERACOES[op["op"]](usuario, op)
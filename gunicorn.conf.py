@@ -0,0 +1,97 @@
+"""
+Configuração do gunicorn para produção
+USO: gunicorn -c gunicorn.conf.py wsgi:app
+     WEB_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py wsgi:app
+
+Quase todo o tempo das rotas de IA e TTS é espera de rede, então o padrão é o worker "gthread"
+(GUNICORN_THREADS threads por processo): um worker atende várias chamadas a provedores ao mesmo
+tempo sem multiplicar a memória. "gevent" (precisa do pacote gevent) troca as threads por greenlets,
+até GUNICORN_WORKER_CONNECTIONS por worker; "sync" atende uma requisição por processo (só para comparação;
+ver benchmarks/load_test.py).
+
+preload_app carrega o app uma vez no master (schema, JSONs de conteúdo, índice dos textos) e os
+workers herdam a memória por copy-on-write. O que não pode atravessar o fork é refeito no post_fork
+(pool do banco, agendador do reset diário); conexões SQLite e o executor em segundo plano se
+recriam sozinhos (os.register_at_fork / primeira requisição).
+Com mais de um worker o cache de usuários usa o backend sqlite (USER_CACHE_BACKEND, ver user_cache.py),
+compartilhado entre os processos.
+
+O timeout e o graceful_timeout ficam acima do maior orçamento por requisição: AI_REQUEST_BUDGET_S
+(a cadeia inteira de fallback das rotas de IA, ver ai_routes.py) e TTS_REQUEST_BUDGET_S (ElevenLabs +
+edge_tts, ver speech_routes.py). As rotas respondem 504 quando o orçamento acaba, então o gunicorn não
+mata um worker no meio de uma resposta lenta porém válida, nem num reload. Nos workers gthread/gevent
+o timeout só vigia o processo (heartbeat); no sync vale por requisição.
+"""
+import multiprocessing
+import os
+
+WEB_WORKER_CLASS = os.getenv("WEB_WORKER_CLASS", "gthread")
+
+if WEB_WORKER_CLASS == "gevent":
+    # O monkey patch precisa vir antes de qualquer import do app (o preload carrega o app no master)
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# Mesmos padrões de ai_routes.py / speech_routes.py (lidos aqui sem importar o app)
+AI_REQUEST_BUDGET_S = float(os.getenv("AI_REQUEST_BUDGET_S", "75"))
+TTS_REQUEST_BUDGET_S = float(os.getenv("TTS_REQUEST_BUDGET_S", "45"))
+_maior_orcamento = int(max(AI_REQUEST_BUDGET_S, TTS_REQUEST_BUDGET_S))
+# Warmers só de CPU/memória, rodados no master antes do fork (conexões e threads ficam para os workers)
+GUNICORN_PREWARM = [nome.strip() for nome in os.getenv("GUNICORN_PREWARM", "content,text_index,precheck,regex").split(",") if nome.strip()]
+
+_cpus = multiprocessing.cpu_count()
+_workers_padrao = {"sync": 2 * _cpus + 1, "gthread": _cpus, "gevent": _cpus}
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = WEB_WORKER_CLASS
+workers = int(os.getenv("WEB_CONCURRENCY", _workers_padrao.get(WEB_WORKER_CLASS, _cpus)))
+threads = int(os.getenv("GUNICORN_THREADS", "16")) if WEB_WORKER_CLASS == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "256"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# O backend memory do user_cache é por processo: com vários workers um não veria as invalidações do outro
+os.environ.setdefault("USER_CACHE_BACKEND", "sqlite" if workers > 1 else "memory")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", str(_maior_orcamento + 15)))
+# No reload/deploy, requisições em andamento têm até aqui para terminar (o orçamento inteiro de uma requisição)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", str(_maior_orcamento + 10)))
+# Atrás do proxy do Render/Nginx: mantém a conexão aberta entre requisições do mesmo cliente
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None  # vazio desliga o log de acesso
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    """No master, depois do preload e antes do primeiro fork"""
+    server.log.info(
+        f"LingoBot: {workers} worker(s) {worker_class}"
+        + (f" x {threads} threads" if worker_class == "gthread" else "")
+        + f", timeout {timeout}s, graceful {graceful_timeout}s, preload={preload_app}"
+    )
+    if preload_app and GUNICORN_PREWARM:
+        from main import app
+        from warming import aquecer
+
+        resultado = aquecer(app, GUNICORN_PREWARM)
+        server.log.info(f"Pré-aquecimento no master: {resultado['duration_ms']} ms {resultado['components']}")
+
+
+def post_fork(server, worker):
+    """No worker recém-criado: descarta o que foi herdado do master e não pode ser compartilhado"""
+    import daily_reset
+    from database import db
+    from main import app
+
+    with app.app_context():
+        # close=False: não fecha os sockets do master, só esquece as conexões herdadas
+        db.engine.dispose(close=False)
+    daily_reset.iniciar_agendador(app)
+
+
+def worker_exit(server, worker):
+    """Worker saindo (reload, deploy, max timeout): drena as tarefas em segundo plano"""
+    import background
+
+    background.encerrar()
@@ -1,134 +1,179 @@
 import os
-import tempfile
 import time
 import uuid
 
-import edge_tts
-import asyncio
-import io
-
-import requests
-from elevenlabs import ElevenLabs, VoiceSettings
-from flask import Flask, request, jsonify, send_file
+import click
 from dotenv import load_dotenv
-from flask_jwt_extended import JWTManager
-from sqlalchemy import create_engine, text, inspect
-from translate import Translator
+from flask import Blueprint, Flask, current_app, request, jsonify
+from flask.cli import with_appcontext
 from flask_cors import CORS
+from flask_jwt_extended import JWTManager
+from sqlalchemy import text, inspect
+
+import background
+import compression
+import content_store
+import daily_reset
+import db_pool
+import profiler
+import telemetria
+from ai_routes import ai
+from content_routes import content
 from database import db
-from flask_migrate import Migrate
+from db_migrations import aplicar_migracoes, criar_indice_conquista, garantir_schema, migracoes_pendentes, schema_pronto
+from ping_manager import PING_LONGPOLL_MAX_WAIT_MS, PingManager
 from routes import routes
-from ai_routes import ai
-import assemblyai as aai
-import json
-from datetime import datetime
-from ping_manager import PingManager
-
-
+from speech_routes import speech
+from translation import translation
+from warming import aquecer
 
 # Carrega as variáveis de ambiente do .env
 load_dotenv()
-api_key = os.getenv("ASSEMBLYAI_API_KEY")
 
+# Rotas de infraestrutura (health check, ping, métricas)
+core = Blueprint("core", __name__)
 
 
+def create_app():
+    """
+    App factory. Só inicializa o essencial (config, banco, rotas); clientes de IA e de TTS
+    são criados no primeiro uso (ver ai_routes.py e speech_routes.py) para o cold start ser rápido.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Habilita CORS para todas as rotas
+    # Latência/status/tamanho por rota + última atividade da API; expõe GET /metrics (Prometheus)
+    telemetria.init_app(app)
+    # Perfil sob demanda (header X-Profile ou PROFILER_SAMPLE_RATE); ver profiler.py
+    profiler.init_app(app)
+    # gzip/brotli negociado; registrado por último para rodar antes dos outros after_request
+    compression.init_app(app)
 
-# Configurar AssemblyAI
-aai.settings.api_key = api_key
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    app.config["JWT_TOKEN_LOCATION"] = ["headers"]  # Garante que o token é buscado apenas nos headers
+    app.config["JWT_HEADER_NAME"] = "Authorization"  # Nome do header (padrão)
+    app.config["JWT_HEADER_TYPE"] = "Bearer"  # Tipo do token (padrão)
 
+    jwt = JWTManager(app)
 
-# Inicializa o Flask
-app = Flask(__name__)
-CORS(app)  # Habilita CORS para todas as rotas
+    @jwt.invalid_token_loader
+    def invalid_token_callback(error):
+        return jsonify({"erro": "Token inválido ou expirado"}), 401
 
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-app.config["JWT_TOKEN_LOCATION"] = ["headers"]  # Garante que o token é buscado apenas nos headers
-app.config["JWT_HEADER_NAME"] = "Authorization"  # Nome do header (padrão)
-app.config["JWT_HEADER_TYPE"] = "Bearer"  # Tipo do token (padrão)
+    @jwt.unauthorized_loader
+    def missing_token_callback(error):
+        return jsonify({"erro": "Token ausente no header Authorization"}), 401
 
-jwt = JWTManager(app)
+    # Postgres via DATABASE_URL (com sslmode), ou SQLite local com DATABASE_MODE=sqlite; ver db_pool.py
+    database_url = db_pool.resolver_database_url()
 
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Um único pool (o do Flask-SQLAlchemy) para models, inspector e health check; ver db_pool.py
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_pool.opcoes_engine(database_url)
 
-@jwt.invalid_token_loader
-def invalid_token_callback(error):
-    return jsonify({"erro": "Token inválido ou expirado"}), 401
+    # Inicializa o banco de dados
+    db.init_app(app)
+    # Flask-Migrate carrega o Alembic (~0,5 s); só é necessário para os comandos `flask db ...`
+    if os.getenv("FLASK_RUN_FROM_CLI") == "true":
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    # Registra as rotas no app Flask
+    app.register_blueprint(core)
+    app.register_blueprint(routes)
+    app.register_blueprint(ai)
+    app.register_blueprint(speech)
+    app.register_blueprint(content)
+    app.register_blueprint(translation)
 
+    app.cli.add_command(aplicar_migracoes_command)
+    app.cli.add_command(indexar_conquista_command)
+    app.cli.add_command(resetar_missoes_command)
+    app.cli.add_command(indexar_textos_command)
 
-@jwt.unauthorized_loader
-def missing_token_callback(error):
-    return jsonify({"erro": "Token ausente no header Authorization"}), 401
+    # Cria o banco de dados antes de rodar
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            db_pool.configurar_sqlite(db.engine)
+        db_pool.instrumentar(db.engine)
+        profiler.instrumentar_banco(db.engine)
+        # Bootstrap único do schema via migrações (aplica só com DB_AUTO_MIGRATE; ver db_migrations.py)
+        garantir_schema(db.engine)
 
+    # Textos/temas carregados uma vez em estruturas imutáveis (~5 ms); ver content_store.py
+    content_store.carregar_tudo()
 
+    # Tarefas em segundo plano (bônus de indicação, verificação de e-mail, logs de falha); ver background.py
+    background.init_app(app)
 
-# Ajusta a string do banco de dados para garantir compatibilidade
-DATABASE_URL = os.getenv("DATABASE_URL")
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://")
+    # Reset diário das missões (somente com DAILY_RESET_ENABLED=1)
+    daily_reset.iniciar_agendador(app)
+    return app
 
 
-# Adiciona SSL se necessário
-if "sslmode" not in DATABASE_URL:
-    DATABASE_URL += "?sslmode=require"
+@click.command("aplicar-migracoes")
+@with_appcontext
+def aplicar_migracoes_command():
+    """Aplica as migrações de schema pendentes (ver db_migrations.py)"""
+    aplicadas = aplicar_migracoes(db.engine)
+    print(f"{len(aplicadas)} migração(ões) aplicada(s)")
 
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Evita conexões quebradas
-    pool_recycle=300,  # Fecha conexões inativas após 5 minutos
-    pool_timeout=30  # Tempo limite para obter uma nova conexão
-)
+@click.command("indexar-conquista")
+@click.argument("indice", type=int)
+@with_appcontext
+def indexar_conquista_command(indice):
+    """Cria o índice para consultas de usuários com a conquista INDICE"""
+    criar_indice_conquista(db.engine, indice)
 
 
-app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+@click.command("resetar-missoes")
+@with_appcontext
+def resetar_missoes_command():
+    """Reseta agora as missões diárias de todos os usuários"""
+    daily_reset.resetar_missoes_diarias()
 
 
-# Inicializa o banco de dados
-db.init_app(app)
-migrate = Migrate(app, db)
-# Registra as rotas no app Flask
-app.register_blueprint(routes)
-app.register_blueprint(ai)
+@click.command("indexar-textos")
+def indexar_textos_command():
+    """Gera o índice de features dos textos (text_index.npz) usado nas recomendações"""
+    import text_index
 
-# Cria o banco de dados antes de rodar
-with app.app_context():
-    db.create_all()
+    resultado = text_index.gerar()
+    print(f"{resultado['textos']} textos indexados em {resultado['path']} ({resultado['duration_ms']} ms)")
 
 
 
 
 
-@app.route("/",  methods=['GET'])
+@core.route("/",  methods=['GET'])
 def teste_db():
-    PingManager.update_last_activity()
+    """
+    Health check barato: um SELECT numa conexão do pool.
+    ?deep=1 também confere tabelas, migrações pendentes e o pool (consultas ao catálogo).
+    """
 
     try:
-        inspector = inspect(engine)
-        tabelas = inspector.get_table_names()
-
-        if not tabelas:
-            with app.app_context():
-                db.create_all()
-            return "Banco de dados e tabelas criados com sucesso na rota /!"
-        elif "usuario" not in tabelas:
-            with app.app_context():
-                db.create_all()
-            return "Tabela 'usuario' e outras tabelas ausentes criadas com sucesso na rota /."
-        else:
-            result = db.session.execute(text("SELECT 'Conexão bem-sucedida!'")).fetchall()
-            print("hello world")
-            return str(result)
+        aplicadas = garantir_schema(db.engine)
+        result = db.session.execute(text("SELECT 'Conexão bem-sucedida!'")).fetchall()
+
+        if request.args.get("deep"):
+            return jsonify({
+                "database": str(result),
+                "schema_ready": schema_pronto(),
+                "migrations_applied_now": aplicadas,
+                "pending_migrations": migracoes_pendentes(db.engine),
+                "tables": inspect(db.engine).get_table_names(),
+                "pool": db_pool.metricas()
+            })
+
+        if aplicadas:
+            return f"Migrações aplicadas na rota /: {', '.join(aplicadas)}"
+        return str(result)
     except Exception as e:
         return str(e)
 
 
-def simulate_api_warming():
-    """Sem warming real - apenas marca como pronto"""
-    print("🔥 API ready!")
-    return True
-
-
-@app.route('/ping', methods=['GET'])
+@core.route('/ping', methods=['GET'])
 def coordinated_ping():
     """
     🎯 ENDPOINT PRINCIPAL - Sistema de Ping Coordenado
@@ -163,10 +208,69 @@ def coordinated_ping():
             'retry_after_ms': 3000
         })
 
-    if warming_info is not None:
+    # Nenhum warming em progresso - tenta eleger este cliente (atômico entre workers)
+    if warming_info is None and not PingManager._try_start_warming(client_id):
+        # Outro cliente/worker venceu a eleição entre a consulta e a tentativa
+        warming_info = PingManager._get_warming_info()
+        if not isinstance(warming_info, dict):
+            warming_info = {'warming_client_id': None, 'waiting_clients_count': 0}
+
+    if isinstance(warming_info, dict):
         # Adiciona este cliente à lista de espera
         PingManager._add_waiting_client(client_id)
 
+        # Long-poll (?wait=1): segura a resposta até o warming terminar, em vez do cliente repetir o ping
+        if request.args.get('wait') in ('1', 'true'):
+            max_wait_ms = min(
+                max(request.args.get('max_wait_ms', PING_LONGPOLL_MAX_WAIT_MS, type=int), 0),
+                PING_LONGPOLL_MAX_WAIT_MS
+            )
+            wait_start = time.time()
+            warmed = PingManager.wait_until_warm(max_wait_ms / 1000)
+            waited_ms = round((time.time() - wait_start) * 1000)
+
+            if warmed is None:
+                # Limite de clientes em long-poll atingido: resposta normal, o cliente repete o ping
+                return jsonify({
+                    'status': 'warming',
+                    'message': 'API is warming up (too many clients waiting, retry later)',
+                    'client_id': client_id,
+                    'warming_started_by': warming_info['warming_client_id'],
+                    'waiting_clients': warming_info['waiting_clients_count'],
+                    'should_retry': True,
+                    'retry_after_ms': 5000
+                })
+
+            if warmed and PingManager.is_api_cold():
+                # O warming terminou com erro (estado resetado)
+                return jsonify({
+                    'status': 'warming_failed',
+                    'message': 'Warming finished with an error, please try again',
+                    'client_id': client_id,
+                    'waited_ms': waited_ms,
+                    'should_retry': True,
+                    'retry_after_ms': 0
+                })
+
+            if warmed:
+                return jsonify({
+                    'status': 'ready',
+                    'message': 'API warmed up while this client was waiting',
+                    'client_id': client_id,
+                    'warming_started_by': warming_info['warming_client_id'],
+                    'waited_ms': waited_ms
+                })
+
+            return jsonify({
+                'status': 'warming',
+                'message': 'API is still warming up (long-poll wait expired)',
+                'client_id': client_id,
+                'warming_started_by': warming_info['warming_client_id'],
+                'waited_ms': waited_ms,
+                'should_retry': True,
+                'retry_after_ms': 0
+            })
+
         # Retorna que está em processo de warming
         return jsonify({
             'status': 'warming',
@@ -178,16 +282,16 @@ def coordinated_ping():
             'retry_after_ms': 5000
         })
 
-    # Nenhum warming em progresso - este cliente será o escolhido
-    PingManager._set_warming_state(client_id, True)
     PingManager._add_waiting_client(client_id)
 
     # Este cliente foi escolhido para fazer o warming
     start_time = time.time()
 
     try:
-        # Executa o processo de warming
-        simulate_api_warming()
+        # Executa o processo de warming (pool do banco, HTTP, TTS, conteúdo, regex; ver warming.py)
+        warming = aquecer(current_app._get_current_object())
+        PingManager._set_warming_result(warming)
+        print(f"🔥 API ready! ({warming['duration_ms']} ms)")
 
         warming_duration = (time.time() - start_time) * 1000  # em ms
 
@@ -195,17 +299,16 @@ def coordinated_ping():
         PingManager.update_last_activity()
         PingManager._set_warming_state(client_id, False)
 
-        # Pega a contagem antes de limpar
-        from ping_manager import _ping_state
-        waiting_count = len(_ping_state.waiting_clients)
-        PingManager._clear_waiting_clients()
+        # Limpa a lista de espera (retorna quantos estavam esperando)
+        waiting_count = PingManager._clear_waiting_clients()
 
         return jsonify({
             'status': 'warmed_up',
             'message': 'API successfully warmed up by this client',
             'client_id': client_id,
             'warming_duration_ms': round(warming_duration),
-            'waiting_clients_served': waiting_count
+            'waiting_clients_served': waiting_count,
+            'warming_components': warming['components']
         })
 
     except Exception as e:
@@ -225,123 +328,31 @@ def coordinated_ping():
 # ENDPOINTS AUXILIARES (opcionais)
 # ==========================================
 
-@app.route('/ping/status', methods=['GET'])
+@core.route('/ping/status', methods=['GET'])
 def ping_status():
     """Endpoint para verificar o status do sistema de ping"""
     return jsonify(PingManager.get_ping_state_info())
 
 
-
-@app.route("/criar-tabela-usuarios", methods=["GET"])
-def criar_tabela_usuarios():
-    PingManager.update_last_activity()
-
-
-    inspector = inspect(engine)
-    tabelas = inspector.get_table_names()
-
-    if not tabelas:  # If no tables exist at all
-        with app.app_context():
-            db.create_all()
-        return "Banco de dados e tabelas criados com sucesso!"
-    elif "usuario" not in tabelas: # Check for 'usuario' table specifically
-        with app.app_context():
-            db.create_all()
-        return "Tabela 'usuario' e outras tabelas ausentes criadas com sucesso."
-    else:
-        return "Tabelas do banco de dados já existem."
-
-
-
-
+@core.route('/metrics/db', methods=['GET'])
+@telemetria.exigir_token_metricas
+def db_metrics():
+    """Métricas do pool de conexões do banco (checkouts, espera, overflow, idade das conexões)"""
+    return jsonify(db_pool.metricas())
 
 
 
+@core.route("/criar-tabela-usuarios", methods=["GET"])
+def criar_tabela_usuarios():
 
+    aplicadas = garantir_schema(db.engine) or aplicar_migracoes(db.engine)
+    if aplicadas:
+        return f"Tabelas/migrações criadas com sucesso: {', '.join(aplicadas)}"
+    return "Tabelas do banco de dados já existem."
 
 
-
-
-
-
-ELEVENLABS_KEY = os.getenv("ELEVENLABS_KEY1")
-
-VOICE_IDS = [
-    "TxGEqnHWrfWFTfGW9XjX",  # 0 - Josh
-    "pNInz6obpgDQGcFmaJgB",  # 1 - Adam
-    "onwK4e9ZLuTAKqWW03F9",  # 2 - James
-    "yoZ06aMxZJJ28mfd3POQ",  # 3 - Sam
-    "VR6AewLTigWG4xSOukaG",  # 4 - Arnold
-    "EXAVITQu4vr4xnSDxMaL",  # 5 - Bella (feminina padrão)
-]
-
-async def generate_tts_google(text):
-    tts = edge_tts.Communicate(text, "en-US-ChristopherNeural")
-    temp_filename = "output.mp3"
-    await tts.save(temp_filename)
-    with open(temp_filename, "rb") as f:
-        buffer = io.BytesIO(f.read())
-    buffer.seek(0)
-    return buffer
-
-def generate_tts_with_elevenlabs(api_key, text, voice_id):
-    try:
-        client = ElevenLabs(api_key=api_key)
-        stream = client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_22050_32",
-            voice_settings=VoiceSettings(
-                stability=0.5,
-                similarity_boost=0.75,
-                style=0.0,
-                use_speaker_boost=True
-            )
-        )
-
-        buffer = io.BytesIO()
-        for chunk in stream:
-            buffer.write(chunk)
-        buffer.seek(0)
-        return buffer
-
-    except Exception as e:
-        print(f"❌ Falha com ElevenLabs: {e}")
-        return None
-
-@app.route("/tts", methods=["POST"])
-def tts():
-    data = request.get_json()
-    text = data.get("text", "").strip()
-    voice_index = data.get("voice", len(VOICE_IDS) - 1)  # Padrão: última voz
-    premium = data.get("premium", False)
-
-    if not text:
-        return jsonify({"error": "Texto é obrigatório"}), 400
-
-    if not isinstance(voice_index, int) or voice_index < 0 or voice_index >= len(VOICE_IDS):
-        return jsonify({"error": "Índice de voz inválido"}), 400
-
-    voice_id = VOICE_IDS[voice_index]
-    print(f"🔊 Gerando TTS para: {text[:60]}... (voz {voice_index}) | Premium: {premium}")
-
-    if premium:
-        audio = generate_tts_with_elevenlabs(ELEVENLABS_KEY, text, voice_id)
-        if audio:
-            print("✅ Áudio gerado com ElevenLabs")
-            return send_file(audio, mimetype="audio/mp3")
-
-        print("⚠️ Falha com ElevenLabs, usando Google TTS como fallback...")
-
-    try:
-        audio = asyncio.run(generate_tts_google(text))
-        PingManager.update_last_activity()
-        return send_file(audio, mimetype="audio/mp3")
-    except Exception as e:
-        print(f"❌ Falha total: {e}")
-        return jsonify({"error": "Erro ao gerar áudio com todos os serviços"}), 500
-
+# Instância usada por `flask --app main` e pelo servidor WSGI (main:app)
+app = create_app()
 
 
 if __name__ == '__main__':
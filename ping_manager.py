@@ -1,13 +1,27 @@
 """
 Módulo centralizado para gerenciar o estado de ping da API
 USO: from ping_manager import PingManager
+
+O estado (eleição de quem aquece, clientes esperando, last_activity) fica num backend
+escolhido por PING_STATE_BACKEND, para ser o mesmo em todos os workers do gunicorn:
+- memory (padrão): global do processo, protegido por lock (um único worker)
+- sqlite: arquivo SQLite em WAL (PING_STATE_PATH), compartilhado pelos workers do mesmo host
+- kv: store chave-valor (Redis em PING_STATE_REDIS_URL; sem URL usa um KV local em memória
+  com a mesma interface, para desenvolvimento e testes)
 """
+import json
+import os
+import sqlite3
+import tempfile
 import time
 import threading
 from dataclasses import dataclass
 from typing import Dict, Optional
 from datetime import datetime
 
+import background
+
+
 @dataclass
 class PingState:
     is_warming_up: bool = False
@@ -15,123 +29,496 @@ class PingState:
     warming_client_id: Optional[str] = None
     last_activity: Optional[float] = None
     waiting_clients: Dict[str, float] = None
+    last_warming: Optional[dict] = None  # resultado do último warming (ver warming.py)
 
     def __post_init__(self):
         if self.waiting_clients is None:
             self.waiting_clients = {}
 
-# Instância global do estado de ping
-_ping_state = PingState()
-_ping_lock = threading.Lock()
-
 # Configurações globais
 COLD_START_THRESHOLD = 10 * 60  # 10 minutos sem atividade = API fria
 WARMING_TIMEOUT = 30  # 30 segundos para considerar warming completo
 
+PING_STATE_BACKEND = os.getenv("PING_STATE_BACKEND", "memory").lower()
+PING_STATE_PATH = os.getenv("PING_STATE_PATH", os.path.join(tempfile.gettempdir(), "lingobot_ping_state.db"))
+PING_STATE_REDIS_URL = os.getenv("PING_STATE_REDIS_URL")
+# Intervalo mínimo (s) entre gravações de last_activity por processo; o limiar de API fria é de
+# minutos, então não precisa gravar a cada requisição num backend compartilhado
+PING_ACTIVITY_WRITE_INTERVAL = float(
+    os.getenv("PING_ACTIVITY_WRITE_INTERVAL", "0" if PING_STATE_BACKEND == "memory" else "5")
+)
+# Long-poll do /ping (?wait=1): espera máxima e, nos backends compartilhados, de quanto em quanto
+# tempo o estado é relido (o warming pode terminar em outro worker, que não nos notifica)
+PING_LONGPOLL_MAX_WAIT_MS = int(os.getenv("PING_LONGPOLL_MAX_WAIT_MS", "25000"))
+PING_LONGPOLL_POLL_MS = int(os.getenv("PING_LONGPOLL_POLL_MS", "1000" if PING_STATE_BACKEND == "memory" else "100"))
+# Cada cliente em long-poll ocupa uma thread do worker gthread; acima deste limite (por processo)
+# o /ping responde na hora com retry_after_ms. Padrão: metade das GUNICORN_THREADS
+PING_LONGPOLL_MAX_WAITERS = int(
+    os.getenv("PING_LONGPOLL_MAX_WAITERS", str(max(1, int(os.getenv("GUNICORN_THREADS", "16")) // 2)))
+)
+
+
+class MemoriaPingBackend:
+    """Estado num global do processo (comportamento original)"""
+
+    def __init__(self):
+        self.state = PingState()
+        self.lock = threading.Lock()
+
+    def registrar_atividade(self, instante):
+        self.state.last_activity = instante  # atribuição simples, atômica sob o GIL
+
+    def ultima_atividade(self):
+        return self.state.last_activity
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'is_warming_up': self.state.is_warming_up,
+                'warming_started_at': self.state.warming_started_at,
+                'warming_client_id': self.state.warming_client_id,
+                'last_activity': self.state.last_activity,
+                'waiting_clients_count': len(self.state.waiting_clients),
+                'last_warming': self.state.last_warming
+            }
+
+    def iniciar_warming(self, client_id, instante, expirado_antes_de):
+        with self.lock:
+            if self.state.is_warming_up and (self.state.warming_started_at or 0) >= expirado_antes_de:
+                return False
+            self.state.is_warming_up = True
+            self.state.warming_client_id = client_id
+            self.state.warming_started_at = instante
+            return True
+
+    def finalizar_warming(self):
+        with self.lock:
+            self.state.is_warming_up = False
+            self.state.warming_client_id = None
+            self.state.warming_started_at = None
+
+    def salvar_resultado(self, resultado):
+        with self.lock:
+            self.state.last_warming = resultado
+
+    def adicionar_cliente(self, client_id, instante):
+        with self.lock:
+            self.state.waiting_clients[client_id] = instante
+
+    def limpar_clientes(self):
+        with self.lock:
+            quantidade = len(self.state.waiting_clients)
+            self.state.waiting_clients.clear()
+            return quantidade
+
+    def remover_clientes_antigos(self, antes_de):
+        with self.lock:
+            for client_id, instante in list(self.state.waiting_clients.items()):
+                if instante < antes_de:
+                    del self.state.waiting_clients[client_id]
+
+    def resetar(self):
+        with self.lock:
+            self.state = PingState(last_warming=self.state.last_warming)
+
+
+class SqlitePingBackend:
+    """
+    Estado num arquivo SQLite compartilhado pelos processos do host. Cada operação é um único
+    comando (atômico); a eleição é um UPDATE condicional, então só um worker vence.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.local = threading.local()
+        # Conexões SQLite não podem ser herdadas por um fork (gunicorn --preload)
+        os.register_at_fork(after_in_child=self._descartar_conexoes)
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ping_state ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), is_warming_up INTEGER NOT NULL DEFAULT 0, "
+                "warming_started_at REAL, warming_client_id TEXT, last_activity REAL, last_warming TEXT)"
+            )
+            conn.execute("INSERT OR IGNORE INTO ping_state (id) VALUES (1)")
+            conn.execute("CREATE TABLE IF NOT EXISTS ping_waiting (client_id TEXT PRIMARY KEY, since REAL NOT NULL)")
+
+    def _descartar_conexoes(self):
+        self.local = threading.local()
+
+    def _conexao(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def registrar_atividade(self, instante):
+        self._conexao().execute("UPDATE ping_state SET last_activity = ? WHERE id = 1", (instante,))
+
+    def ultima_atividade(self):
+        return self._conexao().execute("SELECT last_activity FROM ping_state WHERE id = 1").fetchone()[0]
+
+    def snapshot(self):
+        conn = self._conexao()
+        linha = conn.execute(
+            "SELECT is_warming_up, warming_started_at, warming_client_id, last_activity, last_warming, "
+            "(SELECT count(*) FROM ping_waiting) FROM ping_state WHERE id = 1"
+        ).fetchone()
+        return {
+            'is_warming_up': bool(linha[0]),
+            'warming_started_at': linha[1],
+            'warming_client_id': linha[2],
+            'last_activity': linha[3],
+            'waiting_clients_count': linha[5],
+            'last_warming': json.loads(linha[4]) if linha[4] else None
+        }
+
+    def iniciar_warming(self, client_id, instante, expirado_antes_de):
+        cursor = self._conexao().execute(
+            "UPDATE ping_state SET is_warming_up = 1, warming_client_id = ?, warming_started_at = ? "
+            "WHERE id = 1 AND (is_warming_up = 0 OR warming_started_at < ?)",
+            (client_id, instante, expirado_antes_de)
+        )
+        return cursor.rowcount == 1
+
+    def finalizar_warming(self):
+        self._conexao().execute(
+            "UPDATE ping_state SET is_warming_up = 0, warming_client_id = NULL, warming_started_at = NULL WHERE id = 1"
+        )
+
+    def salvar_resultado(self, resultado):
+        self._conexao().execute("UPDATE ping_state SET last_warming = ? WHERE id = 1", (json.dumps(resultado),))
+
+    def adicionar_cliente(self, client_id, instante):
+        self._conexao().execute("INSERT OR REPLACE INTO ping_waiting (client_id, since) VALUES (?, ?)", (client_id, instante))
+
+    def limpar_clientes(self):
+        return self._conexao().execute("DELETE FROM ping_waiting").rowcount
+
+    def remover_clientes_antigos(self, antes_de):
+        self._conexao().execute("DELETE FROM ping_waiting WHERE since < ?", (antes_de,))
+
+    def resetar(self):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE ping_state SET is_warming_up = 0, warming_client_id = NULL, "
+                "warming_started_at = NULL, last_activity = NULL WHERE id = 1"
+            )
+            conn.execute("DELETE FROM ping_waiting")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class KVLocal:
+    """
+    Stand-in em memória de um store chave-valor em rede: implementa só o subconjunto da
+    API do cliente Redis usado pelo KVPingBackend (get/set com nx e px, delete e hashes)
+    """
+
+    def __init__(self):
+        self.dados = {}
+        self.expira_em = {}
+        self.lock = threading.Lock()
+
+    def _vivo(self, chave):
+        expira = self.expira_em.get(chave)
+        if expira is not None and expira <= time.monotonic():
+            self.dados.pop(chave, None)
+            self.expira_em.pop(chave, None)
+        return chave in self.dados
+
+    def get(self, chave):
+        with self.lock:
+            return self.dados.get(chave) if self._vivo(chave) else None
+
+    def set(self, chave, valor, nx=False, px=None):
+        with self.lock:
+            if nx and self._vivo(chave):
+                return None
+            self.dados[chave] = str(valor)
+            if px is not None:
+                self.expira_em[chave] = time.monotonic() + px / 1000
+            else:
+                self.expira_em.pop(chave, None)
+            return True
+
+    def delete(self, *chaves):
+        with self.lock:
+            removidas = 0
+            for chave in chaves:
+                if self._vivo(chave):
+                    del self.dados[chave]
+                    self.expira_em.pop(chave, None)
+                    removidas += 1
+            return removidas
+
+    def hset(self, chave, campo, valor):
+        with self.lock:
+            self.dados.setdefault(chave, {})[campo] = str(valor)
+            return 1
+
+    def hgetall(self, chave):
+        with self.lock:
+            return dict(self.dados.get(chave, {}))
+
+    def hdel(self, chave, *campos):
+        with self.lock:
+            hash_ = self.dados.get(chave, {})
+            return sum(1 for campo in campos if hash_.pop(campo, None) is not None)
+
+    def hlen(self, chave):
+        with self.lock:
+            return len(self.dados.get(chave, {}))
+
+
+class KVPingBackend:
+    """
+    Estado num store chave-valor (Redis ou KVLocal). A eleição é um SET NX com expiração,
+    então um warming travado libera a vaga sozinho.
+    """
+
+    PREFIXO = "lingobot:ping:"
+
+    def __init__(self, cliente):
+        self.kv = cliente
+        self.chave_atividade = self.PREFIXO + "last_activity"
+        self.chave_warming = self.PREFIXO + "warming"
+        self.chave_resultado = self.PREFIXO + "last_warming"
+        self.chave_clientes = self.PREFIXO + "waiting"
+
+    def registrar_atividade(self, instante):
+        self.kv.set(self.chave_atividade, instante)
+
+    def ultima_atividade(self):
+        valor = self.kv.get(self.chave_atividade)
+        return float(valor) if valor is not None else None
+
+    def snapshot(self):
+        warming = self.kv.get(self.chave_warming)
+        warming = json.loads(warming) if warming else None
+        resultado = self.kv.get(self.chave_resultado)
+        return {
+            'is_warming_up': warming is not None,
+            'warming_started_at': warming['started_at'] if warming else None,
+            'warming_client_id': warming['client_id'] if warming else None,
+            'last_activity': self.ultima_atividade(),
+            'waiting_clients_count': self.kv.hlen(self.chave_clientes),
+            'last_warming': json.loads(resultado) if resultado else None
+        }
+
+    def iniciar_warming(self, client_id, instante, expirado_antes_de):
+        # Expira com folga depois do WARMING_TIMEOUT para o /ping ainda conseguir reportar 'timeout'
+        valor = json.dumps({'client_id': client_id, 'started_at': instante})
+        return bool(self.kv.set(self.chave_warming, valor, nx=True, px=int(WARMING_TIMEOUT * 2 * 1000)))
+
+    def finalizar_warming(self):
+        self.kv.delete(self.chave_warming)
+
+    def salvar_resultado(self, resultado):
+        self.kv.set(self.chave_resultado, json.dumps(resultado))
+
+    def adicionar_cliente(self, client_id, instante):
+        self.kv.hset(self.chave_clientes, client_id, instante)
+
+    def limpar_clientes(self):
+        # Contagem e remoção não são atômicas juntas; a contagem é só informativa
+        quantidade = self.kv.hlen(self.chave_clientes)
+        self.kv.delete(self.chave_clientes)
+        return quantidade
+
+    def remover_clientes_antigos(self, antes_de):
+        antigos = [
+            client_id for client_id, instante in self.kv.hgetall(self.chave_clientes).items()
+            if float(instante) < antes_de
+        ]
+        if antigos:
+            self.kv.hdel(self.chave_clientes, *antigos)
+
+    def resetar(self):
+        self.kv.delete(self.chave_atividade, self.chave_warming, self.chave_clientes)
+
+
+def criar_backend(nome=PING_STATE_BACKEND):
+    """Instancia o backend de estado configurado"""
+    if nome == "sqlite":
+        return SqlitePingBackend(PING_STATE_PATH)
+    if nome == "kv":
+        if PING_STATE_REDIS_URL:
+            import redis
+
+            return KVPingBackend(redis.Redis.from_url(PING_STATE_REDIS_URL))
+        return KVPingBackend(KVLocal())
+    return MemoriaPingBackend()
+
+
+# Backend global do estado de ping
+_backend = criar_backend()
+# Última gravação de last_activity feita por este processo (ver PING_ACTIVITY_WRITE_INTERVAL)
+_ultima_gravacao_atividade = 0.0
+# Sinalizada quando o warming termina neste processo; acorda os clientes em long-poll
+_warming_condition = threading.Condition()
+# Avança a cada notificação: quem leu o estado fora do lock não perde um aviso dado nesse meio tempo
+_geracao_warming = 0
+_long_poll_stats = {'waiting': 0, 'released': 0, 'timed_out': 0, 'rejected': 0}
+
+
+def _notificar_fim_warming():
+    global _geracao_warming
+    with _warming_condition:
+        _geracao_warming += 1
+        _warming_condition.notify_all()
+
+
 class PingManager:
-    """Classe para gerenciar o estado de ping de forma thread-safe"""
+    """Classe para gerenciar o estado de ping de forma thread-safe (e entre processos)"""
 
     @staticmethod
-    def update_last_activity():
+    def update_last_activity(em_segundo_plano=False):
         """
         ⭐ MÉTODO PRINCIPAL - Atualiza o timestamp da última atividade da API
         Use este método em todos os seus endpoints importantes!
+        em_segundo_plano=True (telemetria) grava fora da requisição nos backends compartilhados.
         """
-        with _ping_lock:
-            _ping_state.last_activity = time.time()
+        global _ultima_gravacao_atividade
+        agora = time.time()
+        if agora - _ultima_gravacao_atividade < PING_ACTIVITY_WRITE_INTERVAL:
+            return
+        _ultima_gravacao_atividade = agora
+        if em_segundo_plano and not isinstance(_backend, MemoriaPingBackend):
+            background.executar(_backend.registrar_atividade, agora)
+        else:
+            _backend.registrar_atividade(agora)
 
     @staticmethod
     def is_api_cold() -> bool:
         """Verifica se a API está fria (sem atividade recente)"""
-        with _ping_lock:
-            if _ping_state.last_activity is None:
-                return True
-            return time.time() - _ping_state.last_activity > COLD_START_THRESHOLD
+        last_activity = _backend.ultima_atividade()
+        if last_activity is None:
+            return True
+        return time.time() - last_activity > COLD_START_THRESHOLD
 
     @staticmethod
     def get_ping_state_info() -> dict:
         """Retorna informações sobre o estado atual (para debug/status)"""
-        with _ping_lock:
-            current_time = time.time()
-            return {
-                'is_api_cold': PingManager.is_api_cold(),
-                'is_warming_up': _ping_state.is_warming_up,
-                'warming_client_id': _ping_state.warming_client_id,
-                'waiting_clients_count': len(_ping_state.waiting_clients),
-                'last_activity': (
-                    datetime.fromtimestamp(_ping_state.last_activity).isoformat()
-                    if _ping_state.last_activity else None
-                ),
-                'last_activity_seconds_ago': (
-                    round(current_time - _ping_state.last_activity, 2)
-                    if _ping_state.last_activity else None
-                )
-            }
+        estado = _backend.snapshot()
+        current_time = time.time()
+        last_activity = estado['last_activity']
+        return {
+            'backend': type(_backend).__name__,
+            'is_api_cold': last_activity is None or current_time - last_activity > COLD_START_THRESHOLD,
+            'is_warming_up': estado['is_warming_up'],
+            'warming_client_id': estado['warming_client_id'],
+            'waiting_clients_count': estado['waiting_clients_count'],
+            'last_activity': (
+                datetime.fromtimestamp(last_activity).isoformat()
+                if last_activity else None
+            ),
+            'last_activity_seconds_ago': (
+                round(current_time - last_activity, 2)
+                if last_activity else None
+            ),
+            'last_warming': estado['last_warming'],
+            # Contadores deste processo
+            'long_poll': dict(_long_poll_stats, max_waiters=PING_LONGPOLL_MAX_WAITERS)
+        }
+
+    @staticmethod
+    def wait_until_warm(max_wait_s: float) -> Optional[bool]:
+        """
+        Bloqueia até o warming em andamento terminar (True) ou max_wait_s passar (False).
+        Retorna None na hora se já há PING_LONGPOLL_MAX_WAITERS clientes esperando neste processo.
+        O snapshot (I/O nos backends sqlite/kv) é lido fora do lock; a geração da notificação,
+        lida antes dele, garante que um aviso dado nesse meio tempo não se perde.
+        """
+        fim = time.monotonic() + max_wait_s
+        with _warming_condition:
+            if _long_poll_stats['waiting'] >= PING_LONGPOLL_MAX_WAITERS:
+                _long_poll_stats['rejected'] += 1
+                return None
+            _long_poll_stats['waiting'] += 1
+        resultado = False
+        try:
+            while True:
+                geracao = _geracao_warming
+                if not _backend.snapshot()['is_warming_up']:
+                    resultado = True
+                    return True
+                restante = fim - time.monotonic()
+                if restante <= 0:
+                    return False
+                with _warming_condition:
+                    if geracao == _geracao_warming:
+                        _warming_condition.wait(min(restante, PING_LONGPOLL_POLL_MS / 1000))
+        finally:
+            with _warming_condition:
+                _long_poll_stats['waiting'] -= 1
+                _long_poll_stats['released' if resultado else 'timed_out'] += 1
 
     @staticmethod
     def force_reset():
         """Força reset do estado (para admin/debug)"""
-        with _ping_lock:
-            _ping_state.is_warming_up = False
-            _ping_state.warming_started_at = None
-            _ping_state.warming_client_id = None
-            _ping_state.waiting_clients.clear()
-            _ping_state.last_activity = None
+        global _ultima_gravacao_atividade
+        _backend.resetar()
+        _ultima_gravacao_atividade = 0.0
+        _notificar_fim_warming()
 
     # Métodos internos para o sistema de ping (não use diretamente)
+    @staticmethod
+    def _try_start_warming(client_id: str) -> bool:
+        """Elege client_id para aquecer a API; False se outro cliente (de qualquer worker) já está aquecendo"""
+        agora = time.time()
+        return _backend.iniciar_warming(client_id, agora, agora - WARMING_TIMEOUT)
+
     @staticmethod
     def _set_warming_state(client_id: str, is_warming: bool):
-        with _ping_lock:
-            _ping_state.is_warming_up = is_warming
-            if is_warming:
-                _ping_state.warming_client_id = client_id
-                _ping_state.warming_started_at = time.time()
-            else:
-                _ping_state.warming_client_id = None
-                _ping_state.warming_started_at = None
+        if is_warming:
+            PingManager._try_start_warming(client_id)
+        else:
+            _backend.finalizar_warming()
+            _notificar_fim_warming()
+
+    @staticmethod
+    def _set_warming_result(result: dict):
+        _backend.salvar_resultado(dict(result, finished_at=datetime.now().isoformat()))
 
     @staticmethod
     def _add_waiting_client(client_id: str):
-        with _ping_lock:
-            _ping_state.waiting_clients[client_id] = time.time()
+        _backend.adicionar_cliente(client_id, time.time())
 
     @staticmethod
-    def _clear_waiting_clients():
-        with _ping_lock:
-            _ping_state.waiting_clients.clear()
+    def _clear_waiting_clients() -> int:
+        """Remove todos os clientes em espera; retorna quantos eram"""
+        return _backend.limpar_clientes()
 
     @staticmethod
     def _cleanup_old_waiting_clients():
-        with _ping_lock:
-            current_time = time.time()
-            to_remove = []
-
-            for client_id, timestamp in _ping_state.waiting_clients.items():
-                if current_time - timestamp > WARMING_TIMEOUT * 2:
-                    to_remove.append(client_id)
-
-            for client_id in to_remove:
-                del _ping_state.waiting_clients[client_id]
+        _backend.remover_clientes_antigos(time.time() - WARMING_TIMEOUT * 2)
 
     @staticmethod
     def _get_warming_info():
-        with _ping_lock:
-            if not _ping_state.is_warming_up:
-                return None
+        estado = _backend.snapshot()
+        if not estado['is_warming_up']:
+            return None
 
-            current_time = time.time()
+        current_time = time.time()
+        started_at = estado['warming_started_at']
 
-            # Verifica timeout
-            if (_ping_state.warming_started_at and
-                current_time - _ping_state.warming_started_at > WARMING_TIMEOUT):
-                return 'timeout'
+        # Verifica timeout
+        if started_at and current_time - started_at > WARMING_TIMEOUT:
+            return 'timeout'
 
-            return {
-                'warming_client_id': _ping_state.warming_client_id,
-                'waiting_clients_count': len(_ping_state.waiting_clients),
-                'warming_duration': round(current_time - _ping_state.warming_started_at, 2)
-            }
+        return {
+            'warming_client_id': estado['warming_client_id'],
+            'waiting_clients_count': estado['waiting_clients_count'],
+            'warming_duration': round(current_time - started_at, 2) if started_at else 0
+        }
 
 # Inicializar com API "quente" no desenvolvimento
 if __name__ != '__main__':
-    PingManager.update_last_activity()
\ No newline at end of file
+    PingManager.update_last_activity()
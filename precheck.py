@@ -0,0 +1,206 @@
+"""
+Pré-checagem local das respostas de redação antes de chamar a IA
+USO: ai.before_request(precheck.verificar_requisicao)   # em ai_routes.py
+     POST /ai/gemini {"text": "<prompt completo>",
+                      "precheck": {"answer": "<resposta do aluno>", "theme": "...", "difficulty": "easy"}}
+
+Só roda quando o corpo traz "precheck" (o "text" continua sendo o prompt enviado ao provedor).
+O tema pode vir como texto ("theme") ou pela posição em temas.json ("theme_index" + "difficulty").
+Checagens, em ordem (a primeira que falha responde na hora, sem chamar o provedor):
+- empty: resposta vazia
+- too_long: acima de PRECHECK_MAX_CHARS
+- wrong_language: escrita majoritariamente em português/espanhol ou em outro alfabeto
+- copy_of_prompt: cópia do enunciado do tema
+- too_short: menos palavras que o mínimo da dificuldade (PRECHECK_MIN_WORDS=easy:3,medium:8,hard:15)
+- misspelled: fração de palavras fora do dicionário acima de PRECHECK_MAX_UNKNOWN_RATIO
+
+O dicionário é o vocabulário dos textos/temas do app mais PRECHECK_DICTIONARY_PATH (uma palavra
+por linha; padrão /usr/share/dict/words). Sem esse arquivo a checagem de ortografia fica desligada,
+já que só o vocabulário do app geraria falsos positivos.
+A resposta pronta é texto puro com o header X-Precheck: <motivo>; os contadores vão para /metrics.
+"""
+import os
+import re
+import threading
+
+from flask import request
+
+import content_store
+
+PRECHECK_ENABLED = os.getenv("PRECHECK_ENABLED", "1") == "1"
+PRECHECK_MAX_CHARS = int(os.getenv("PRECHECK_MAX_CHARS", "4000"))
+PRECHECK_MIN_WORDS = {
+    dificuldade: int(minimo)
+    for dificuldade, minimo in (
+        item.split(":") for item in os.getenv("PRECHECK_MIN_WORDS", "easy:3,medium:8,hard:15").split(",")
+    )
+}
+PRECHECK_MAX_UNKNOWN_RATIO = float(os.getenv("PRECHECK_MAX_UNKNOWN_RATIO", "0.5"))
+PRECHECK_COPY_RATIO = float(os.getenv("PRECHECK_COPY_RATIO", "0.8"))
+PRECHECK_DICTIONARY_PATH = os.getenv("PRECHECK_DICTIONARY_PATH", "/usr/share/dict/words")
+
+# Rotas cobertas (o benchmark compara provedores e sempre chama todos)
+ROTAS_COM_PRECHECK = ("/ai/gemini", "/ai/cohere", "/ai/mistral", "/ai/groq", "/ai/openrouter")
+
+PALAVRA_REGEX = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# Palavras funcionais frequentes, usadas para identificar o idioma em textos curtos
+STOPWORDS_INGLES = frozenset(
+    "the a an and or but is are was were be been am i you he she it we they my your his her its our their "
+    "this that these those to of in on at for with from by about as not no do does did have has had will "
+    "would can could should there here what when where why how who which me him us them so if then than "
+    "because very too also just like all some any one more most".split()
+)
+STOPWORDS_OUTROS = frozenset(
+    "o os as um uma uns umas e é eu você voce ele ela nós nos eles elas meu minha seu sua de do da dos das "
+    "em no na nos nas para por com que não nao sim mas muito isso este esta esse essa aquele está esta são "
+    "foi ser ter tem tenho mais como quando porque também tambem já ja el la los las y es yo tú tu mi "
+    "con del al lo pero muy también porque sí".split()
+) - STOPWORDS_INGLES
+
+RESPOSTAS = {
+    "empty": "Você não escreveu nada ainda. Escreva sua resposta em inglês sobre o tema e envie de novo!",
+    "too_long": "Sua resposta ficou longa demais. Tente resumir em até {limite} caracteres.",
+    "wrong_language": "Parece que sua resposta não está em inglês. Tente escrever sobre o tema em inglês!",
+    "copy_of_prompt": "Sua resposta repete o enunciado do tema. Escreva com suas próprias palavras!",
+    "too_short": "Sua resposta está curta demais para esta dificuldade. Escreva pelo menos {minimo} palavras.",
+    "misspelled": "Não reconhecemos várias palavras da sua resposta ({palavras}). Revise a ortografia e tente de novo."
+}
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("checked", "passed", "avoided", *(f"avoided_{motivo}" for motivo in RESPOSTAS))
+_stats = dict.fromkeys(CONTADORES, 0)
+_stats_lock = threading.Lock()
+
+_dicionario = None
+_dicionario_lock = threading.Lock()
+
+
+def _contar(*chaves):
+    with _stats_lock:
+        for chave in chaves:
+            _stats[chave] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _palavras(texto):
+    return [palavra.lower().replace("’", "'") for palavra in PALAVRA_REGEX.findall(texto.replace("’", "'"))]
+
+
+def dicionario():
+    """
+    Conjunto de palavras conhecidas (vocabulário do app + arquivo de dicionário), carregado uma vez.
+    Retorna None se não há arquivo de dicionário (ortografia desligada).
+    """
+    global _dicionario
+    if _dicionario is not None:
+        return _dicionario or None
+    with _dicionario_lock:
+        if _dicionario is None:
+            palavras = set()
+            if PRECHECK_DICTIONARY_PATH and os.path.exists(PRECHECK_DICTIONARY_PATH):
+                with open(PRECHECK_DICTIONARY_PATH, encoding="utf-8", errors="ignore") as f:
+                    palavras.update(linha.strip().lower() for linha in f if linha.strip())
+            if palavras:
+                for nome in content_store.ARQUIVOS:
+                    for itens in content_store.conteudo(nome).values():
+                        for item in itens:
+                            palavras.update(_palavras(item))
+                palavras.update(STOPWORDS_INGLES)
+            _dicionario = frozenset(palavras)
+    return _dicionario or None
+
+
+def _conhecida(palavra, conhecidas):
+    if palavra in conhecidas:
+        return True
+    # Flexões regulares que os dicionários costumam omitir
+    base = palavra.split("'")[0]
+    for sufixo in ("s", "es", "ed", "d", "ing", "ly"):
+        if base.endswith(sufixo) and base[:-len(sufixo)] in conhecidas:
+            return True
+    return base in conhecidas or (base.endswith("ing") and base[:-3] + "e" in conhecidas)
+
+
+def _outro_idioma(texto, palavras):
+    letras = [c for c in texto if c.isalpha()]
+    if letras and sum(c.isascii() for c in letras) / len(letras) < 0.7:
+        return True
+    ingles = sum(palavra in STOPWORDS_INGLES for palavra in palavras)
+    outros = sum(palavra in STOPWORDS_OUTROS for palavra in palavras)
+    return outros >= 2 and outros > ingles
+
+
+def _copia_do_tema(palavras, tema):
+    palavras_tema = set(_palavras(tema))
+    if not palavras or not palavras_tema:
+        return False
+    repetidas = sum(palavra in palavras_tema for palavra in palavras)
+    # Quase tudo na resposta vem do enunciado (e ela não é muito maior que ele)
+    return repetidas / len(palavras) >= PRECHECK_COPY_RATIO and len(palavras) <= 2 * len(palavras_tema)
+
+
+def avaliar(resposta, tema=None, dificuldade="easy"):
+    """
+    Roda as checagens locais. Retorna (motivo, mensagem) da primeira que falhar
+    ou None se a resposta deve seguir para a IA.
+    """
+    texto = (resposta or "").strip()
+    if not texto:
+        return "empty", RESPOSTAS["empty"]
+    if len(texto) > PRECHECK_MAX_CHARS:
+        return "too_long", RESPOSTAS["too_long"].format(limite=PRECHECK_MAX_CHARS)
+
+    palavras = _palavras(texto)
+    if _outro_idioma(texto, palavras):
+        return "wrong_language", RESPOSTAS["wrong_language"]
+    if tema and _copia_do_tema(palavras, tema):
+        return "copy_of_prompt", RESPOSTAS["copy_of_prompt"]
+
+    minimo = PRECHECK_MIN_WORDS.get(dificuldade, PRECHECK_MIN_WORDS.get("easy", 1))
+    if len(palavras) < minimo:
+        return "too_short", RESPOSTAS["too_short"].format(minimo=minimo)
+
+    conhecidas = dicionario()
+    if conhecidas is not None:
+        desconhecidas = [palavra for palavra in palavras if not _conhecida(palavra, conhecidas)]
+        if len(desconhecidas) / len(palavras) > PRECHECK_MAX_UNKNOWN_RATIO:
+            amostra = ", ".join(dict.fromkeys(desconhecidas[:5]))
+            return "misspelled", RESPOSTAS["misspelled"].format(palavras=amostra)
+    return None
+
+
+def _tema(dados):
+    tema = dados.get("theme")
+    if isinstance(tema, str):
+        return tema
+    indice = dados.get("theme_index")
+    if isinstance(indice, int) and not isinstance(indice, bool):
+        temas = content_store.colecao("temas").itens(dados.get("difficulty") or "easy")
+        if 0 <= indice < len(temas):
+            return temas[indice]
+    return None
+
+
+def verificar_requisicao():
+    """before_request das rotas de IA: responde na hora se a pré-checagem reprovar a resposta"""
+    if not PRECHECK_ENABLED or request.method != "POST" or request.path not in ROTAS_COM_PRECHECK:
+        return None
+    corpo = request.get_json(silent=True)
+    dados = corpo.get("precheck") if isinstance(corpo, dict) else None
+    if not isinstance(dados, dict) or not isinstance(dados.get("answer"), str):
+        return None
+
+    _contar("checked")
+    resultado = avaliar(dados["answer"], _tema(dados), dados.get("difficulty") or "easy")
+    if resultado is None:
+        _contar("passed")
+        return None
+
+    motivo, mensagem = resultado
+    _contar("avoided", f"avoided_{motivo}")
+    return mensagem, 200, {"Content-Type": "text/plain; charset=utf-8", "X-Precheck": motivo}
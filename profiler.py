@@ -0,0 +1,212 @@
+"""
+Profiler sob demanda para requisições em produção
+USO: import profiler
+     profiler.init_app(app)                  # middleware + /admin/profiles
+     profiler.instrumentar_banco(db.engine)  # tempo de SQL (dentro do app context)
+     with profiler.secao("http"): ...        # tempo de uma categoria (http, tts, ...)
+
+Uma requisição é perfilada quando traz o header "X-Profile: <PROFILER_TOKEN>" ou quando é
+sorteada por PROFILER_SAMPLE_RATE (0 a 1). O perfil guarda o cProfile da requisição (funções
+mais caras e o .prof para baixar) e o tempo gasto em banco, HTTP dos provedores, TTS e
+serialização JSON. Os últimos PROFILER_MAX_PROFILES ficam em memória e são servidos em
+/admin/profiles (também exige o header X-Profile com o token).
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "20"))
+PROFILER_TOP_FUNCTIONS = int(os.getenv("PROFILER_TOP_FUNCTIONS", "40"))
+
+CATEGORIAS = ("db", "http", "tts", "serialization")
+
+profiler_admin = Blueprint("profiler_admin", __name__)
+
+_perfis = deque(maxlen=PROFILER_MAX_PROFILES)
+_perfis_lock = threading.Lock()
+# Só um cProfile ativo por vez (no Python 3.12+ um segundo profiler simultâneo levanta erro)
+_cprofile_lock = threading.Lock()
+
+
+def _token_valido():
+    # Comparação em tempo constante (bytes: o header pode ter caracteres fora do ASCII)
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(
+        request.headers.get("X-Profile", "").encode(), PROFILER_TOKEN.encode()
+    )
+
+
+def _perfil_atual():
+    return g.get("perfil") if has_request_context() else None
+
+
+@contextmanager
+def secao(categoria):
+    """Soma o tempo do bloco na categoria do perfil da requisição atual (sem custo se não há perfil)"""
+    perfil = _perfil_atual()
+    if perfil is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil["categorias"][categoria] = perfil["categorias"].get(categoria, 0.0) + time.perf_counter() - inicio
+
+
+def instrumentar_banco(engine):
+    """Mede o tempo de cada comando SQL das requisições perfiladas"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+        if _perfil_atual() is not None:
+            conn.info.setdefault("profiler_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+        perfil = _perfil_atual()
+        inicios = conn.info.get("profiler_inicio")
+        if perfil is None or not inicios:
+            return
+        perfil["categorias"]["db"] = perfil["categorias"].get("db", 0.0) + time.perf_counter() - inicios.pop()
+        perfil["consultas"] += 1
+
+
+class JSONProviderCronometrado(DefaultJSONProvider):
+    """JSON provider do Flask que mede o tempo de serialização das respostas perfiladas"""
+
+    def dumps(self, obj, **kwargs):
+        with secao("serialization"):
+            return super().dumps(obj, **kwargs)
+
+
+def _iniciar():
+    forcado = _token_valido()
+    if not forcado and (PROFILER_SAMPLE_RATE <= 0 or random.random() >= PROFILER_SAMPLE_RATE):
+        return
+    if request.path.startswith("/admin/profiles"):
+        return
+
+    perfil = {"categorias": {}, "consultas": 0, "inicio": time.perf_counter(), "cprofile": None}
+    # Se outro cProfile está rodando, ainda registra as categorias (sem as funções)
+    if _cprofile_lock.acquire(blocking=False):
+        perfil["cprofile"] = cProfile.Profile()
+        perfil["cprofile"].enable()
+    perfil["motivo"] = "header" if forcado else "sample"
+    g.perfil = perfil
+
+
+def _finalizar(response):
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return response
+
+    duracao = time.perf_counter() - perfil["inicio"]
+    perfil_id = uuid.uuid4().hex[:12]
+    funcoes = None
+    dump = None
+    if perfil["cprofile"] is not None:
+        perfil["cprofile"].disable()
+        _cprofile_lock.release()
+        perfil["cprofile"].create_stats()
+        dump = marshal.dumps(perfil["cprofile"].stats)
+        saida = io.StringIO()
+        pstats.Stats(perfil["cprofile"], stream=saida).sort_stats("cumulative").print_stats(PROFILER_TOP_FUNCTIONS)
+        funcoes = saida.getvalue()
+
+    categorias_ms = {categoria: round(perfil["categorias"].get(categoria, 0.0) * 1000, 2) for categoria in CATEGORIAS}
+    categorias_ms["other"] = round(max(duracao * 1000 - sum(categorias_ms.values()), 0), 2)
+    registro = {
+        "id": perfil_id,
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "reason": perfil["motivo"],
+        "started_at": datetime.now().isoformat(),
+        "duration_ms": round(duracao * 1000, 2),
+        "breakdown_ms": categorias_ms,
+        "db_queries": perfil["consultas"],
+        "top_functions": funcoes,
+        "_dump": dump
+    }
+    with _perfis_lock:
+        _perfis.append(registro)
+
+    response.headers["X-Profile-Id"] = perfil_id
+    return response
+
+
+def _abortar_sem_finalizar(exc):
+    # Exceção não tratada: after_request não roda; garante que o cProfile seja desligado
+    perfil = g.pop("perfil", None) if has_request_context() else None
+    if perfil is not None and perfil["cprofile"] is not None:
+        perfil["cprofile"].disable()
+        _cprofile_lock.release()
+
+
+def init_app(app):
+    """Registra o middleware do profiler, o JSON provider cronometrado e /admin/profiles"""
+    app.json = JSONProviderCronometrado(app)
+    app.before_request(_iniciar)
+    app.after_request(_finalizar)
+    app.teardown_request(_abortar_sem_finalizar)
+    app.register_blueprint(profiler_admin)
+
+
+def _buscar(perfil_id):
+    with _perfis_lock:
+        for registro in _perfis:
+            if registro["id"] == perfil_id:
+                return registro
+    abort(404)
+
+
+@profiler_admin.before_request
+def _exigir_token():
+    if not _token_valido():
+        abort(404)
+
+
+@profiler_admin.route("/admin/profiles", methods=["GET"])
+def listar_perfis():
+    """Últimos perfis capturados (sem o detalhamento por função)"""
+    with _perfis_lock:
+        perfis = [
+            {chave: valor for chave, valor in registro.items() if chave not in ("top_functions", "_dump")}
+            for registro in reversed(_perfis)
+        ]
+    return jsonify({"sample_rate": PROFILER_SAMPLE_RATE, "max_profiles": PROFILER_MAX_PROFILES, "profiles": perfis})
+
+
+@profiler_admin.route("/admin/profiles/<perfil_id>", methods=["GET"])
+def obter_perfil(perfil_id):
+    """Perfil completo, com as funções mais caras (ordenadas por tempo acumulado)"""
+    registro = _buscar(perfil_id)
+    return jsonify({chave: valor for chave, valor in registro.items() if chave != "_dump"})
+
+
+@profiler_admin.route("/admin/profiles/<perfil_id>.prof", methods=["GET"])
+def baixar_perfil(perfil_id):
+    """Arquivo .prof (pstats) para abrir com `python -m pstats` ou snakeviz"""
+    registro = _buscar(perfil_id)
+    if registro["_dump"] is None:
+        abort(404)
+    return Response(
+        registro["_dump"], mimetype="application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename=profile-{perfil_id}.prof"}
+    )
@@ -3,19 +3,36 @@ import random
 import re
 import string
 from datetime import timedelta
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from sqlalchemy import desc
+from sqlalchemy import desc, func, select
+from sqlalchemy.exc import IntegrityError
 
-from database import db, Usuario
-from email_validator import validate_email, EmailNotValidError
+from database import db, Usuario, UsuarioRevisao, bits_para_conquistas, conquistas_padrao
+from email_validator import EmailNotValidError
+import background
+import email_check
 import bcrypt
 
-from ping_manager import PingManager
+from game_state import OperacaoInvalida, aplicar_operacoes
+from user_cache import user_cache
 
 
 routes = Blueprint("routes", __name__)
 
+# Colunas que nunca saem na listagem de usuários
+CAMPOS_PRIVADOS = {"password", "OTP_code"}
+# Colunas indexadas aceitas como filtro em GET /usuarios
+FILTROS_USUARIOS = ("email", "referal_code", "invited_by")
+# Linhas buscadas por vez do cursor no servidor
+LOTE_STREAM_USUARIOS = 500
+LIMITE_MAXIMO_PAGINA = 1000
+# Tokens creditados a quem indicou um novo usuário
+BONUS_INDICACAO = 100
+TENTATIVAS_CODIGO_REFERENCIA = 5
+# Nome/sobrenome: apenas letras (com acentos) e espaços; compilado uma vez (ver warming.py)
+NOME_REGEX = re.compile(r"^[A-Za-zÀ-ÖØ-öø-ÿ\s]+$")
+
 
 # Função para gerar hash da senha
 def hash_senha(senha):
@@ -50,29 +67,18 @@ def criar_usuario():
     dados = request.get_json()
 
     # Verifica nome e sobrenome com regex
-    if not re.match(r"^[A-Za-zÀ-ÖØ-öø-ÿ\s]+$", dados["nome"]) or not re.match(r"^[A-Za-zÀ-ÖØ-öø-ÿ\s]+$", dados["sobrenome"]):
+    if not NOME_REGEX.match(dados["nome"]) or not NOME_REGEX.match(dados["sobrenome"]):
         return jsonify({"erro": "Nome e sobrenome devem conter apenas letras."}), 400
 
     # Validação de email
     try:
-        validate_email(dados["email"])
+        email_check.validar_email_cadastro(dados["email"])
     except EmailNotValidError:
         return jsonify({"erro": "E-mail inválido!"}), 400
 
-    # Impede o uso do próprio código de referência
-    if "referal_code" in dados and dados["referal_code"]:
-        usuario_referenciador = Usuario.query.filter_by(referal_code=dados["referal_code"]).first()
-        if usuario_referenciador and usuario_referenciador.email == dados["email"]:
-            return jsonify({"erro": "Você não pode usar seu próprio código de referência!"}), 403
-
     # Hash da senha
     senha_hash = hash_senha(dados["password"])
 
-    # Geração de código de referência único
-    referal_code = generate_referal_code()
-    while Usuario.query.filter_by(referal_code=referal_code).first():
-        referal_code = generate_referal_code()
-
     # Itens iniciais
     itens_iniciais = [
         {
@@ -111,50 +117,71 @@ def criar_usuario():
         "refreshTimeAt": 0
     }
 
-    # Achievements iniciais
-    achievements_iniciais = {
-      "achievements": [
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False,
-        False, False, False, False, False
-      ]
-    }
+    codigo_indicacao = dados.get("referal_code") or None
+
+    # O código de referência é sorteado e o índice único resolve colisões (nova tentativa).
+    # O bônus de quem indicou é creditado em segundo plano depois do commit (ver background.py).
+    for _ in range(TENTATIVAS_CODIGO_REFERENCIA):
+        novo_usuario = Usuario(
+            nome=dados["nome"],
+            sobrenome=dados.get("sobrenome"),
+            email=dados["email"],
+            password=senha_hash,
+            gender=dados.get("gender"),
+            data_nascimento=dados.get("data_nascimento"),
+            referal_code=generate_referal_code(),
+            invited_by=codigo_indicacao,
+            items=json.dumps(itens_iniciais),
+            dailyMissions=json.dumps(daily_missions_iniciais),
+            achievements=json.dumps(conquistas_padrao())
+        )
+        verificar_email = email_check.precisa_verificar(dados["email"])
+        if verificar_email:
+            novo_usuario.email_status = "pending"
+        db.session.add(novo_usuario)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            existente = Usuario.query.filter_by(email=dados["email"]).first()
+            if existente:
+                # Impede o uso do próprio código de referência
+                if codigo_indicacao and existente.referal_code == codigo_indicacao:
+                    return jsonify({"erro": "Você não pode usar seu próprio código de referência!"}), 403
+                return jsonify({"erro": "E-mail já cadastrado!"}), 409
+    else:
+        return jsonify({"erro": "Não foi possível gerar um código de referência. Tente novamente."}), 500
+
+    # Efeitos colaterais fora da requisição: tarefas duráveis e idempotentes (ver background.py).
+    # Se o enfileiramento falhar (ou o processo morrer aqui), a varredura abaixo reenfileira o bônus.
+    if codigo_indicacao:
+        try:
+            _enfileirar_bonus_indicacao(novo_usuario.id)
+        except Exception as e:
+            print(f"⚠️ Bônus de indicação do usuário {novo_usuario.id} fica para a varredura: {e}")
+    # Entregabilidade do domínio é conferida fora da requisição (EMAIL_VALIDATION_MODE=cached);
+    # o usuário fica com email_status="pending" e a varredura do email_check cobre uma falha aqui
+    if verificar_email:
+        try:
+            email_check.agendar_verificacao(novo_usuario.id, novo_usuario.email)
+        except Exception as e:
+            print(f"⚠️ Verificação do e-mail do usuário {novo_usuario.id} fica para a varredura: {e}")
 
-    # Criar novo usuário
-    novo_usuario = Usuario(
-        nome=dados["nome"],
-        sobrenome=dados.get("sobrenome"),
-        email=dados["email"],
-        password=senha_hash,
-        gender=dados.get("gender"),
-        data_nascimento=dados.get("data_nascimento"),
-        referal_code=referal_code,
-        invited_by=dados.get("referal_code"),
-        items=json.dumps(itens_iniciais),
-        dailyMissions=json.dumps(daily_missions_iniciais),
-        achievements=json.dumps(achievements_iniciais)
-    )
+    return jsonify({"mensagem": "Usuário criado com sucesso!"}), 201
 
-    db.session.add(novo_usuario)
-    db.session.commit()
 
-    # Bônus por indicação (removido tokens_by_referral)
-    if novo_usuario.invited_by:
-        usuario_referenciador = Usuario.query.filter_by(referal_code=novo_usuario.invited_by).first()
-        if usuario_referenciador:
-            usuario_referenciador.tokens += 100
-            db.session.commit()
+def _enfileirar_bonus_indicacao(user_id):
+    background.enfileirar(
+        "bonus_indicacao", chave=f"bonus_indicacao:{user_id}", user_id=user_id, tokens=BONUS_INDICACAO
+    )
 
-    PingManager.update_last_activity()
-    return jsonify({"mensagem": "Usuário criado com sucesso!"}), 201
+
+@background.varredura("bonus_indicacao")
+def _reconciliar_bonus_indicacao():
+    """Reenfileira bônus de indicação ainda não pagos (a tarefa é idempotente, repetir não credita duas vezes)"""
+    for user_id in Usuario.bonus_indicacao_pendentes():
+        _enfileirar_bonus_indicacao(user_id)
 
 
 
@@ -171,12 +198,13 @@ def login():
     if not usuario or not usuario.check_password(password):
         return jsonify({"erro": "Credenciais inválidas!"}), 401
 
-    usuario_data = {campo: getattr(usuario, campo) for campo in Usuario.__table__.columns.keys()}
-    access_token = create_access_token(identity=usuario.id, additional_claims=usuario_data,
+    # achievements_format="bits" envia só o bitset de conquistas no token (JWT bem menor)
+    usuario_data = usuario.to_dict(achievements_format=dados.get("achievements_format", "list"))
+    # sub precisa ser string (o PyJWT recusa o token na validação), como no /generate-new-jwt
+    access_token = create_access_token(identity=str(usuario.id), additional_claims=usuario_data,
                                        expires_delta=timedelta(days=7))
-    refresh_token = create_refresh_token(identity=usuario.id, expires_delta=timedelta(days=30))
+    refresh_token = create_refresh_token(identity=str(usuario.id), expires_delta=timedelta(days=30))
 
-    PingManager.update_last_activity()
     return jsonify(
         {"mensagem": "Login realizado com sucesso!", "access_token": access_token, "refresh_token": refresh_token}), 200
 
@@ -188,12 +216,10 @@ def atualizar_usuario(id):
         return jsonify({"erro": "Usuário não encontrado"}), 404
 
     dados = request.get_json()
-    for campo, valor in dados.items():
-        if hasattr(usuario, campo) and valor is not None:
-            setattr(usuario, campo, valor)
+    for campo, valor in Usuario.campos_do_cliente(dados).items():
+        setattr(usuario, campo, valor)
 
     db.session.commit()
-    PingManager.update_last_activity()
     return jsonify({"mensagem": "Usuário atualizado com sucesso!"})
 
 
@@ -205,26 +231,221 @@ def deletar_usuario(id):
 
     db.session.delete(usuario)
     db.session.commit()
-    PingManager.update_last_activity()
     return jsonify({"mensagem": "Usuário deletado com sucesso!"})
 
 
 @routes.route("/usuarios", methods=["GET"])
 def listar_usuarios():
-    usuarios = Usuario.query.all()
-    lista_usuarios = [{campo: getattr(u, campo) for campo in Usuario.__table__.columns.keys()} for u in usuarios]
-    PingManager.update_last_activity()
-    return jsonify(lista_usuarios)
+    """
+    Lista usuários sem carregar a tabela inteira na memória.
+
+    Parâmetros (todos opcionais):
+    - fields=nome,email,...   projeção de colunas (password/OTP_code nunca são enviados)
+    - email= / referal_code= / invited_by=   filtros em colunas indexadas
+    - limit=N&after_id=X      paginação por keyset (1 <= N, até LIMITE_MAXIMO_PAGINA); retorna {"usuarios": [...], "next_after_id": ...}
+    - format=ndjson           sem limit: um usuário por linha; padrão é um array JSON em streaming
+    """
+    colunas_publicas = [c for c in Usuario.__table__.columns.keys() if c not in CAMPOS_PRIVADOS]
+    if request.args.get("fields"):
+        campos = [c.strip() for c in request.args["fields"].split(",") if c.strip()]
+        invalidos = [c for c in campos if c not in colunas_publicas]
+        if invalidos:
+            return jsonify({"erro": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+    else:
+        campos = colunas_publicas
+
+    # id sempre é lido (ordenação/keyset), mesmo que não seja enviado
+    consulta = select(*[Usuario.__table__.c[c] for c in dict.fromkeys(["id", *campos])]).order_by(Usuario.id)
+    for filtro in FILTROS_USUARIOS:
+        if request.args.get(filtro):
+            consulta = consulta.where(Usuario.__table__.c[filtro] == request.args[filtro])
+    after_id = request.args.get("after_id", type=int)
+    if after_id is not None:
+        consulta = consulta.where(Usuario.id > after_id)
+
+    def serializar(linha):
+        return Usuario.serializar({c: linha._mapping[c] for c in campos})
+
+    limite = request.args.get("limit", type=int)
+    if limite is not None:
+        # LIMIT -1 no SQLite devolve a tabela inteira (e no Postgres é erro)
+        if limite <= 0:
+            return jsonify({"erro": "limit deve ser maior que zero"}), 400
+        limite = min(limite, LIMITE_MAXIMO_PAGINA)
+        linhas = db.session.execute(consulta.limit(limite)).all()
+        return jsonify({
+            "usuarios": [serializar(linha) for linha in linhas],
+            "next_after_id": linhas[-1].id if len(linhas) == limite else None
+        })
+
+    # Cursor no servidor + lotes: memória constante, independente do tamanho da tabela
+    resultado = db.session.execute(consulta.execution_options(yield_per=LOTE_STREAM_USUARIOS))
+
+    if request.args.get("format") == "ndjson":
+        def gerar_ndjson():
+            for lote in resultado.partitions():
+                yield "".join(json.dumps(serializar(linha)) + "\n" for linha in lote)
+
+        return Response(stream_with_context(gerar_ndjson()), mimetype="application/x-ndjson")
+
+    def gerar_json():
+        yield "["
+        primeiro = True
+        for lote in resultado.partitions():
+            trecho = ",".join(json.dumps(serializar(linha)) for linha in lote)
+            if trecho:
+                yield trecho if primeiro else "," + trecho
+                primeiro = False
+        yield "]"
+
+    return Response(stream_with_context(gerar_json()), mimetype="application/json")
 
 
 @routes.route("/usuarios/<int:id>", methods=["GET"])
 def obter_usuario(id):
-    usuario = Usuario.query.get(id)
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    achievements_format = request.args.get("achievements", "list")
+
+    # ETag derivada da revisão: se o cliente já tem essa versão, nada é serializado
+    etag = f"u{id}-r{dados['revision']}-{achievements_format}"
+    if request.if_none_match.contains_weak(etag):
+        return "", 304, {"ETag": f'W/"{etag}"'}
+
+    response = jsonify(Usuario.serializar(dados, achievements_format=achievements_format))
+    response.set_etag(etag, weak=True)
+    return response
+
+
+@routes.route("/usuarios/<int:id>/sync", methods=["GET"])
+def sincronizar_usuario(id):
+    """
+    Sync incremental: ?revision=N (última revisão que o cliente tem).
+    Retorna 304 se nada mudou, senão apenas os campos alterados desde N
+    (ou o registro completo, com full=true, se N for antigo demais).
+    Sem ?revision o cliente não tem estado nenhum: sempre recebe o registro completo.
+    """
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    # -1: cliente sem estado (um usuário novo também está na revisão 0)
+    revisao_cliente = request.args.get("revision", type=int)
+    if revisao_cliente is None:
+        revisao_cliente = -1
+    revisao_atual = dados["revision"]
+
+    if revisao_cliente == revisao_atual:
+        return "", 304
+
+    campos = None
+    if 0 < revisao_cliente < revisao_atual:
+        campos = UsuarioRevisao.campos_desde(id, revisao_cliente, revisao_atual)
+
+    completo = campos is None
+    if completo:
+        campos = set(dados)
+    campos -= CAMPOS_PRIVADOS
+    alteracoes = Usuario.serializar({campo: dados[campo] for campo in campos if campo in dados})
+
+    return jsonify({
+        "revision": revisao_atual,
+        "full": completo,
+        "changes": alteracoes
+    })
+
+
+@routes.route("/usuarios/<int:id>/operacoes", methods=["POST"])
+def aplicar_operacoes_usuario(id):
+    """
+    Aplica um lote ordenado de operações de jogo (ver game_state.py) numa única
+    transação, com um único lock da linha, e retorna o estado resultante.
+    Espera JSON: {"operations": [{"op": "gems", "delta": 5}, ...]}
+    """
+    dados = request.get_json(silent=True)
+    # Valida o formato antes de travar a linha
+    if not isinstance(dados, dict) or not isinstance(dados.get("operations"), list):
+        return jsonify({"erro": "Esperado JSON {\"operations\": [...]}"}), 400
+
+    usuario = db.session.query(Usuario).filter_by(id=id).with_for_update().first()
+    if not usuario:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    try:
+        aplicar_operacoes(usuario, dados["operations"])
+    except OperacaoInvalida as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 400
+
+    # Serializa ainda dentro da transação: depois do commit a instância expira e to_dict recarregaria a linha
+    db.session.flush()
+    estado = usuario.to_dict()
+    estado.pop("password", None)
+    db.session.commit()
+
+    return jsonify({"mensagem": "Operações aplicadas com sucesso!", "usuario": estado})
+
+
+@routes.route("/usuarios/<int:id>/missoes", methods=["GET"])
+def obter_missoes(id):
+    """Estado atual das missões diárias (somente leitura, servido do cache de usuários)"""
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    return jsonify({
+        "dailyMissions": json.loads(dados["dailyMissions"]),
+        "revision": dados["revision"]
+    })
+
+
+@routes.route("/usuarios/<int:id>/indicacoes", methods=["GET"])
+def obter_indicacoes(id):
+    """Quantidade de usuários cadastrados com o código de referência deste usuário"""
+    dados = Usuario.obter_dados(id)
+    if not dados:
+        return jsonify({"erro": "Usuário não encontrado"}), 404
+
+    total = 0
+    if dados["referal_code"]:
+        # Contagem resolvida pelo índice em invited_by
+        total = db.session.scalar(
+            select(func.count()).select_from(Usuario).where(Usuario.invited_by == dados["referal_code"])
+        )
+
+    return jsonify({"referal_code": dados["referal_code"], "total_indicados": total})
+
+
+@routes.route("/usuarios/email-validation/status", methods=["GET"])
+def status_validacao_email():
+    """Métricas da validação de e-mail (cache de domínios e fila de verificação)"""
+    return jsonify(email_check.stats())
+
+
+@routes.route("/usuarios/cache/status", methods=["GET"])
+def status_cache_usuarios():
+    """Métricas do cache de usuários (acertos, falhas, invalidações)"""
+    return jsonify(user_cache.stats())
+
+
+@routes.route("/usuarios/<int:id>/achievements", methods=["GET"])
+def obter_conquistas(id):
+    """
+    Retorna as conquistas do usuário.
+    ?format=bits -> bitset em hexadecimal + total; ?format=list (padrão) -> lista expandida de booleanos
+    """
+    usuario = Usuario.get_user_by_id(id)
     if not usuario:
         return jsonify({"erro": "Usuário não encontrado"}), 404
 
-    PingManager.update_last_activity()
-    return jsonify({campo: getattr(usuario, campo) for campo in Usuario.__table__.columns.keys()})
+    if request.args.get("format") == "bits":
+        return jsonify({
+            "achievements_bits": format(usuario.achievements_bits or 0, "x"),
+            "total": usuario.total_conquistas()
+        })
+    return jsonify({"achievements": bits_para_conquistas(usuario.achievements_bits)})
 
 
 
@@ -268,8 +489,8 @@ def generate_new_jwt():
     if not usuario:
         return jsonify({"erro": "Usuário não encontrado!"}), 404
 
-    # Apenas os campos válidos para atualização
-    campos_validos = {k: v for k, v in dados.items() if k in Usuario.__table__.columns.keys() and v is not None and k != 'password'}
+    # Apenas os campos válidos para atualização (os do servidor que vierem nos claims são ignorados)
+    campos_validos = Usuario.campos_do_cliente(dados)
 
     # Se dailyMissions estiver presente e for um dicionário, converte para JSON string
     if "dailyMissions" in campos_validos and isinstance(campos_validos["dailyMissions"], dict):
@@ -281,14 +502,21 @@ def generate_new_jwt():
 
     db.session.commit()
 
+    # Campos do servidor enviados pelo cliente voltam no token com o valor atual do banco
+    atuais = usuario.to_dict()
+    claims = dict(campos_validos)
+    claims.update({
+        campo: atuais[campo] for campo in dados
+        if campo in Usuario.CAMPOS_DO_SERVIDOR and campo not in CAMPOS_PRIVADOS
+    })
+
     # Criamos um novo JWT
     access_token = create_access_token(
         identity=str(user_id),
-        additional_claims=campos_validos,  # Apenas valores válidos
+        additional_claims=claims,  # Apenas valores válidos
         expires_delta=timedelta(days=7)
     )
 
-    PingManager.update_last_activity()
     return jsonify({
         "mensagem": "Novo JWT gerado e usuário atualizado com sucesso!",
         "access_token": access_token
@@ -316,7 +544,6 @@ def listar_ranking():
         for usuario in usuarios
     ]
 
-    PingManager.update_last_activity()
     return jsonify(ranking)
 
 
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import os
+import threading
+import time
+from functools import lru_cache
+
+from flask import Blueprint, request, jsonify, send_file
+from dotenv import load_dotenv
+
+import profiler
+
+load_dotenv()
+
+# Criação do Blueprint (TTS). edge_tts e elevenlabs são pesados de importar,
+# então só são carregados na primeira requisição que precisa deles.
+speech = Blueprint("speech", __name__)
+
+ELEVENLABS_KEY = os.getenv("ELEVENLABS_KEY1")
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "30"))  # segundos, por provedor
+# Orçamento total do /tts (ElevenLabs + fallback para o edge_tts); o timeout do gunicorn fica acima dele
+TTS_REQUEST_BUDGET_S = float(os.getenv("TTS_REQUEST_BUDGET_S", "45"))
+
+_loop_tts = None
+_loop_tts_lock = threading.Lock()
+
+VOICE_IDS = [
+    "TxGEqnHWrfWFTfGW9XjX",  # 0 - Josh
+    "pNInz6obpgDQGcFmaJgB",  # 1 - Adam
+    "onwK4e9ZLuTAKqWW03F9",  # 2 - James
+    "yoZ06aMxZJJ28mfd3POQ",  # 3 - Sam
+    "VR6AewLTigWG4xSOukaG",  # 4 - Arnold
+    "EXAVITQu4vr4xnSDxMaL",  # 5 - Bella (feminina padrão)
+]
+
+
+@lru_cache(maxsize=None)
+def get_elevenlabs_client(api_key):
+    from elevenlabs import ElevenLabs
+
+    return ElevenLabs(api_key=api_key)
+
+
+def obter_loop_tts():
+    """
+    Event loop persistente (numa thread própria) para o edge_tts, em vez de um asyncio.run
+    por requisição. Criado no primeiro uso ou no warming (ver warming.py).
+    """
+    global _loop_tts
+    with _loop_tts_lock:
+        if _loop_tts is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="tts-loop", daemon=True).start()
+            _loop_tts = loop
+        return _loop_tts
+
+
+def executar_no_loop_tts(coro, timeout=TTS_TIMEOUT):
+    """Executa a corrotina no loop do TTS e espera o resultado na thread da requisição"""
+    futuro = asyncio.run_coroutine_threadsafe(coro, obter_loop_tts())
+    try:
+        with profiler.secao("tts"):
+            return futuro.result(timeout)
+    except TimeoutError:
+        # Cancela a síntese no loop, senão ela continuaria consumindo o loop depois da resposta
+        futuro.cancel()
+        raise
+
+
+async def generate_tts_google(text):
+    import edge_tts
+
+    # Áudio em memória: várias requisições simultâneas não disputam o mesmo arquivo
+    tts = edge_tts.Communicate(text, "en-US-ChristopherNeural")
+    buffer = io.BytesIO()
+    async for chunk in tts.stream():
+        if chunk["type"] == "audio":
+            buffer.write(chunk["data"])
+    buffer.seek(0)
+    return buffer
+
+
+def generate_tts_with_elevenlabs(api_key, text, voice_id, timeout=TTS_TIMEOUT):
+    try:
+        from elevenlabs import VoiceSettings
+
+        with profiler.secao("tts"):
+            client = get_elevenlabs_client(api_key)
+            stream = client.text_to_speech.convert(
+                text=text,
+                voice_id=voice_id,
+                model_id="eleven_multilingual_v2",
+                output_format="mp3_22050_32",
+                voice_settings=VoiceSettings(
+                    stability=0.5,
+                    similarity_boost=0.75,
+                    style=0.0,
+                    use_speaker_boost=True
+                ),
+                request_options={"timeout_in_seconds": max(int(timeout), 1)}
+            )
+
+            limite = time.monotonic() + timeout
+            buffer = io.BytesIO()
+            for chunk in stream:
+                buffer.write(chunk)
+                if time.monotonic() > limite:
+                    raise TimeoutError(f"áudio não terminou em {timeout:g}s")
+        buffer.seek(0)
+        return buffer
+
+    except Exception as e:
+        print(f"❌ Falha com ElevenLabs: {e}")
+        return None
+
+
+@speech.route("/tts", methods=["POST"])
+def tts():
+    data = request.get_json()
+    text = data.get("text", "").strip()
+    voice_index = data.get("voice", len(VOICE_IDS) - 1)  # Padrão: última voz
+    premium = data.get("premium", False)
+
+    if not text:
+        return jsonify({"error": "Texto é obrigatório"}), 400
+
+    if not isinstance(voice_index, int) or voice_index < 0 or voice_index >= len(VOICE_IDS):
+        return jsonify({"error": "Índice de voz inválido"}), 400
+
+    voice_id = VOICE_IDS[voice_index]
+    prazo = time.monotonic() + TTS_REQUEST_BUDGET_S
+    print(f"🔊 Gerando TTS para: {text[:60]}... (voz {voice_index}) | Premium: {premium}")
+
+    if premium:
+        audio = generate_tts_with_elevenlabs(ELEVENLABS_KEY, text, voice_id, min(TTS_TIMEOUT, TTS_REQUEST_BUDGET_S))
+        if audio:
+            print("✅ Áudio gerado com ElevenLabs")
+            return send_file(audio, mimetype="audio/mp3")
+
+        print("⚠️ Falha com ElevenLabs, usando Google TTS como fallback...")
+
+    try:
+        restante = prazo - time.monotonic()
+        if restante < 1:
+            raise TimeoutError(f"orçamento de {TTS_REQUEST_BUDGET_S:g}s do /tts esgotado")
+        audio = executar_no_loop_tts(generate_tts_google(text), min(TTS_TIMEOUT, restante))
+        return send_file(audio, mimetype="audio/mp3")
+    except Exception as e:
+        print(f"❌ Falha total: {e}")
+        return jsonify({"error": "Erro ao gerar áudio com todos os serviços"}), 504 if isinstance(e, TimeoutError) else 500
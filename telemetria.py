@@ -0,0 +1,254 @@
+"""
+Telemetria das requisições: middleware before/after_request e endpoint Prometheus
+USO: import telemetria
+     telemetria.init_app(app)   # registra o middleware e GET /metrics
+
+Para cada rota (método + regra do Flask) mantém um histograma de latência, contagem por status,
+bytes recebidos/enviados e o número de requisições em andamento. Também marca a atividade da API
+para o PingManager (no lugar das chamadas manuais em cada rota), exceto nas rotas de monitoramento.
+
+/metrics e /metrics/db expõem o tráfego por rota e detalhes internos do pool: só respondem com
+METRICS_TOKEN configurado e o header "Authorization: Bearer <METRICS_TOKEN>" (o mesmo que o
+Prometheus envia com `authorization: {credentials: ...}`). Sem o token as rotas respondem 404.
+"""
+import hmac
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Blueprint, Response, abort, g, request
+
+from ping_manager import PingManager
+
+# Limites dos buckets (segundos e bytes), no formato de histograma do Prometheus
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+# Rotas que não contam como atividade (health checks e scrapers não mantêm a API "quente")
+ROTAS_SEM_ATIVIDADE = ("/ping", "/metrics")
+TELEMETRIA_ENABLED = os.getenv("TELEMETRIA_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+telemetria = Blueprint("telemetria", __name__)
+
+
+class _Histograma:
+    __slots__ = ("limites", "contagens", "soma", "total")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+    def acumulado(self):
+        """Pares (le, contagem acumulada), como o Prometheus espera"""
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield limite, acumulado
+        yield "+Inf", self.total
+
+
+class _MetricasRequisicoes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencia = {}  # (método, rota) -> _Histograma
+        self.tamanho_resposta = {}  # (método, rota) -> _Histograma
+        self.status = {}  # (método, rota, status) -> contagem
+        self.bytes_recebidos = {}  # (método, rota) -> bytes
+        self.em_andamento = 0
+        self.iniciado_em = time.time()
+
+    def registrar(self, chave, status, duracao, recebidos, enviados):
+        with self.lock:
+            histograma = self.latencia.get(chave)
+            if histograma is None:
+                histograma = self.latencia[chave] = _Histograma(BUCKETS_LATENCIA)
+                self.tamanho_resposta[chave] = _Histograma(BUCKETS_TAMANHO)
+            histograma.observar(duracao)
+            if enviados is not None:
+                self.tamanho_resposta[chave].observar(enviados)
+            self.bytes_recebidos[chave] = self.bytes_recebidos.get(chave, 0) + recebidos
+            chave_status = chave + (status,)
+            self.status[chave_status] = self.status.get(chave_status, 0) + 1
+
+
+_metricas = _MetricasRequisicoes()
+
+
+def _rota():
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def _antes():
+    g.telemetria_inicio = time.perf_counter()
+    g.telemetria_registrada = False
+    with _metricas.lock:
+        _metricas.em_andamento += 1
+
+
+def _depois(response):
+    inicio = g.get("telemetria_inicio")
+    if inicio is None:
+        return response
+    rota = _rota()
+    chave = (request.method, rota)
+    status = response.status_code
+    recebidos = request.content_length or 0
+    if response.is_streamed:
+        # O corpo ainda nem começou a ser enviado: a latência só fecha quando o servidor fecha a resposta.
+        # O tamanho não é conhecido
+        response.call_on_close(
+            lambda: _metricas.registrar(chave, status, time.perf_counter() - inicio, recebidos, None)
+        )
+    else:
+        _metricas.registrar(
+            chave, status, time.perf_counter() - inicio, recebidos, response.calculate_content_length()
+        )
+    g.telemetria_registrada = True
+
+    if response.status_code < 500 and request.url_rule is not None and not rota.startswith(ROTAS_SEM_ATIVIDADE):
+        PingManager.update_last_activity(em_segundo_plano=True)
+    return response
+
+
+def _finalizar(exc):
+    inicio = g.get("telemetria_inicio")
+    if inicio is None:
+        return
+    with _metricas.lock:
+        _metricas.em_andamento -= 1
+    # Exceção não tratada: o after_request não roda, então registra aqui como 500
+    if not g.get("telemetria_registrada"):
+        _metricas.registrar(
+            (request.method, _rota()), 500, time.perf_counter() - inicio, request.content_length or 0, None
+        )
+
+
+def init_app(app):
+    """Registra o middleware de telemetria e o endpoint /metrics no app"""
+    if TELEMETRIA_ENABLED:
+        app.before_request(_antes)
+        app.after_request(_depois)
+        app.teardown_request(_finalizar)
+    app.register_blueprint(telemetria)
+
+
+def _rotulos(**rotulos):
+    partes = []
+    for nome, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nome}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _metricas_requisicoes(linhas):
+    with _metricas.lock:
+        latencia = {chave: (list(h.acumulado()), h.soma, h.total) for chave, h in _metricas.latencia.items()}
+        tamanho = {chave: (list(h.acumulado()), h.soma, h.total) for chave, h in _metricas.tamanho_resposta.items()}
+        status = dict(_metricas.status)
+        recebidos = dict(_metricas.bytes_recebidos)
+        em_andamento = _metricas.em_andamento
+
+    for nome, descricao, dados in (
+        ("lingobot_request_duration_seconds", "Latência das requisições por rota", latencia),
+        ("lingobot_response_size_bytes", "Tamanho das respostas por rota", tamanho)
+    ):
+        linhas.append(f"# HELP {nome} {descricao}")
+        linhas.append(f"# TYPE {nome} histogram")
+        for (metodo, rota), (buckets, soma, total) in sorted(dados.items()):
+            for limite, contagem in buckets:
+                linhas.append(f"{nome}_bucket{_rotulos(method=metodo, route=rota, le=limite)} {contagem}")
+            linhas.append(f"{nome}_sum{_rotulos(method=metodo, route=rota)} {soma}")
+            linhas.append(f"{nome}_count{_rotulos(method=metodo, route=rota)} {total}")
+
+    linhas.append("# HELP lingobot_requests_total Requisições por rota e status")
+    linhas.append("# TYPE lingobot_requests_total counter")
+    for (metodo, rota, codigo), contagem in sorted(status.items()):
+        linhas.append(f"lingobot_requests_total{_rotulos(method=metodo, route=rota, status=codigo)} {contagem}")
+
+    linhas.append("# HELP lingobot_request_received_bytes_total Bytes recebidos no corpo das requisições")
+    linhas.append("# TYPE lingobot_request_received_bytes_total counter")
+    for (metodo, rota), total in sorted(recebidos.items()):
+        linhas.append(f"lingobot_request_received_bytes_total{_rotulos(method=metodo, route=rota)} {total}")
+
+    linhas.append("# HELP lingobot_requests_in_flight Requisições em andamento neste processo")
+    linhas.append("# TYPE lingobot_requests_in_flight gauge")
+    linhas.append(f"lingobot_requests_in_flight {em_andamento}")
+
+
+def _metricas_simples(linhas, prefixo, dados, contadores=()):
+    """
+    Exporta os valores numéricos de um dict de status (pool, cache) como gauges/counters.
+    `contadores` é a tupla CONTADORES do módulo; counters recebem o sufixo _total.
+    """
+    for chave, valor in dados.items():
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            continue
+        if chave in contadores:
+            nome, tipo = f"{prefixo}_{chave}_total", "counter"
+        else:
+            nome, tipo = f"{prefixo}_{chave}", "gauge"
+        linhas.append(f"# TYPE {nome} {tipo}")
+        linhas.append(f"{nome} {valor}")
+
+
+def exigir_token_metricas(func):
+    """Protege uma rota de métricas com METRICS_TOKEN (404 se não configurado, 401 se o token não confere)"""
+    @wraps(func)
+    def protegida(*args, **kwargs):
+        if not METRICS_TOKEN:
+            abort(404)
+        autorizacao = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(autorizacao.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return Response("Token de métricas inválido\n", status=401, mimetype="text/plain")
+        return func(*args, **kwargs)
+    return protegida
+
+
+@telemetria.route("/metrics", methods=["GET"])
+@exigir_token_metricas
+def metrics():
+    """Métricas no formato texto do Prometheus (requisições, pool do banco, cache de usuários, ping)"""
+    import ai_routes
+    import background
+    import compression
+    import db_pool
+    import email_check
+    import precheck
+    import translation
+    import user_cache
+
+    linhas = []
+    _metricas_requisicoes(linhas)
+    _metricas_simples(linhas, "lingobot_db_pool", db_pool.metricas(), db_pool.CONTADORES)
+    _metricas_simples(linhas, "lingobot_user_cache", user_cache.user_cache.stats(), user_cache.CONTADORES)
+    _metricas_simples(linhas, "lingobot_email_validation", email_check.stats(), email_check.CONTADORES)
+    _metricas_simples(linhas, "lingobot_background", background.stats(), background.CONTADORES)
+    linhas.append("# HELP lingobot_ai_provider_failures_total Falhas por provedor de IA")
+    linhas.append("# TYPE lingobot_ai_provider_failures_total counter")
+    for provedor, total in sorted(ai_routes.falhas_provedores().items()):
+        linhas.append(f"lingobot_ai_provider_failures_total{_rotulos(provider=provedor)} {total}")
+    _metricas_simples(linhas, "lingobot_compression", compression.stats(), compression.CONTADORES)
+    _metricas_simples(linhas, "lingobot_precheck", precheck.stats(), precheck.CONTADORES)
+    _metricas_simples(linhas, "lingobot_translation", translation.stats(), translation.CONTADORES)
+
+    estado = PingManager.get_ping_state_info()
+    linhas.append("# TYPE lingobot_api_cold gauge")
+    linhas.append(f"lingobot_api_cold {int(estado['is_api_cold'])}")
+    linhas.append("# TYPE lingobot_ping_waiting_clients gauge")
+    linhas.append(f"lingobot_ping_waiting_clients {estado['waiting_clients_count']}")
+    _metricas_simples(linhas, "lingobot_ping_long_poll", estado["long_poll"], contadores=("released", "timed_out", "rejected"))
+
+    linhas.append("# TYPE lingobot_process_uptime_seconds gauge")
+    linhas.append(f"lingobot_process_uptime_seconds {round(time.time() - _metricas.iniciado_em, 1)}")
+    return Response("\n".join(linhas) + "\n", mimetype="text/plain; version=0.0.4")
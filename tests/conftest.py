@@ -0,0 +1,64 @@
+"""
+Fixtures dos testes: o app de verdade (main.app) no modo SQLite local, num banco temporário
+USO: python -m pytest -q
+
+Tarefas em segundo plano rodam de forma síncrona (BACKGROUND_ENABLED=0) e o cache de usuários
+fica em memória; cada teste começa com as tabelas vazias.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_PASTA = tempfile.mkdtemp(prefix="lingobot_testes_")
+
+os.environ.update({
+    "DATABASE_MODE": "sqlite",
+    "SQLITE_PATH": os.path.join(_PASTA, "lingobot.db"),
+    "DB_AUTO_MIGRATE": "1",
+    "JWT_SECRET_KEY": "testes-lingobot-" + "x" * 32,
+    "EMAIL_VALIDATION_MODE": "syntax",
+    "BACKGROUND_ENABLED": "0",
+    "BACKGROUND_QUEUE_PATH": os.path.join(_PASTA, "background.db"),
+    "USER_CACHE_BACKEND": "memory",
+    "PING_STATE_BACKEND": "memory",
+    "DAILY_RESET_ENABLED": "0",
+    "TELEMETRIA_ENABLED": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app as _app  # noqa: E402
+from database import db  # noqa: E402
+from user_cache import user_cache  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with _app.app_context():
+        yield _app
+        db.session.remove()
+        with db.engine.begin() as conn:
+            for tabela in reversed(db.metadata.sorted_tables):
+                conn.execute(tabela.delete())
+    user_cache.limpar()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def criar_usuario(client):
+    """Cadastra pela rota POST /usuarios e retorna o Usuario"""
+    from database import Usuario
+
+    def criar(email="ana@example.com", nome="Ana", **extras):
+        resposta = client.post("/usuarios", json={
+            "nome": nome, "sobrenome": "Silva", "email": email, "password": "segredo123", **extras
+        })
+        assert resposta.status_code == 201, resposta.get_json()
+        return Usuario.query.filter_by(email=email).one()
+
+    return criar
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+import background
+import email_check
+from database import Usuario, db
+
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch):
+    fila = background.FilaDuravel(str(tmp_path / "fila.db"))
+    monkeypatch.setattr(background, "_fila", fila)
+    return fila
+
+
+def test_tarefa_e_reservada_uma_vez_so(fila):
+    id_tarefa = fila.inserir("teste", "{}", chave="teste:1")
+    assert fila.inserir("teste", "{}", chave="teste:1") is None
+
+    assert fila.reservar(id_tarefa=id_tarefa) == [(id_tarefa, "teste", "{}", 1)]
+    assert fila.reservar(id_tarefa=id_tarefa) == []
+    assert fila.reservar(limite=10) == []
+
+
+def test_reserva_concorrente_entre_processos(fila):
+    ids = {fila.inserir("teste", "{}") for _ in range(200)}
+    # Outra instância no mesmo arquivo faz o papel de outro worker
+    filas = [fila, background.FilaDuravel(fila.caminho)]
+    reservadas = [[] for _ in range(4)]
+
+    def reservar(indice):
+        while True:
+            lote = filas[indice % 2].reservar(limite=7)
+            if not lote:
+                return
+            reservadas[indice].extend(id_ for id_, *_ in lote)
+
+    threads = [threading.Thread(target=reservar, args=(indice,)) for indice in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    todas = [id_ for lote in reservadas for id_ in lote]
+    assert sorted(todas) == sorted(ids)
+
+
+def test_falha_reagenda_com_backoff_ate_desistir(fila, monkeypatch):
+    chamadas = []
+
+    def falhar(**payload):
+        chamadas.append(payload)
+        raise RuntimeError("provedor fora do ar")
+
+    monkeypatch.setitem(background.TAREFAS, "falhar", falhar)
+    monkeypatch.setattr(background, "BACKGROUND_MAX_ATTEMPTS", 2)
+    id_tarefa = fila.inserir("falhar", '{"x": 1}')
+
+    for tentativa in (1, 2):
+        [(id_, nome, payload, tentativas)] = fila.reservar(id_tarefa=id_tarefa)
+        assert tentativas == tentativa
+        background._rodar_duravel(id_, nome, payload, tentativas)
+        if tentativa == 1:
+            assert fila.contagens() == {"pending": 1}
+            # Backoff: ainda não está disponível; adianta o relógio da tarefa
+            assert fila.reservar(limite=10) == []
+            with fila._conexao() as conn:
+                conn.execute("UPDATE tarefa SET disponivel_em = 0 WHERE id = ?", (id_tarefa,))
+
+    assert chamadas == [{"x": 1}, {"x": 1}]
+    assert fila.contagens() == {"failed": 1}
+    assert fila.reservar(limite=10) == []
+
+
+def test_lease_expirado_volta_para_a_fila(fila, monkeypatch):
+    monkeypatch.setattr(background, "BACKGROUND_LEASE_S", -1)
+    id_tarefa = fila.inserir("teste", "{}")
+    assert fila.reservar(limite=10)[0][3] == 1
+    # O processo que reservou morreu sem concluir: outro pega de novo
+    assert fila.reservar(limite=10) == [(id_tarefa, "teste", "{}", 2)]
+
+
+def test_cadastro_sobrevive_a_fila_indisponivel(client, monkeypatch):
+    monkeypatch.setattr(email_check, "EMAIL_VALIDATION_MODE", "cached")
+
+    def fila_indisponivel(*args, **kwargs):
+        raise OSError("database is locked")
+
+    monkeypatch.setattr(background, "enfileirar", fila_indisponivel)
+    resposta = client.post("/usuarios", json={
+        "nome": "Ana", "sobrenome": "Silva", "email": "ana@dominio-novo.example", "password": "segredo123"
+    })
+    assert resposta.status_code == 201
+    usuario = Usuario.query.filter_by(email="ana@dominio-novo.example").one()
+    assert usuario.email_status == "pending"
+
+    # A varredura reenfileira quando a fila volta (aqui as tarefas rodam na hora: BACKGROUND_ENABLED=0)
+    monkeypatch.undo()
+    monkeypatch.setattr(email_check, "verificar_entregabilidade", lambda email: False)
+    email_check._reconciliar_verificacoes()
+
+    db.session.expire_all()
+    assert db.session.get(Usuario, usuario.id).email_status == "undeliverable"
+    assert Usuario.verificacoes_email_pendentes() == []
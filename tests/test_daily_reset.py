@@ -0,0 +1,45 @@
+import json
+
+import daily_reset
+from database import TarefaAgendada, Usuario, UsuarioRevisao, db
+
+
+def _missoes(client, user_id):
+    return client.get(f"/usuarios/{user_id}/missoes").get_json()
+
+
+def test_reset_em_lotes_preserva_a_sequencia_de_quem_completou(client, criar_usuario):
+    ativo = criar_usuario()
+    inativo = criar_usuario(email="bia@example.com", nome="Bia")
+    for indice in range(3):
+        criar_usuario(email=f"extra{indice}@example.com")
+    ativo.dailyMissions = json.dumps(dict(json.loads(ativo.dailyMissions), writing=True, chestWasOpen1=True, strikes=4))
+    inativo.dailyMissions = json.dumps(dict(json.loads(inativo.dailyMissions), strikes=3))
+    db.session.commit()
+    ativo_id, inativo_id, revisao_ativo = ativo.id, inativo.id, ativo.revision
+
+    # Passa pelo cache antes do reset: a leitura seguinte não pode devolver o estado de ontem
+    assert _missoes(client, ativo_id)["dailyMissions"]["writing"] is True
+
+    resultado = daily_reset.resetar_missoes_diarias(tamanho_lote=2)
+    assert resultado["usuarios"] == 5
+    assert resultado["lotes"] == 3
+    db.session.remove()  # o reset roda fora das requisições; a sessão do teste ainda tinha as linhas antigas
+
+    missoes = _missoes(client, ativo_id)["dailyMissions"]
+    assert missoes["writing"] is False and missoes["chestWasOpen1"] is False
+    assert missoes["strikes"] == 4
+    assert missoes["refreshTimeAt"] == resultado["proximo_refresh_ms"]
+    assert missoes["rewardPerChest"] == 5
+    assert _missoes(client, inativo_id)["dailyMissions"]["strikes"] == 0
+
+    db.session.expire_all()
+    assert db.session.get(Usuario, ativo_id).revision == revisao_ativo + 1
+    ultima = UsuarioRevisao.query.filter_by(usuario_id=ativo_id, revision=revisao_ativo + 1).one()
+    assert ultima.campos == "dailyMissions"
+
+
+def test_reset_reservado_uma_vez_por_dia(app):
+    assert TarefaAgendada.reservar(daily_reset.NOME_TAREFA, "2026-10-19") is True
+    assert TarefaAgendada.reservar(daily_reset.NOME_TAREFA, "2026-10-19") is False
+    assert TarefaAgendada.reservar(daily_reset.NOME_TAREFA, "2026-10-20") is True
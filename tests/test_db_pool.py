@@ -0,0 +1,30 @@
+from sqlalchemy import create_engine, text
+
+import db_pool
+
+
+def _overflow_checkouts():
+    return db_pool.metricas()["overflow_checkouts"]
+
+
+def test_so_conta_checkouts_que_abriram_conexao_de_overflow(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_pool, "_engine", None)
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=db_pool.InstrumentedQueuePool, pool_size=1, max_overflow=1
+    )
+    db_pool.instrumentar(engine)
+    antes = _overflow_checkouts()
+
+    primeira = engine.connect()
+    segunda = engine.connect()  # passa de pool_size: overflow
+    segunda.execute(text("SELECT 1"))
+    assert _overflow_checkouts() == antes + 1
+
+    # A de overflow volta para a fila (a outra ainda está em uso) e vira conexão do pool
+    segunda.close()
+    primeira.close()
+    for _ in range(3):
+        with engine.connect() as conexao:
+            conexao.execute(text("SELECT 1"))
+    assert _overflow_checkouts() == antes + 1
+    engine.dispose()
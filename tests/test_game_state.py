@@ -0,0 +1,69 @@
+import json
+
+from database import Usuario, UsuarioRevisao, db
+
+
+def _operacoes(client, user_id, operacoes):
+    return client.post(f"/usuarios/{user_id}/operacoes", json={"operations": operacoes})
+
+
+def test_lote_aplica_tudo_numa_revisao(client, criar_usuario):
+    usuario = criar_usuario()
+    resposta = _operacoes(client, usuario.id, [
+        {"op": "gems", "delta": -4},
+        {"op": "battery", "delta": -3},
+        {"op": "add_item", "itemName": "OG Ticket", "quant": 2},
+        {"op": "add_item", "itemName": "Poção", "quant": 1},
+        {"op": "complete_mission", "mission": "writing"},
+        {"op": "add_exp", "amount": 2500},
+    ])
+    assert resposta.status_code == 200
+    estado = resposta.get_json()["usuario"]
+    assert "password" not in estado
+    assert estado["gemas"] == 6
+    assert estado["battery"] == 7
+    assert estado["LingoEXP"] == 2500
+    assert estado["Level"] == 3
+    assert estado["revision"] == 1
+
+    itens = {item["itemName"]: item for item in json.loads(estado["items"])}
+    assert itens["OG Ticket"]["quant"] == 3
+    assert itens["Poção"] == {"itemName": "Poção", "quant": 1}
+    assert json.loads(estado["dailyMissions"])["writing"] is True
+
+    revisoes = UsuarioRevisao.query.filter_by(usuario_id=usuario.id).all()
+    assert [(linha.revision, linha.campos) for linha in revisoes] == [
+        (1, "Level,LingoEXP,battery,dailyMissions,gemas,items")
+    ]
+
+
+def test_level_nao_desce(client, criar_usuario):
+    usuario = criar_usuario()
+    client.put(f"/usuarios/{usuario.id}", json={"Level": 5})
+    estado = _operacoes(client, usuario.id, [{"op": "add_exp", "amount": 1200}]).get_json()["usuario"]
+    assert (estado["LingoEXP"], estado["Level"]) == (1200, 5)
+
+
+def test_erro_no_meio_do_lote_desfaz_tudo(client, criar_usuario):
+    usuario = criar_usuario()
+    resposta = _operacoes(client, usuario.id, [
+        {"op": "add_item", "itemName": "OG Ticket", "quant": 1},
+        {"op": "add_exp", "amount": 100},
+        {"op": "gems", "delta": -100},
+    ])
+    assert resposta.status_code == 400
+    assert resposta.get_json() == {"erro": "Gemas insuficientes"}
+
+    db.session.expire_all()
+    usuario = db.session.get(Usuario, usuario.id)
+    assert usuario.LingoEXP == 0
+    assert usuario.revision == 0
+    assert json.loads(usuario.items)[0]["quant"] == 1
+
+
+def test_lote_mal_formado_e_rejeitado(client, criar_usuario):
+    usuario = criar_usuario()
+    for corpo in ([], {"operations": {}}, {"operations": []}, {"operations": [{"op": "hack"}]},
+                  {"operations": [{"op": "gems", "delta": "5"}]}):
+        assert client.post(f"/usuarios/{usuario.id}/operacoes", json=corpo).status_code == 400
+    assert client.post("/usuarios/999/operacoes", json={"operations": [{"op": "gems", "delta": 1}]}).status_code == 404
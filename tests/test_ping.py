@@ -0,0 +1,40 @@
+import threading
+import time
+
+import ping_manager
+from ping_manager import PingManager
+
+
+def _iniciar_warming():
+    PingManager.force_reset()
+    assert PingManager._try_start_warming("quem-aquece")
+
+
+def test_long_poll_libera_quando_o_warming_termina(app):
+    _iniciar_warming()
+    resultados = []
+    espera = threading.Thread(target=lambda: resultados.append(PingManager.wait_until_warm(5)))
+    espera.start()
+    time.sleep(0.1)
+
+    inicio = time.monotonic()
+    PingManager._set_warming_state("quem-aquece", False)
+    espera.join(2)
+    assert resultados == [True]
+    assert time.monotonic() - inicio < 0.5
+
+
+def test_long_poll_recusa_acima_do_limite(app, monkeypatch):
+    monkeypatch.setattr(ping_manager, "PING_LONGPOLL_MAX_WAITERS", 1)
+    _iniciar_warming()
+    espera = threading.Thread(target=PingManager.wait_until_warm, args=(5,))
+    espera.start()
+    time.sleep(0.1)
+
+    recusados = PingManager.get_ping_state_info()["long_poll"]["rejected"]
+    assert PingManager.wait_until_warm(5) is None
+    assert PingManager.get_ping_state_info()["long_poll"]["rejected"] == recusados + 1
+
+    PingManager._set_warming_state("quem-aquece", False)
+    espera.join(2)
+    assert PingManager.get_ping_state_info()["long_poll"]["waiting"] == 0
@@ -0,0 +1,64 @@
+from database import Usuario, UsuarioRevisao, db
+
+
+def _revisao_no_banco(user_id):
+    db.session.expire_all()
+    return db.session.get(Usuario, user_id).revision
+
+
+def test_etag_responde_304_ate_o_usuario_mudar(client, criar_usuario):
+    usuario = criar_usuario()
+    resposta = client.get(f"/usuarios/{usuario.id}")
+    assert resposta.status_code == 200
+    etag = resposta.headers["ETag"]
+
+    assert client.get(f"/usuarios/{usuario.id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/usuarios/{usuario.id}", json={"gemas": 50})
+    resposta = client.get(f"/usuarios/{usuario.id}", headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.headers["ETag"] != etag
+    assert resposta.get_json()["gemas"] == 50
+
+
+def test_sync_envia_so_os_campos_alterados(client, criar_usuario):
+    usuario = criar_usuario()
+
+    client.put(f"/usuarios/{usuario.id}", json={"gemas": 20})
+
+    completo = client.get(f"/usuarios/{usuario.id}/sync").get_json()
+    assert completo["full"] is True
+    assert completo["changes"]["gemas"] == 20
+    assert "password" not in completo["changes"] and "OTP_code" not in completo["changes"]
+    revisao = completo["revision"]
+    assert client.get(f"/usuarios/{usuario.id}/sync?revision={revisao}").status_code == 304
+
+    client.put(f"/usuarios/{usuario.id}", json={"gemas": 50})
+    client.put(f"/usuarios/{usuario.id}", json={"tokens": 7})
+    delta = client.get(f"/usuarios/{usuario.id}/sync?revision={revisao}").get_json()
+    assert delta == {"revision": revisao + 2, "full": False, "changes": {"gemas": 50, "tokens": 7}}
+
+
+def test_revisao_nao_volta_com_valor_do_cliente(client, criar_usuario):
+    usuario = criar_usuario()
+    for gemas in (11, 12, 13):
+        client.put(f"/usuarios/{usuario.id}", json={"gemas": gemas})
+    assert _revisao_no_banco(usuario.id) == 3
+
+    # Claims antigos devolvidos pelo cliente: só a revisão difere
+    assert client.put(f"/usuarios/{usuario.id}", json={"revision": 1, "gemas": 13}).status_code == 200
+    assert _revisao_no_banco(usuario.id) == 3
+
+    # Mesmo atribuída direto no ORM, a revisão não é gravada
+    usuario = db.session.get(Usuario, usuario.id)
+    usuario.revision = 1
+    db.session.commit()
+    assert _revisao_no_banco(usuario.id) == 3
+
+    usuario = db.session.get(Usuario, usuario.id)
+    usuario.revision = 1
+    usuario.gemas = 20
+    db.session.commit()
+    assert _revisao_no_banco(usuario.id) == 4
+    revisoes = [linha.revision for linha in UsuarioRevisao.query.filter_by(usuario_id=usuario.id)]
+    assert sorted(revisoes) == [1, 2, 3, 4]
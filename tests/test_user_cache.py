@@ -0,0 +1,30 @@
+from database import Usuario, db
+from user_cache import user_cache
+
+
+def test_cache_nao_sobrescreve_instancia_alterada_na_sessao(app, criar_usuario):
+    user_id = criar_usuario().id
+    db.session.remove()
+    assert Usuario.get_user_by_id(user_id).gemas == 10  # guarda no cache
+
+    usuario = db.session.get(Usuario, user_id)
+    usuario.gemas = 99
+    # Ainda na mesma requisição/sessão, uma leitura que acerta o cache
+    assert Usuario.get_user_by_id(user_id) is usuario
+    assert Usuario.get_user_by_email("ana@example.com").gemas == 99
+
+    db.session.commit()
+    db.session.remove()
+    assert Usuario.get_user_by_id(user_id).gemas == 99
+
+
+def test_leitura_anterior_a_invalidacao_nao_volta_para_o_cache(app, criar_usuario):
+    usuario = criar_usuario()
+    marca = user_cache.marca()
+    dados_antigos = usuario.colunas()
+
+    usuario.gemas = 42
+    db.session.commit()  # after_commit invalida o cache
+
+    assert user_cache.guardar(dados_antigos, marca) is False
+    assert Usuario.obter_dados(usuario.id)["gemas"] == 42
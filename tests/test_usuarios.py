@@ -0,0 +1,108 @@
+import json
+
+from flask_jwt_extended import decode_token
+
+from database import Usuario, db
+
+CLAIMS_DO_JWT = ("sub", "iat", "nbf", "jti", "exp", "type", "fresh")
+
+
+def _claims_do_login(client, email="ana@example.com"):
+    resposta = client.post("/login", json={"email": email, "password": "segredo123"})
+    assert resposta.status_code == 200
+    claims = decode_token(resposta.get_json()["access_token"])
+    return {campo: valor for campo, valor in claims.items() if campo not in CLAIMS_DO_JWT}
+
+
+def test_claims_do_jwt_voltam_sem_corromper_campos_do_servidor(client, criar_usuario):
+    usuario = criar_usuario()
+    conquistas = [indice in (0, 1, 2, 3, 4, 54) for indice in range(55)]
+    assert client.put(f"/usuarios/{usuario.id}", json={"achievements": {"achievements": conquistas}}).status_code == 200
+
+    claims = _claims_do_login(client)
+    assert claims["achievements_bits"] == format((1 << 54) | 0x1f, "x")
+    revisao = claims["revision"]
+
+    # O cliente devolve os claims inteiros (inclusive o hexadecimal e a revisão)
+    claims["battery"] = 7
+    resposta = client.post("/generate-new-jwt", json=claims)
+    assert resposta.status_code == 200
+    novos_claims = decode_token(resposta.get_json()["access_token"])
+    assert novos_claims["achievements_bits"] == claims["achievements_bits"]
+    assert novos_claims["revision"] == revisao + 1
+    assert client.put(f"/usuarios/{usuario.id}", json=claims).status_code == 200
+
+    db.session.expire_all()
+    usuario = db.session.get(Usuario, usuario.id)
+    assert usuario.achievements_bits == (1 << 54) | 0x1f
+    assert usuario.battery == 7
+    assert usuario.revision > revisao
+
+    bits = client.get(f"/usuarios/{usuario.id}/achievements?format=bits")
+    assert bits.status_code == 200
+    assert bits.get_json() == {"achievements_bits": claims["achievements_bits"], "total": 6}
+    assert client.get(f"/usuarios/{usuario.id}/sync").status_code == 200
+
+
+def test_campos_do_servidor_nao_sao_gravados_pelo_cliente(client, criar_usuario):
+    usuario = criar_usuario()
+    resposta = client.put(f"/usuarios/{usuario.id}", json={
+        "id": 999, "password": "texto-puro", "achievements_bits": "ff",
+        "referral_bonus_paid": True, "email_status": "ok", "nome": "Bia"
+    })
+    assert resposta.status_code == 200
+
+    db.session.expire_all()
+    usuario = db.session.get(Usuario, usuario.id)
+    assert usuario.nome == "Bia"
+    assert usuario.achievements_bits == 0
+    assert usuario.check_password("segredo123")
+    assert usuario.referral_bonus_paid is False
+    assert usuario.email_status is None
+    assert json.loads(usuario.achievements) == {"achievements": [False] * 55}
+
+
+def test_cadastro_com_indicacao_credita_o_bonus_uma_vez(client, criar_usuario):
+    quem_indicou = criar_usuario()
+    codigo, tokens_antes = quem_indicou.referal_code, quem_indicou.tokens or 0
+
+    indicado = criar_usuario(email="bia@example.com", nome="Bia", referal_code=codigo)
+    assert indicado.invited_by == codigo
+    assert indicado.referral_bonus_paid is True
+
+    db.session.expire_all()
+    assert db.session.get(Usuario, quem_indicou.id).tokens == tokens_antes + 100
+    assert client.get(f"/usuarios/{quem_indicou.id}/indicacoes").get_json() == {
+        "referal_code": codigo, "total_indicados": 1
+    }
+
+    # A tarefa é entregue pelo menos uma vez: repetir não credita de novo
+    assert Usuario.pagar_bonus_indicacao(indicado.id, 100) is None
+    db.session.expire_all()
+    assert db.session.get(Usuario, quem_indicou.id).tokens == tokens_antes + 100
+    assert Usuario.bonus_indicacao_pendentes() == []
+
+
+def test_cadastro_repetido_e_proprio_codigo(client, criar_usuario):
+    usuario = criar_usuario()
+    corpo = {"nome": "Ana", "sobrenome": "Silva", "email": "ana@example.com", "password": "segredo123"}
+    assert client.post("/usuarios", json=corpo).status_code == 409
+    resposta = client.post("/usuarios", json=dict(corpo, referal_code=usuario.referal_code))
+    assert resposta.status_code == 403
+    assert Usuario.query.count() == 1
+
+
+def test_varredura_paga_bonus_que_ficou_sem_tarefa(criar_usuario):
+    import routes
+
+    quem_indicou = criar_usuario()
+    tokens_antes = quem_indicou.tokens or 0
+    # Cadastro gravado, mas o processo morreu antes de enfileirar o bônus
+    db.session.add(Usuario("Bia", "Silva", "bia@example.com", "hash", invited_by=quem_indicou.referal_code))
+    db.session.commit()
+    assert len(Usuario.bonus_indicacao_pendentes()) == 1
+
+    routes._reconciliar_bonus_indicacao()
+    db.session.expire_all()
+    assert db.session.get(Usuario, quem_indicou.id).tokens == tokens_antes + 100
+    assert Usuario.bonus_indicacao_pendentes() == []
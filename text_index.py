@@ -0,0 +1,229 @@
+"""
+Índice de features dos textos (textos.json e textos_longos.json) para recomendação por perfil
+USO: flask --app main indexar-textos              # gera o .npz offline (deploy/CI)
+     import text_index
+     text_index.recomendar({"Level": 3, "reading": 2, "listening": 4}, quantidade=5)
+
+Para cada texto são calculadas, de forma vetorizada com numpy:
+- words: número de palavras
+- sentence_length: média de palavras por frase
+- lexical_rank: média do log do rank de frequência das palavras no próprio corpus
+  (1 = palavra mais frequente; quanto maior, mais vocabulário raro)
+- readability: Flesch Reading Ease, com sílabas estimadas por grupos de vogais
+
+As features também são guardadas como percentis no corpus (0 = mais fácil, 1 = mais difícil),
+e a recomendação é o vizinho mais próximo, nesse espaço, do alvo derivado de Level,
+reading e listening do usuário. O índice fica em arrays contíguos num .npz (TEXT_INDEX_PATH);
+se o arquivo não existe ou foi gerado a partir de outro conteúdo, é reconstruído em memória.
+"""
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+import content_store
+
+TEXT_INDEX_PATH = os.getenv("TEXT_INDEX_PATH", os.path.join(content_store.PASTA_CONTEUDO, "text_index.npz"))
+# Valores de Level/reading/listening a partir dos quais o alvo é o texto mais difícil do corpus
+TEXT_INDEX_LEVEL_MAX = int(os.getenv("TEXT_INDEX_LEVEL_MAX", "20"))
+TEXT_INDEX_SKILL_MAX = int(os.getenv("TEXT_INDEX_SKILL_MAX", "10"))
+
+COLECOES = ("textos", "textos_longos")
+FEATURES = ("words", "sentence_length", "lexical_rank", "readability")
+# Peso de cada feature (percentil) na distância
+PESOS = np.array([0.5, 1.0, 1.5, 1.5], dtype=np.float32)
+
+PALAVRA_REGEX = re.compile(r"[a-z]+(?:'[a-z]+)?")
+FIM_FRASE_REGEX = re.compile(r"[.!?]+(?=\s|$|['\"’”])")
+VOGAIS_REGEX = re.compile(r"[aeiouy]+")
+
+
+def _silabas(palavra):
+    """Estimativa de sílabas em inglês: grupos de vogais, descontando o 'e' mudo final"""
+    palavra = palavra.split("'")[0]
+    grupos = len(VOGAIS_REGEX.findall(palavra))
+    if palavra.endswith("e") and not palavra.endswith(("le", "ee")) and grupos > 1:
+        grupos -= 1
+    return max(grupos, 1)
+
+
+def _percentis(valores):
+    """Posição de cada valor no corpus, de 0 (menor) a 1 (maior); empates ficam na mesma posição"""
+    if len(valores) < 2:
+        return np.zeros(len(valores), dtype=np.float32)
+    ordenados = np.sort(valores)
+    inferiores = np.searchsorted(ordenados, valores, side="left")
+    superiores = np.searchsorted(ordenados, valores, side="right") - 1
+    return ((inferiores + superiores) / 2 / (len(valores) - 1)).astype(np.float32)
+
+
+def _assinatura():
+    """Identifica o conteúdo de origem (ETags das coleções) para detectar índice desatualizado"""
+    return ":".join(content_store.colecao(nome).etag for nome in COLECOES)
+
+
+class IndiceTextos:
+    """Arrays do índice: uma linha por texto, na ordem (coleção, dificuldade, índice)"""
+
+    __slots__ = ("features", "percentis", "colecao", "dificuldade", "indice", "assinatura")
+
+    def __init__(self, features, percentis, colecao, dificuldade, indice, assinatura):
+        self.features = features
+        self.percentis = percentis
+        self.colecao = colecao
+        self.dificuldade = dificuldade
+        self.indice = indice
+        self.assinatura = assinatura
+
+    def __len__(self):
+        return len(self.indice)
+
+    def salvar(self, caminho=TEXT_INDEX_PATH):
+        np.savez_compressed(
+            caminho, features=self.features, percentis=self.percentis, colecao=self.colecao,
+            dificuldade=self.dificuldade, indice=self.indice, assinatura=np.array(self.assinatura)
+        )
+        return caminho
+
+    @classmethod
+    def carregar(cls, caminho=TEXT_INDEX_PATH):
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            return cls(
+                arquivo["features"], arquivo["percentis"], arquivo["colecao"],
+                arquivo["dificuldade"], arquivo["indice"], str(arquivo["assinatura"])
+            )
+
+
+def construir():
+    """Calcula as features de todos os textos a partir do content_store"""
+    colecao, dificuldade, indice = [], [], []
+    ids_palavras, dono, frases = [], [], []
+    vocabulario = {}
+    for c, nome in enumerate(COLECOES):
+        for d, nome_dificuldade in enumerate(content_store.DIFICULDADES):
+            for i, texto in enumerate(content_store.colecao(nome).itens(nome_dificuldade)):
+                linha = len(indice)
+                colecao.append(c)
+                dificuldade.append(d)
+                indice.append(i)
+                normalizado = texto.lower().replace("’", "'")
+                palavras = PALAVRA_REGEX.findall(normalizado)
+                ids_palavras.extend(vocabulario.setdefault(palavra, len(vocabulario)) for palavra in palavras)
+                dono.extend([linha] * len(palavras))
+                # Texto sem pontuação final ainda conta como uma frase
+                frases.append(max(len(FIM_FRASE_REGEX.findall(normalizado)), 1))
+
+    total = len(indice)
+    ids_palavras = np.asarray(ids_palavras, dtype=np.int64)
+    dono = np.asarray(dono, dtype=np.int64)
+
+    # Rank de frequência no corpus (1 = mais frequente); empates desfeitos pela ordem de aparição
+    frequencia = np.bincount(ids_palavras, minlength=len(vocabulario))
+    rank = np.empty(len(vocabulario), dtype=np.float64)
+    rank[np.argsort(-frequencia, kind="stable")] = np.arange(1, len(vocabulario) + 1)
+    silabas_vocabulario = np.fromiter((_silabas(palavra) for palavra in vocabulario), dtype=np.float64,
+                                      count=len(vocabulario))
+
+    palavras = np.bincount(dono, minlength=total).astype(np.float64)
+    divisor = np.maximum(palavras, 1)
+    silabas = np.bincount(dono, weights=silabas_vocabulario[ids_palavras], minlength=total)
+    log_rank = np.bincount(dono, weights=np.log(rank[ids_palavras]), minlength=total) / divisor
+    media_frase = palavras / np.asarray(frases, dtype=np.float64)
+    flesch = 206.835 - 1.015 * media_frase - 84.6 * (silabas / divisor)
+
+    features = np.column_stack([palavras, media_frase, log_rank, flesch]).astype(np.float32)
+    # Percentis orientados por dificuldade: Flesch alto é fácil, então entra invertido
+    percentis = np.column_stack([
+        _percentis(palavras), _percentis(media_frase), _percentis(log_rank), _percentis(-flesch)
+    ])
+    return IndiceTextos(
+        features, np.ascontiguousarray(percentis, dtype=np.float32),
+        np.asarray(colecao, dtype=np.uint8), np.asarray(dificuldade, dtype=np.uint8),
+        np.asarray(indice, dtype=np.uint16), _assinatura()
+    )
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def indice():
+    """Índice em memória: lê o .npz na primeira chamada, ou reconstrói se estiver ausente/desatualizado"""
+    global _indice
+    if _indice is not None:
+        return _indice
+    with _lock:
+        if _indice is None:
+            carregado = None
+            if os.path.exists(TEXT_INDEX_PATH):
+                carregado = IndiceTextos.carregar(TEXT_INDEX_PATH)
+                if carregado.assinatura != _assinatura():
+                    print(f"⚠️ {TEXT_INDEX_PATH} desatualizado; reconstruindo em memória (rode `flask indexar-textos`)")
+                    carregado = None
+            _indice = carregado or construir()
+        return _indice
+
+
+def gerar(caminho=TEXT_INDEX_PATH):
+    """Reconstrói o índice, grava em `caminho` e passa a usá-lo neste processo"""
+    global _indice
+    inicio = time.perf_counter()
+    novo = construir()
+    novo.salvar(caminho)
+    with _lock:
+        _indice = novo
+    return {"textos": len(novo), "path": caminho, "duration_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+
+
+def _nivel(valor, maximo):
+    return min(max(((valor or 1) - 1) / max(maximo - 1, 1), 0.0), 1.0)
+
+
+def alvo_do_perfil(perfil):
+    """
+    Percentil alvo de cada feature a partir de Level, reading e listening do usuário:
+    vocabulário e legibilidade acompanham reading, tamanho e frases acompanham listening,
+    e o Level puxa tudo junto.
+    """
+    nivel = _nivel(perfil.get("Level"), TEXT_INDEX_LEVEL_MAX)
+    leitura = _nivel(perfil.get("reading"), TEXT_INDEX_SKILL_MAX)
+    escuta = _nivel(perfil.get("listening"), TEXT_INDEX_SKILL_MAX)
+    extensao = (nivel + escuta) / 2
+    vocabulario = (nivel + leitura) / 2
+    return np.array([extensao, extensao, vocabulario, vocabulario], dtype=np.float32)
+
+
+def recomendar(perfil, quantidade=5, colecoes=COLECOES, dificuldade=None):
+    """
+    Textos mais próximos do perfil. Retorna lista de dicts com collection, difficulty, index,
+    distance e as features do texto, do mais próximo ao mais distante.
+    """
+    atual = indice()
+    alvo = alvo_do_perfil(perfil)
+    distancias = ((atual.percentis - alvo) ** 2) @ PESOS
+
+    filtro = np.isin(atual.colecao, [COLECOES.index(nome) for nome in colecoes])
+    if dificuldade is not None:
+        filtro &= atual.dificuldade == content_store.DIFICULDADES.index(dificuldade)
+    candidatos = np.flatnonzero(filtro)
+    if not len(candidatos) or quantidade <= 0:
+        return []
+
+    quantidade = min(quantidade, len(candidatos))
+    distancias = distancias[candidatos]
+    melhores = np.argpartition(distancias, quantidade - 1)[:quantidade]
+    melhores = melhores[np.argsort(distancias[melhores], kind="stable")]
+
+    resultado = []
+    for posicao in melhores:
+        linha = candidatos[posicao]
+        resultado.append({
+            "collection": COLECOES[atual.colecao[linha]],
+            "difficulty": content_store.DIFICULDADES[atual.dificuldade[linha]],
+            "index": int(atual.indice[linha]),
+            "distance": round(float(distancias[posicao]), 4),
+            "features": {nome: round(float(valor), 2) for nome, valor in zip(FEATURES, atual.features[linha])}
+        })
+    return resultado
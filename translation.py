@@ -0,0 +1,274 @@
+"""
+Tradução em lote com cache persistente (tabela traducao) e backend plugável
+USO: POST /traducao {"textos": ["hello", "How are you?", "hello"], "from": "en", "to": "pt"}
+     from translation import traduzir_lote
+     traduzir_lote(["hello"], "en", "pt")   # {"traducoes": [...], "cache": {...}, ...}
+
+O lote é normalizado (espaços) e deduplicado; palavras soltas usam a chave em minúsculas
+(nível "palavra") e o resto a frase inteira (nível "frase"). As chaves são buscadas no cache
+numa única consulta e só as faltantes vão para o backend, em paralelo. As respostas voltam na
+ordem de entrada. Traduções que falharam voltam como null e não são gravadas.
+
+TRANSLATION_BACKEND escolhe o backend:
+- "translate" (padrão): biblioteca translate (provedor em TRANSLATION_PROVIDER: mymemory, libre, deepl...).
+  O MyMemory devolve avisos de cota/erro como se fossem tradução ("MYMEMORY WARNING: ..."); esses
+  textos contam como falha e nunca vão para o cache. Chamadas que estouram TRANSLATION_TIMEOUT_S
+  voltam como null, mas a thread continua presa até o provedor responder; por isso no máximo
+  TRANSLATION_MAX_PENDING chamadas ficam em andamento e o excedente falha na hora.
+- "stub": local, devolve "[<to>] <texto>" após TRANSLATION_STUB_LATENCY_MS (testes e benchmarks)
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import requests
+from flask import Blueprint, jsonify, request
+
+from database import Traducao
+
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "translate").lower()
+TRANSLATION_PROVIDER = os.getenv("TRANSLATION_PROVIDER", "mymemory")
+TRANSLATION_API_KEY = os.getenv("TRANSLATION_API_KEY")
+TRANSLATION_TIMEOUT_S = float(os.getenv("TRANSLATION_TIMEOUT_S", "10"))
+TRANSLATION_MAX_WORKERS = int(os.getenv("TRANSLATION_MAX_WORKERS", "4"))
+TRANSLATION_MAX_PENDING = int(os.getenv("TRANSLATION_MAX_PENDING", str(TRANSLATION_MAX_WORKERS * 4)))
+TRANSLATION_STUB_LATENCY_MS = float(os.getenv("TRANSLATION_STUB_LATENCY_MS", "0"))
+TRANSLATION_MAX_BATCH = int(os.getenv("TRANSLATION_MAX_BATCH", "100"))
+TRANSLATION_MAX_CHARS = int(os.getenv("TRANSLATION_MAX_CHARS", "1000"))
+
+IDIOMA_REGEX = re.compile(r"^[a-z]{2,3}(-[A-Za-z]{2,4})?$")
+# Mensagens que o provedor devolve no lugar da tradução (com status 200)
+AVISOS_PROVEDOR = (
+    "MYMEMORY WARNING", "QUERY LENGTH LIMIT EXCEEDED", "PLEASE SELECT TWO DISTINCT LANGUAGES",
+    "INVALID LANGUAGE PAIR", "INVALID SOURCE LANGUAGE", "INVALID TARGET LANGUAGE", "NO QUERY SPECIFIED"
+)
+
+translation = Blueprint("translation", __name__)
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("textos", "unicos", "cache_hits", "backend_calls", "backend_errors")
+_stats = dict.fromkeys(CONTADORES, 0)
+_stats_lock = threading.Lock()
+
+
+def _contar(**incrementos):
+    with _stats_lock:
+        for chave, valor in incrementos.items():
+            _stats[chave] += valor
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ==========================================
+# BACKENDS
+# ==========================================
+
+class StubBackend:
+    """Backend local: não traduz, só marca o idioma de destino (com latência configurável)"""
+
+    nome = "stub"
+
+    def traduzir(self, textos, origem, destino):
+        if TRANSLATION_STUB_LATENCY_MS:
+            time.sleep(TRANSLATION_STUB_LATENCY_MS / 1000)
+        return [f"[{destino}] {texto}" for texto in textos]
+
+
+class _SessaoComTimeout(requests.Session):
+    """requests.Session com timeout padrão (os provedores da biblioteca não passam timeout)"""
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", TRANSLATION_TIMEOUT_S)
+        return super().request(*args, **kwargs)
+
+
+def aviso_do_provedor(traducao):
+    """True se o "texto traduzido" é na verdade um aviso/erro do provedor"""
+    maiusculas = (traducao or "").upper()
+    return not maiusculas.strip() or any(aviso in maiusculas for aviso in AVISOS_PROVEDOR)
+
+
+class TranslateBackend:
+    """Biblioteca translate: um texto por requisição, então as faltas vão em paralelo"""
+
+    nome = "translate"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=TRANSLATION_MAX_WORKERS, thread_name_prefix="traducao")
+        # Liberada quando a chamada termina de fato (ou é cancelada ainda na fila), não no timeout
+        self._vagas = threading.BoundedSemaphore(TRANSLATION_MAX_PENDING)
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _tradutor(origem, destino):
+        # Import tardio: a biblioteca só é carregada na primeira tradução que não está no cache
+        from translate import Translator
+
+        tradutor = Translator(
+            to_lang=destino, from_lang=origem, provider=TRANSLATION_PROVIDER, secret_access_key=TRANSLATION_API_KEY
+        )
+        if hasattr(tradutor.provider, "session"):
+            tradutor.provider.session = _SessaoComTimeout()
+        return tradutor
+
+    def _submeter(self, tradutor, texto):
+        if not self._vagas.acquire(blocking=False):
+            return None
+        futuro = self._executor.submit(tradutor.translate, texto)
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        return futuro
+
+    def traduzir(self, textos, origem, destino):
+        tradutor = self._tradutor(origem, destino)
+        futuros = [self._submeter(tradutor, texto) for texto in textos]
+        wait([futuro for futuro in futuros if futuro is not None], timeout=TRANSLATION_TIMEOUT_S)
+        resultados = []
+        for futuro in futuros:
+            if futuro is None:
+                print(f"⚠️ Tradução recusada: {TRANSLATION_MAX_PENDING} chamadas ao provedor em andamento")
+                resultados.append(None)
+            elif not futuro.done():
+                futuro.cancel()
+                resultados.append(None)
+            elif futuro.exception() is not None:
+                print(f"⚠️ Falha na tradução ({TRANSLATION_PROVIDER}): {futuro.exception()}")
+                resultados.append(None)
+            elif aviso_do_provedor(futuro.result()):
+                print(f"⚠️ Aviso do provedor de tradução ({TRANSLATION_PROVIDER}): {futuro.result()[:200]}")
+                resultados.append(None)
+            else:
+                resultados.append(futuro.result())
+        return resultados
+
+
+BACKENDS = {
+    "stub": StubBackend,
+    "translate": TranslateBackend
+}
+
+
+def criar_backend(nome=TRANSLATION_BACKEND):
+    if nome not in BACKENDS:
+        raise ValueError(f"TRANSLATION_BACKEND inválido: {nome} (opções: {', '.join(BACKENDS)})")
+    return BACKENDS[nome]()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = criar_backend()
+    return _backend
+
+
+# ==========================================
+# TRADUÇÃO EM LOTE
+# ==========================================
+
+def normalizar(texto):
+    """(chave, tipo, texto normalizado): palavra solta em minúsculas, frase com espaços colapsados"""
+    normalizado = " ".join(texto.split())
+    if " " not in normalizado:
+        normalizado = normalizado.lower()
+        tipo = "palavra"
+    else:
+        tipo = "frase"
+    return hashlib.sha1(normalizado.encode("utf-8")).hexdigest(), tipo, normalizado
+
+
+def _ajustar_maiuscula(original, traducao):
+    # Palavra em minúsculas no cache: devolve com a inicial maiúscula se o original tinha
+    if traducao and original[:1].isupper():
+        return traducao[:1].upper() + traducao[1:]
+    return traducao
+
+
+def traduzir_lote(textos, origem, destino):
+    """
+    Traduz `textos` (lista de strings) de `origem` para `destino`.
+    Retorna {"traducoes": [...na ordem de entrada...], "cache": {"hits", "misses"}, "failed", "backend"}.
+    """
+    if origem == destino:
+        return {"traducoes": list(textos), "cache": {"hits": 0, "misses": 0}, "failed": 0, "backend": None}
+
+    unicos = {}  # chave -> (tipo, texto normalizado)
+    chaves = []
+    for texto in textos:
+        chave, tipo, normalizado = normalizar(texto)
+        chaves.append(chave)
+        if normalizado:
+            unicos.setdefault(chave, (tipo, normalizado))
+
+    encontradas = Traducao.buscar(origem, destino, list(unicos))
+    faltantes = [chave for chave in unicos if chave not in encontradas]
+
+    atual = backend()
+    falhas = 0
+    if faltantes:
+        traduzidas = atual.traduzir([unicos[chave][1] for chave in faltantes], origem, destino)
+        novas = []
+        for chave, traducao in zip(faltantes, traduzidas):
+            if traducao is None:
+                falhas += 1
+                continue
+            encontradas[chave] = traducao
+            tipo, normalizado = unicos[chave]
+            novas.append({
+                "origem": origem, "destino": destino, "chave": chave, "tipo": tipo,
+                "texto": normalizado, "traducao": traducao, "backend": atual.nome
+            })
+        Traducao.guardar(novas)
+
+    _contar(
+        textos=len(textos), unicos=len(unicos), cache_hits=len(unicos) - len(faltantes),
+        backend_calls=len(faltantes), backend_errors=falhas
+    )
+    traducoes = []
+    for texto, chave in zip(textos, chaves):
+        if chave in encontradas:
+            traducoes.append(_ajustar_maiuscula(texto.strip(), encontradas[chave]))
+        else:
+            # Texto vazio traduz para vazio; falha do backend volta como null
+            traducoes.append(None if chave in unicos else "")
+    return {
+        "traducoes": traducoes,
+        "cache": {"hits": len(unicos) - len(faltantes), "misses": len(faltantes)},
+        "failed": falhas,
+        "backend": atual.nome
+    }
+
+
+@translation.route("/traducao", methods=["POST"])
+def traduzir():
+    """Tradução em lote: {"textos": [...], "from": "en", "to": "pt"}; respostas na ordem de entrada"""
+    data = request.get_json(silent=True) or {}
+    textos = data.get("textos")
+    origem = data.get("from", "en")
+    destino = data.get("to")
+
+    if not isinstance(textos, list) or not all(isinstance(texto, str) for texto in textos):
+        return jsonify({"erro": "'textos' precisa ser uma lista de strings"}), 400
+    if len(textos) > TRANSLATION_MAX_BATCH:
+        return jsonify({"erro": f"Máximo de {TRANSLATION_MAX_BATCH} textos por lote"}), 400
+    if any(len(texto) > TRANSLATION_MAX_CHARS for texto in textos):
+        return jsonify({"erro": f"Cada texto pode ter no máximo {TRANSLATION_MAX_CHARS} caracteres"}), 400
+    for idioma in (origem, destino):
+        if not isinstance(idioma, str) or not IDIOMA_REGEX.match(idioma):
+            return jsonify({"erro": f"Idioma inválido: {idioma}"}), 400
+
+    resultado = traduzir_lote(textos, origem, destino)
+    if resultado["failed"] and resultado["failed"] == resultado["cache"]["misses"] and not resultado["cache"]["hits"]:
+        return jsonify({"erro": "Serviço de tradução indisponível", **resultado}), 502
+    return jsonify({"from": origem, "to": destino, **resultado})
@@ -0,0 +1,244 @@
+"""
+Cache read-through de usuários (colunas do Usuario indexadas por id, e email -> id)
+USO: from user_cache import user_cache
+
+Backends (USER_CACHE_BACKEND):
+- memory (padrão): LRU com TTL dentro do processo. Com vários processos (workers do gunicorn) cada
+  um só vê as próprias invalidações e pode servir a linha antiga de outro worker até o TTL; por isso
+  o gunicorn.conf.py usa sqlite por padrão quando há mais de um worker.
+- sqlite: arquivo local compartilhado entre os workers do mesmo host (invalidações valem para todos)
+
+Leitura com falta: marca = user_cache.marca() ANTES de ler do banco, depois guardar(dados, marca).
+Cada invalidação (e limpar()) avança uma geração; se ela mudou desde a marca, o guardar é descartado,
+senão uma leitura que começou antes de uma escrita gravaria a linha antiga depois da invalidação.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory").lower()
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))  # segundos
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "10000"))  # entradas
+USER_CACHE_PATH = os.getenv("USER_CACHE_PATH", os.path.join(tempfile.gettempdir(), "lingobot_user_cache.db"))
+
+# Chaves de stats() que só crescem (exportadas como counters em /metrics)
+CONTADORES = ("hits", "misses", "invalidations", "evictions")
+
+
+class MemoriaCacheBackend:
+    """LRU com TTL, thread-safe, restrito ao processo atual"""
+
+    compartilhado = False
+
+    def __init__(self, max_itens, ttl):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._geracao = 0
+        self.evictions = 0
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def geracao(self):
+        with self._lock:
+            return self._geracao
+
+    def set_se_geracao(self, itens, geracao):
+        """Grava os itens só se nenhuma invalidação aconteceu desde `geracao`; retorna se gravou"""
+        with self._lock:
+            if self._geracao != geracao:
+                return False
+            expira_em = time.monotonic() + self.ttl
+            for chave, valor in itens.items():
+                self._itens[chave] = (valor, expira_em)
+                self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+            self._geracao += 1
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._geracao += 1
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class SqliteCacheBackend:
+    """Cache em arquivo SQLite (WAL), compartilhado por todos os workers da máquina"""
+
+    compartilhado = True
+
+    def __init__(self, caminho, max_itens, ttl):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._local = threading.local()
+        self.evictions = 0
+        # A conexão aberta aqui (import do app) não pode ser herdada pelos workers do gunicorn (preload)
+        os.register_at_fork(after_in_child=self._descartar_conexoes)
+        conn = self._conexao()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, valor TEXT, expira_em REAL)")
+        # Geração compartilhada: avança a cada invalidação, em qualquer worker
+        conn.execute("CREATE TABLE IF NOT EXISTS geracao (id INTEGER PRIMARY KEY CHECK (id = 1), valor INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO geracao (id, valor) VALUES (1, 0)")
+
+    def _descartar_conexoes(self):
+        self._local = threading.local()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transacao(self):
+        """BEGIN IMMEDIATE: conferir a geração e gravar sem outro worker invalidar no meio"""
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def get(self, chave):
+        row = self._conexao().execute(
+            "SELECT valor FROM cache WHERE chave = ? AND expira_em >= ?", (chave, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def geracao(self):
+        return self._conexao().execute("SELECT valor FROM geracao WHERE id = 1").fetchone()[0]
+
+    def set_se_geracao(self, itens, geracao):
+        """Grava os itens só se nenhuma invalidação aconteceu desde `geracao`; retorna se gravou"""
+        conn = self._transacao()
+        try:
+            if conn.execute("SELECT valor FROM geracao WHERE id = 1").fetchone()[0] != geracao:
+                conn.execute("ROLLBACK")
+                return False
+            expira_em = time.time() + self.ttl
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (chave, valor, expira_em) VALUES (?, ?, ?)",
+                [(chave, json.dumps(valor), expira_em) for chave, valor in itens.items()]
+            )
+            # Limpeza barata e ocasional: expirados primeiro, depois os mais antigos
+            if hash(next(iter(itens))) % 100 == 0:
+                conn.execute("DELETE FROM cache WHERE expira_em < ?", (time.time(),))
+                removidos = conn.execute(
+                    "DELETE FROM cache WHERE chave IN (SELECT chave FROM cache ORDER BY expira_em "
+                    "LIMIT max(0, (SELECT count(*) FROM cache) - ?))", (self.max_itens,)
+                ).rowcount
+                self.evictions += max(removidos, 0)
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _invalidar(self, sql, parametros=()):
+        conn = self._transacao()
+        try:
+            conn.execute(sql, parametros)
+            conn.execute("UPDATE geracao SET valor = valor + 1 WHERE id = 1")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, chave):
+        self._invalidar("DELETE FROM cache WHERE chave = ?", (chave,))
+
+    def clear(self):
+        self._invalidar("DELETE FROM cache")
+
+    def __len__(self):
+        return self._conexao().execute("SELECT count(*) FROM cache").fetchone()[0]
+
+
+class UserCache:
+    """Cache de usuários com métricas de acerto"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def obter(self, user_id):
+        """Colunas do usuário em cache, ou None"""
+        dados = self.backend.get(f"id:{user_id}")
+        if dados is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return dados
+
+    def obter_id_por_email(self, email):
+        return self.backend.get(f"email:{email}")
+
+    def marca(self):
+        """Geração atual; pegue antes de ler do banco e passe para guardar()"""
+        return self.backend.geracao()
+
+    def guardar(self, dados, marca):
+        """Guarda as colunas lidas do banco, a menos que alguma invalidação tenha acontecido desde `marca`"""
+        return self.backend.set_se_geracao({f"id:{dados['id']}": dados, f"email:{dados['email']}": dados["id"]}, marca)
+
+    def invalidar(self, user_id):
+        # O mapeamento email -> id pode ficar; quem lê confere o email do registro
+        self.backend.delete(f"id:{user_id}")
+        self.invalidations += 1
+
+    def limpar(self):
+        """
+        Esvazia o cache e avança a geração. No backend sqlite vale para todos os processos do host
+        (workers e a CLI); no memory só para o processo atual. Retorna se o cache é compartilhado.
+        """
+        self.backend.clear()
+        return self.backend.compartilhado
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": USER_CACHE_BACKEND,
+            "ttl_seconds": USER_CACHE_TTL,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions
+        }
+
+
+def _criar_backend():
+    if USER_CACHE_BACKEND == "sqlite":
+        return SqliteCacheBackend(USER_CACHE_PATH, USER_CACHE_MAX, USER_CACHE_TTL)
+    return MemoriaCacheBackend(USER_CACHE_MAX, USER_CACHE_TTL)
+
+
+# Instância global do cache
+user_cache = UserCache(_criar_backend())
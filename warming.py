@@ -0,0 +1,150 @@
+"""
+Warming real da API, executado pelo cliente eleito no /ping coordenado
+USO: from warming import aquecer
+     resultado = aquecer(app)   # {"ok": ..., "duration_ms": ..., "components": {...}}
+
+Cada warmer é uma função registrada com @warmer("nome") que recebe o app e retorna um
+detalhe opcional (contagens, tempos). Todos rodam em paralelo; o tempo de cada um é medido
+separadamente. Falha ou estouro de tempo de um warmer não impede os demais.
+WARMERS=db_pool,http,tts,content,text_index,precheck,regex limita quais rodam (padrão: todos).
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from sqlalchemy import text
+
+WARMING_BUDGET_S = float(os.getenv("WARMING_BUDGET_S", "20"))  # abaixo do WARMING_TIMEOUT do ping_manager
+WARMING_HTTP_TIMEOUT_S = float(os.getenv("WARMING_HTTP_TIMEOUT_S", "3"))
+WARMERS_HABILITADOS = [nome.strip() for nome in os.getenv("WARMERS", "").split(",") if nome.strip()]
+
+WARMERS = {}
+
+
+def warmer(nome):
+    """Registra uma função fn(app) como warmer"""
+    def registrar(funcao):
+        WARMERS[nome] = funcao
+        return funcao
+    return registrar
+
+
+@warmer("db_pool")
+def aquecer_pool(app):
+    """Abre as conexões do pool de uma vez (pool_size conexões simultâneas, cada uma com um SELECT 1)"""
+    from database import db
+
+    with app.app_context():
+        engine = db.engine
+        quantidade = engine.pool.size() if hasattr(engine.pool, "size") else 1
+        conexoes = []
+        try:
+            for _ in range(quantidade):
+                conexao = engine.connect()
+                conexoes.append(conexao)
+                conexao.execute(text("SELECT 1"))
+        finally:
+            for conexao in conexoes:
+                conexao.close()
+    return {"connections": quantidade}
+
+
+@warmer("http")
+def aquecer_http(app):
+    """Pré-estabelece as conexões TLS com os provedores de IA e cria o cliente do Groq"""
+    import ai_routes
+
+    tempos = ai_routes.aquecer_conexoes(timeout=WARMING_HTTP_TIMEOUT_S)
+    if ai_routes.GROQ_KEY:
+        ai_routes.get_groq_client()
+        tempos["groq_client"] = True
+    return tempos
+
+
+@warmer("tts")
+def aquecer_tts(app):
+    """Importa o edge_tts e sobe o event loop persistente do TTS"""
+    import speech_routes
+
+    async def _carregar():
+        import edge_tts  # noqa: F401
+
+    speech_routes.executar_no_loop_tts(_carregar())
+    return None
+
+
+@warmer("content")
+def aquecer_conteudo(app):
+    """Carrega os JSONs de conteúdo (textos, temas) em memória"""
+    import content_store
+
+    return content_store.carregar_tudo()
+
+
+@warmer("text_index")
+def aquecer_indice_textos(app):
+    """Importa o numpy e carrega o índice de features dos textos (recomendações)"""
+    import text_index
+
+    return {"textos": len(text_index.indice())}
+
+
+@warmer("precheck")
+def aquecer_precheck(app):
+    """Carrega o dicionário da pré-checagem das respostas de redação"""
+    import precheck
+
+    conhecidas = precheck.dicionario()
+    return {"palavras": len(conhecidas) if conhecidas else 0}
+
+
+@warmer("regex")
+def aquecer_regex(app):
+    """Exercita as regex e os validadores usados no cadastro (tabelas do idna/email_validator)"""
+    from email_validator import validate_email
+
+    import routes
+
+    routes.NOME_REGEX.match("Aquecimento")
+    validate_email("warming@example.com", check_deliverability=False)
+    return None
+
+
+def aquecer(app, nomes=None, orcamento_s=WARMING_BUDGET_S):
+    """Roda os warmers em paralelo e retorna o resultado com o tempo de cada componente"""
+    nomes = nomes or WARMERS_HABILITADOS or list(WARMERS)
+    inicio = time.perf_counter()
+    componentes = {}
+
+    def executar(nome):
+        inicio_warmer = time.perf_counter()
+        try:
+            detalhe = WARMERS[nome](app)
+            resultado = {"ok": True}
+            if detalhe is not None:
+                resultado["detail"] = detalhe
+        except Exception as e:
+            resultado = {"ok": False, "error": str(e)}
+        resultado["duration_ms"] = round((time.perf_counter() - inicio_warmer) * 1000, 1)
+        return resultado
+
+    executor = ThreadPoolExecutor(max_workers=len(nomes), thread_name_prefix="warming")
+    futuros = {executor.submit(executar, nome): nome for nome in nomes if nome in WARMERS}
+    concluidos, _ = wait(futuros, timeout=orcamento_s)
+    # Warmers que estouraram o orçamento continuam em segundo plano; não seguram a resposta
+    executor.shutdown(wait=False)
+
+    for futuro, nome in futuros.items():
+        if futuro in concluidos:
+            componentes[nome] = futuro.result()
+        else:
+            componentes[nome] = {"ok": False, "error": "timeout", "duration_ms": round(orcamento_s * 1000)}
+    for nome in nomes:
+        if nome not in WARMERS:
+            componentes[nome] = {"ok": False, "error": "warmer desconhecido", "duration_ms": 0}
+
+    return {
+        "ok": all(componente["ok"] for componente in componentes.values()),
+        "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "components": componentes
+    }
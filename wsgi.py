@@ -0,0 +1,9 @@
+"""
+Entry point WSGI de produção
+USO: gunicorn -c gunicorn.conf.py wsgi:app
+
+O `app.run(debug=True)` do main.py é só para desenvolvimento local.
+"""
+from main import app
+
+application = app